@@ -1,9 +1,12 @@
 import csv
 import gzip
-import io
+import hashlib
+import json
 import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import UTC, datetime, timedelta
-from time import perf_counter
+from time import perf_counter, sleep
+from typing import Any
 
 from dotenv import load_dotenv
 from influxdb_client import InfluxDBClient
@@ -16,11 +19,14 @@ INFLUXDB_MEASUREMENT = "train_locations"
 
 FIRST_DATE = datetime(2026, 3, 5, tzinfo=UTC)
 # FIRST_DATE = datetime(2025, 12, 18, tzinfo=UTC)
-LAST_DATE = datetime.now(UTC)
+# the last complete day, the current day is still being written to
+LAST_DATE = datetime.now(UTC).replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=1)
 JUST_FIRST_DATE = False
 
 OUTPUT_DIR = "D:\\Data\\influx_train_locations"
 MAX_RETRIES = 5
+RETRY_BACKOFF_SECONDS = 10  # doubled after every failed attempt
+WORKERS = 4  # days backed up at the same time
 
 
 def construct_flux_query(start: datetime, end: datetime) -> str:
@@ -40,79 +46,191 @@ def construct_flux_query(start: datetime, end: datetime) -> str:
         """
 
 
-def backup_single_day(client: InfluxDBClient, start: datetime):
+# columns of the backup CSV files, in order
+CSV_HEADER = ["time", "source", "train_id", "train_type", "accuracy", "speed", "lat", "lng", "direction"]
+
+
+def backup_single_day(client: InfluxDBClient, start: datetime, output_dir: str = OUTPUT_DIR) -> int:
     """
-    Backs up InfluxDB data as CSV for a single day, compresses it, and writes to disk.
+    Backs up InfluxDB data as gzipped CSV for a single day, and returns the number of rows written.
+
+    Records are streamed from InfluxDB and written through the compressor straight to disk, one at a time,
+    so memory use does not depend on the amount of data in a day. The file is written under a temporary name
+    and renamed when complete, so an interrupted backup never leaves a truncated file behind.
     """
     begin_time = perf_counter()
     stop = start + timedelta(days=1)
 
-    # Query data for the current day
+    # Query data for the current day, records are parsed as the response comes in
     query = construct_flux_query(start, stop)
     query_api = client.query_api()
-    result = query_api.query(query, params={"start": start.isoformat(), "stop": stop.isoformat()})
-
-    # Convert the result to CSV format in memory
-    csv_buffer = io.StringIO()
-    csv_writer = csv.writer(csv_buffer)
-
-    # Write header
-    header = ["time", "source", "train_id", "train_type", "accuracy", "speed", "lat", "lng", "direction"]
-    csv_writer.writerow(header)
-
-    # Write data rows
-    for table in result:
-        for record in table.records:
-            row = [
-                record.get_time(),
-                record.values.get("source", ""),
-                record.values.get("train_id", ""),
-                record.values.get("train_type", ""),
-                record.values.get("accuracy", ""),
-                record.values.get("speed", ""),
-                record.values.get("lat", ""),
-                record.values.get("lng", ""),
-                record.values.get("direction", ""),
-            ]
-            csv_writer.writerow(row)
-
-    # Compress the CSV data in memory
-    csv_data = csv_buffer.getvalue().encode("utf-8")
-    compressed_data = gzip.compress(csv_data)
-
-    # Write the compressed data to disk
-    filename = f"{INFLUXDB_MEASUREMENT}_{start.date()}.csv.gz"
-    filepath = os.path.join(OUTPUT_DIR, filename)
-    with open(filepath, "wb") as f:
-        f.write(compressed_data)
+    records = query_api.query_stream(query, params={"start": start.isoformat(), "stop": stop.isoformat()})
 
-    print(f"Backed up data for {start.date()} to {filepath} in {round(perf_counter() - begin_time, 2)} seconds")
-
-
-def backup_influx_data_csv(client: InfluxDBClient):
+    filename = f"{INFLUXDB_MEASUREMENT}_{start.date()}.csv.gz"
+    filepath = os.path.join(output_dir, filename)
+    partial_filepath = filepath + ".partial"
+
+    row_count = 0
+    with gzip.open(partial_filepath, "wt", encoding="utf-8", newline="") as f:
+        csv_writer = csv.writer(f)
+        csv_writer.writerow(CSV_HEADER)
+
+        for record in records:
+            csv_writer.writerow(
+                [
+                    record.get_time(),
+                    record.values.get("source", ""),
+                    record.values.get("train_id", ""),
+                    record.values.get("train_type", ""),
+                    record.values.get("accuracy", ""),
+                    record.values.get("speed", ""),
+                    record.values.get("lat", ""),
+                    record.values.get("lng", ""),
+                    record.values.get("direction", ""),
+                ]
+            )
+            row_count += 1
+
+    os.replace(partial_filepath, filepath)
+
+    duration = round(perf_counter() - begin_time, 2)
+    print(f"Backed up {row_count} rows for {start.date()} to {filepath} in {duration} seconds")
+    return row_count
+
+
+def file_sha256(filepath: str) -> str:
+    """Get the SHA-256 checksum of a file, reading it in chunks."""
+    digest = hashlib.sha256()
+    with open(filepath, "rb") as f:
+        while chunk := f.read(1024 * 1024):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_manifest(output_dir: str) -> dict[str, Any]:
+    """Load the manifest of completed days in the output directory, or start a new one."""
+    manifest_path = os.path.join(output_dir, "manifest.json")
+    if not os.path.exists(manifest_path):
+        return {"days": {}}
+
+    with open(manifest_path) as f:
+        return json.load(f)
+
+
+def save_manifest(output_dir: str, manifest: dict[str, Any]) -> None:
+    """Save the manifest under a temporary name first, so that an interrupted save keeps the previous one."""
+    manifest_path = os.path.join(output_dir, "manifest.json")
+    with open(manifest_path + ".partial", "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(manifest_path + ".partial", manifest_path)
+
+
+def is_completed(manifest: dict[str, Any], output_dir: str, day: datetime) -> bool:
+    """Whether the day is in the manifest, and its file is still there with the recorded size and checksum."""
+    entry = manifest["days"].get(str(day.date()))
+    if entry is None:
+        return False
+
+    filepath = os.path.join(output_dir, entry["file"])
+    return (
+        os.path.exists(filepath)
+        and os.path.getsize(filepath) == entry["bytes"]
+        and file_sha256(filepath) == entry["sha256"]
+    )
+
+
+def backup_day_with_retries(
+    client: InfluxDBClient, day: datetime, output_dir: str, backoff_seconds: float = RETRY_BACKOFF_SECONDS
+) -> dict[str, Any]:
+    """Back up a single day, retrying with exponential backoff. Returns the manifest entry for the day."""
+    for attempt in range(MAX_RETRIES):
+        try:
+            row_count = backup_single_day(client, day, output_dir)
+            break
+        except Exception as e:
+            if attempt == MAX_RETRIES - 1:
+                raise  # Re-raise if all retries exhausted
+
+            delay = backoff_seconds * 2**attempt
+            print(f"Attempt {attempt + 1} for {day.date()} failed: {e}, retrying in {delay} seconds")
+            sleep(delay)
+
+    filename = f"{INFLUXDB_MEASUREMENT}_{day.date()}.csv.gz"
+    filepath = os.path.join(output_dir, filename)
+    return {
+        "file": filename,
+        "rows": row_count,
+        "bytes": os.path.getsize(filepath),
+        "sha256": file_sha256(filepath),
+        "completed_at": datetime.now(UTC).isoformat(),
+    }
+
+
+def backup_influx_data_csv(
+    client: InfluxDBClient,
+    first_date: datetime = FIRST_DATE,
+    last_date: datetime = LAST_DATE,
+    output_dir: str = OUTPUT_DIR,
+    workers: int = WORKERS,
+    backoff_seconds: float = RETRY_BACKOFF_SECONDS,
+) -> list[str]:
     """
-    Back up complete InfluxDB measurement from configured start and end date (see constants).
+    Back up complete InfluxDB measurement from the first to the last date (see constants), a file per day.
+    Days that have not ended yet are left out, so a partial day is never recorded as completed.
+
+    Days are backed up concurrently by a pool of workers. Completed days are recorded in a manifest in the output
+    directory, with their row count and checksum, so a rerun after a failure skips them and resumes where it left.
+    Failed days are retried with backoff; days that keep failing are reported and left for the next run.
+    Returns the days that failed.
     """
-    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = load_manifest(output_dir)
+
+    now = datetime.now(UTC)
+    days = []
+    skipped = 0
+    current_day = first_date
+    while current_day <= last_date and current_day + timedelta(days=1) <= now:
+        if is_completed(manifest, output_dir, current_day):
+            skipped += 1
+        else:
+            days.append(current_day)
+        current_day += timedelta(days=1)
 
-    current_day = FIRST_DATE
-    while current_day <= LAST_DATE:
-        for attempt in range(MAX_RETRIES):
+    print(f"Backing up {len(days)} days with {workers} workers, skipping {skipped} completed days")
+
+    begin_time = perf_counter()
+    total_rows = 0
+    failed = []
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(backup_day_with_retries, client, day, output_dir, backoff_seconds): day for day in days
+        }
+        for done, future in enumerate(as_completed(futures), start=1):
+            day = futures[future]
             try:
-                backup_single_day(client, current_day)
-                break
+                entry = future.result()
             except Exception as e:
-                print(f"Attempt {attempt + 1} failed: {e}")
-                if attempt == MAX_RETRIES - 1:
-                    raise  # Re-raise if all retries exhausted
+                print(f"[{done}/{len(days)}] Backup for {day.date()} failed after {MAX_RETRIES} attempts: {e}")
+                failed.append(str(day.date()))
+                continue
 
-        if JUST_FIRST_DATE:
-            break
+            # only this thread writes the manifest, so no lock needed
+            manifest["days"][str(day.date())] = entry
+            save_manifest(output_dir, manifest)
 
-        current_day += timedelta(days=1)
+            total_rows += entry["rows"]
+            rows_per_second = round(total_rows / (perf_counter() - begin_time))
+            print(
+                f"[{done}/{len(days)}] Completed {day.date()}: {entry['rows']} rows, {rows_per_second} rows/s overall"
+            )
+
+    if failed:
+        print(f"Failed days, rerun to retry: {', '.join(sorted(failed))}")
+    return sorted(failed)
 
 
 if __name__ == "__main__":
     load_dotenv()
     client = get_influxdb_client_from_env()
-    backup_influx_data_csv(client)
+    backup_influx_data_csv(client, last_date=FIRST_DATE if JUST_FIRST_DATE else LAST_DATE)
@@ -0,0 +1,217 @@
+"""
+Load the train location backups (`train_locations_<date>.csv.gz`, see `backup_influx_data.py`) into QuestDB.
+
+Run with `python -m scripts.migrate.load_backups_into_questdb`.
+
+The backups have WGS84 `lat`/`lng`, while the API reads RD New `x`/`y`: coordinates are converted on the way in.
+Files are streamed in batches of lines, every batch is parsed, converted and formatted as InfluxDB Line Protocol
+(ILP) with vectorized polars expressions, and sent to the ILP endpoint of QuestDB over TCP. Files are loaded
+concurrently by a pool of workers, each with its own connection, and an optional rate limit shared by all workers
+keeps a live QuestDB responsive during the load.
+
+Loading a day twice inserts its rows twice, unless deduplication is enabled on the table, e.g.
+`alter table train_locations dedup enable upsert keys(timestamp, train_id)`.
+"""
+
+import gzip
+import os
+import socket
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from threading import Lock
+from time import monotonic, perf_counter, sleep
+
+import polars as pl
+from dotenv import load_dotenv
+
+from artistic_intelligence_data.logger import get_logger
+from scripts.migrate.backup_influx_data import CSV_HEADER, INFLUXDB_MEASUREMENT, OUTPUT_DIR
+
+_logger = get_logger(__name__)
+
+TABLE = "train_locations"
+BATCH_BYTES = 8 * 1024 * 1024  # uncompressed CSV per batch, about 80k rows
+WORKERS = 4  # files loaded at the same time
+MAX_ROWS_PER_SECOND: float | None = None  # over all workers, None to load as fast as QuestDB takes it
+
+# reference point Amersfoort, in WGS84 degrees and RD New meters
+RD_REFERENCE = (52.15517440, 5.38720621, 155_000.0, 463_000.0)
+
+# coefficients of the polynomial approximation of the transformation (Schreutelkamp & Strang van Hees),
+# as {(p, q): coefficient} for the terms coefficient * dlat^p * dlng^q, accurate to about a meter
+RD_X_TERMS = {
+    (0, 1): 190094.945,
+    (1, 1): -11832.228,
+    (2, 1): -114.221,
+    (0, 3): -32.391,
+    (1, 0): -0.705,
+    (3, 1): -2.340,
+    (1, 3): -0.608,
+    (0, 2): -0.008,
+    (2, 3): 0.148,
+}
+RD_Y_TERMS = {
+    (1, 0): 309056.544,
+    (0, 2): 3638.893,
+    (2, 0): 73.077,
+    (1, 2): -157.984,
+    (3, 0): 59.788,
+    (0, 1): 0.433,
+    (2, 2): -6.439,
+    (1, 1): -0.032,
+    (0, 4): 0.092,
+    (1, 4): -0.054,
+}
+
+# tags become symbol columns, the other columns are float fields; empty values are left out of a line
+ILP_TAGS = ["train_id", "train_type", "source"]
+ILP_FIELDS = ["x", "y", "speed", "direction", "accuracy"]
+
+
+def wgs84_to_rd(lat: pl.Expr, lng: pl.Expr) -> tuple[pl.Expr, pl.Expr]:
+    """Convert WGS84 latitude and longitude (degrees) to RD New x and y (meters)."""
+    lat_0, lng_0, x_0, y_0 = RD_REFERENCE
+    dlat = 0.36 * (lat - lat_0)
+    dlng = 0.36 * (lng - lng_0)
+
+    x = pl.sum_horizontal([c * dlat**p * dlng**q for (p, q), c in RD_X_TERMS.items()]) + x_0
+    y = pl.sum_horizontal([c * dlat**p * dlng**q for (p, q), c in RD_Y_TERMS.items()]) + y_0
+    return x, y
+
+
+def _escape_tag(value: pl.Expr) -> pl.Expr:
+    return value.str.replace_all(r"([ ,=\\])", r"\$1")
+
+
+def to_line_protocol(batch: pl.DataFrame) -> bytes:
+    """
+    Convert a batch of backup rows (CSV columns, as strings) to ILP lines for the locations table.
+    Values are parsed leniently: rows without a valid time, train id or coordinates are skipped, and fields
+    that are not numeric are left out of their line.
+    """
+    time = pl.col("time").str.to_datetime("%Y-%m-%d %H:%M:%S%.f%:z", time_unit="ns", strict=False)
+    parsed = batch.with_columns(
+        pl.col(["lat", "lng", *ILP_FIELDS[2:]]).cast(pl.Float64, strict=False),
+        nanos=time.dt.epoch("ns"),
+    ).filter(
+        pl.col("nanos").is_not_null(),
+        pl.col("train_id").is_not_null() & (pl.col("train_id") != ""),
+        pl.col("lat").is_finite(),
+        pl.col("lng").is_finite(),
+    )
+    x, y = wgs84_to_rd(pl.col("lat"), pl.col("lng"))
+    locations = parsed.with_columns(x=x.round(2), y=y.round(2))
+    if locations.is_empty():
+        return b""
+
+    tags = [
+        pl.when(pl.col(tag) != "")
+        .then(pl.format(",{}={}", pl.lit(tag), _escape_tag(pl.col(tag))))
+        .otherwise(pl.lit(""))
+        for tag in ILP_TAGS
+    ]
+    fields = [pl.format("{}={}", pl.lit(field), pl.col(field)) for field in ILP_FIELDS]
+    lines = locations.select(
+        pl.concat_str(
+            pl.lit(TABLE),
+            *tags,
+            pl.lit(" "),
+            pl.concat_list(fields).list.drop_nulls().list.join(","),
+            pl.lit(" "),
+            pl.col("nanos").cast(pl.String),
+            pl.lit("\n"),
+        )
+    )
+    return "".join(lines.to_series()).encode()
+
+
+def iter_batches(filepath: Path, batch_bytes: int = BATCH_BYTES):
+    """Stream a gzipped backup file in batches of whole lines, parsed to frames with the CSV columns as strings."""
+    schema = dict.fromkeys(CSV_HEADER, pl.String)
+    with gzip.open(filepath, "rb") as f:
+        f.readline()  # header
+        while lines := f.readlines(batch_bytes):
+            yield pl.read_csv(b"".join(lines), has_header=False, new_columns=CSV_HEADER, schema=schema)
+
+
+class RateLimiter:
+    """Spread rows over time, at most the given number of rows per second over all threads that share it."""
+
+    def __init__(self, rows_per_second: float | None):
+        self.rows_per_second = rows_per_second
+        self._next_slot = monotonic()
+        self._lock = Lock()
+
+    def wait(self, rows: int) -> None:
+        """Wait until the given number of rows may be sent."""
+        if not self.rows_per_second:
+            return
+
+        with self._lock:
+            now = monotonic()
+            start = max(self._next_slot, now)
+            self._next_slot = start + rows / self.rows_per_second
+        sleep(start - now)
+
+
+def load_file(filepath: Path, host: str, port: int, rate_limiter: RateLimiter) -> int:
+    """Load a single backup file over its own ILP connection, and return the number of rows sent."""
+    begin_time = perf_counter()
+    row_count = 0
+    with socket.create_connection((host, port)) as connection:
+        for batch in iter_batches(filepath):
+            payload = to_line_protocol(batch)
+            rows = payload.count(b"\n")
+            rate_limiter.wait(rows)
+            connection.sendall(payload)
+            row_count += rows
+
+    duration = perf_counter() - begin_time
+    _logger.info("Loaded backup file", file=filepath.name, rows=row_count, rows_per_second=round(row_count / duration))
+    return row_count
+
+
+def load_backups(
+    input_dir: str = OUTPUT_DIR,
+    host: str | None = None,
+    port: int | None = None,
+    workers: int = WORKERS,
+    max_rows_per_second: float | None = MAX_ROWS_PER_SECOND,
+) -> list[str]:
+    """
+    Load all backup files in the input directory into QuestDB, in order of date, and return the files that failed.
+    The ILP endpoint defaults to `QDB_HOST` and `QDB_ILP_PORT` (9009), e.g. a local socket for testing.
+
+    A file that fails is reported and does not stop the others. It may have been loaded in part, so enable
+    deduplication on the table (see above) before loading it again.
+    """
+    host = host or os.getenv("QDB_HOST", "localhost")
+    port = port or int(os.getenv("QDB_ILP_PORT", "9009"))
+
+    files = sorted(Path(input_dir).glob(f"{INFLUXDB_MEASUREMENT}_*.csv.gz"))
+    _logger.info("Loading backups into QuestDB", files=len(files), workers=workers, endpoint=f"{host}:{port}")
+
+    begin_time = perf_counter()
+    rate_limiter = RateLimiter(max_rows_per_second)
+    total_rows = 0
+    failed = []
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(load_file, filepath, host, port, rate_limiter): filepath for filepath in files}
+        for future in as_completed(futures):
+            filepath = futures[future]
+            try:
+                total_rows += future.result()
+            except Exception as e:
+                _logger.error("Loading backup file failed", file=filepath.name, error=str(e))
+                failed.append(filepath.name)
+
+    duration = perf_counter() - begin_time
+    _logger.info("Backups loaded", rows=total_rows, rows_per_second=round(total_rows / duration) if duration else None)
+    if failed:
+        _logger.warning("Failed files, load them again after fixing the cause", files=sorted(failed))
+    return sorted(failed)
+
+
+if __name__ == "__main__":
+    load_dotenv()
+    load_backups()
@@ -0,0 +1,155 @@
+"""
+Benchmarks for the data transformations behind the train endpoints, using synthetic data (no database needed).
+
+Run with `python -m scripts.trains.benchmarks`.
+"""
+
+import random
+from collections.abc import Callable
+from datetime import datetime, timedelta
+from time import perf_counter
+from typing import cast
+
+import polars as pl
+from pydantic import TypeAdapter
+
+from artistic_intelligence_data.constants import DEFAULT_TIMEZONE
+from artistic_intelligence_data.database import rows_to_frame
+from artistic_intelligence_data.models import TrainRecord
+from artistic_intelligence_data.serialization import records_json
+from artistic_intelligence_data.trains.categories import encode_categories
+from artistic_intelligence_data.trains.pivot import pivot_locations
+
+TRAIN_TYPES = ["IC", "SPR", "ARR", "ICE", "EST"]
+
+
+def synthetic_locations(hours: float = 1, train_count: int = 400) -> pl.DataFrame:
+    """Generate train locations like the provider returns them, a record every 10 seconds for every train."""
+    random.seed(42)
+    start = datetime(2026, 3, 5, 8, tzinfo=DEFAULT_TIMEZONE)
+    timestamps = [start + timedelta(seconds=10 * i) for i in range(int(hours * 360))]
+    train_ids = [str(random.randint(100, 99_999)) for _ in range(train_count)]
+    train_types = [random.choice(TRAIN_TYPES) for _ in range(train_count)]
+    row_count = len(timestamps) * train_count
+
+    return pl.DataFrame(
+        {
+            "timestamp": [ts for ts in timestamps for _ in range(train_count)],
+            "train_id": train_ids * len(timestamps),
+            "train_type": train_types * len(timestamps),
+            "x": [random.uniform(10_000, 280_000) for _ in range(row_count)],
+            "y": [random.uniform(300_000, 625_000) for _ in range(row_count)],
+            "speed": [round(random.uniform(0, 200), 1) for _ in range(row_count)],
+            "direction": [round(random.uniform(0, 360), 1) for _ in range(row_count)],
+            "accuracy": [round(random.uniform(0, 10), 1) for _ in range(row_count)],
+        }
+    )
+
+
+def timed[T](label: str, func: Callable[[], T]) -> tuple[T, float]:
+    time_start = perf_counter()
+    result = func()
+    duration = perf_counter() - time_start
+    print(f"{label:<50} {duration:8.3f} s")
+    return result, duration
+
+
+def benchmark_serialization(locations: pl.DataFrame) -> None:
+    print(f"--serialization of {locations.height} records--")
+
+    records = locations.select(
+        "timestamp",
+        pl.col("train_id").cast(pl.Int64).alias("id"),
+        pl.col("x").cast(pl.Int64),
+        pl.col("y").cast(pl.Int64),
+        "speed",
+        "direction",
+        "accuracy",
+        pl.col("train_type").alias("type"),
+    )
+
+    def per_row_models() -> bytes:
+        models = [TrainRecord(**rec) for rec in records.to_dicts()]
+        return TypeAdapter(list[TrainRecord]).dump_json(models)
+
+    expected, duration_models = timed("pydantic models per row", per_row_models)
+    result, duration_bulk = timed("bulk from polars columns", lambda: records_json(records))
+    assert result == expected, "serialized output differs"
+    print(f"{'speedup':<50} {duration_models / duration_bulk:8.1f} x")
+
+
+def pivot_reference(locations: pl.DataFrame, train_ids: list[str], scale: bool = True) -> pl.DataFrame:
+    """The original torbenizer: unpivot all variables into a single (string) column and pivot with 'first'."""
+    if scale:
+        locations = locations.with_columns(
+            ((pl.col("x") - 155_000) / (325_000 / 2)).round(5),
+            ((pl.col("y") - 463_000) / (325_000 / 2)).round(5),
+        )
+
+    pivoted = locations.lazy()
+    pivoted = pivoted.unpivot(
+        on=["x", "y", "speed", "train_type"], index=["timestamp", "train_id"], variable_name="var"
+    )
+    pivoted = pivoted.pivot(
+        on="train_id", on_columns=train_ids, index=["timestamp", "var"], values="value", aggregate_function="first"
+    )
+    pivoted = pivoted.sort(by=["timestamp", "var"])
+    return cast(pl.DataFrame, pivoted.collect())
+
+
+def benchmark_pivot(locations: pl.DataFrame) -> None:
+    print(f"--pivot of {locations.height} records--")
+
+    train_ids = locations.get_column("train_id").unique().sort().to_list()
+    expected, duration_reference = timed("unpivot and pivot with first", lambda: pivot_reference(locations, train_ids))
+    encoded = encode_categories(locations)  # as the provider returns them
+    result, duration_engine = timed(
+        "preallocated float32 matrix", lambda: pivot_locations(encoded, train_ids).to_frame()
+    )
+    assert result.equals(expected), "pivoted output differs"
+    print(f"{'speedup':<50} {duration_reference / duration_engine:8.1f} x")
+
+
+def benchmark_read_frame(locations: pl.DataFrame) -> None:
+    """
+    Building a frame from the rows psycopg fetched, against reading Arrow columns (as connectorx did).
+    The fetch itself (wire transfer and decoding by the driver) is not included, only what happens after.
+    """
+    print(f"--frame from {locations.height} fetched rows--")
+
+    # as QuestDB returns them: naive UTC timestamps, and Python objects per value from psycopg
+    fetched = locations.with_columns(pl.col("timestamp").dt.convert_time_zone("UTC").dt.replace_time_zone(None))
+    rows = fetched.rows()
+    schema = dict(fetched.schema)
+    arrow = fetched.to_arrow()
+
+    expected, duration_rows = timed("row by row", lambda: pl.DataFrame(rows, schema=schema, orient="row"))
+    result, duration_columns = timed("column by column (read_frame)", lambda: rows_to_frame(rows, schema))
+    _, duration_arrow = timed("from arrow columns", lambda: pl.from_arrow(arrow))
+    assert result.equals(expected), "frame differs"
+    print(f"{'speedup over row by row':<50} {duration_rows / duration_columns:8.1f} x")
+    print(f"{'per million rows, column by column':<50} {duration_columns / locations.height * 1e6:8.3f} s")
+    print(f"{'per million rows, from arrow':<50} {duration_arrow / locations.height * 1e6:8.3f} s")
+
+
+def _memory_mb(frame: pl.DataFrame) -> float:
+    # estimated_size does not count the 16-byte views of strings, so measure the columns in the classic Arrow layout
+    # (offsets and data) instead, which pyarrow can measure: it is a lower bound for the strings polars keeps
+    return sum(series.to_arrow(compat_level=pl.CompatLevel.oldest()).nbytes for series in frame) / 1024**2
+
+
+def benchmark_memory(locations: pl.DataFrame) -> None:
+    print(f"--memory of {locations.height} records--")
+
+    size_strings = _memory_mb(locations)
+    size_categories = _memory_mb(encode_categories(locations))
+    print(f"{'train_id and train_type as strings':<50} {size_strings:8.1f} MB")
+    print(f"{'train_id and train_type as categoricals':<50} {size_categories:8.1f} MB")
+    print(f"{'saving':<50} {1 - size_categories / size_strings:8.1%}")
+
+
+if __name__ == "__main__":
+    benchmark_serialization(synthetic_locations(hours=1))
+    benchmark_pivot(synthetic_locations(hours=3))
+    benchmark_memory(synthetic_locations(hours=6))
+    benchmark_read_frame(synthetic_locations(hours=3))
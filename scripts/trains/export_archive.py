@@ -0,0 +1,30 @@
+"""
+Export closed days of train locations from QuestDB to the Parquet archive in `ARCHIVE_DIR`, run e.g. daily.
+
+Run with `python -m scripts.trains.export_archive`. Days already in the archive are skipped, so reruns are safe.
+"""
+
+import asyncio
+from datetime import date
+
+from dotenv import load_dotenv
+
+from artistic_intelligence_data.logger import get_logger
+from artistic_intelligence_data.trains.questdb_train_provider import QuestDBTrainProvider
+
+_logger = get_logger(__name__)
+
+# set to backfill from this day on, otherwise the export continues after the last day in the archive
+FIRST_DAY: date | None = None
+
+
+async def export_archive() -> None:
+    async with QuestDBTrainProvider.from_env() as provider:
+        exported = await provider.archive_closed_days(first_day=FIRST_DAY)
+
+    _logger.info("Archive export done", days=len(exported))
+
+
+if __name__ == "__main__":
+    load_dotenv()
+    asyncio.run(export_archive())
@@ -1,3 +1,4 @@
+import asyncio
 import time
 from datetime import datetime, timedelta
 
@@ -13,7 +14,11 @@ TRAIN_COLOR_MAP = {
     "ARR": "#ff0000",  # red
 }
 
-TRAIN_PROVIDER = QuestDBTrainProvider()
+
+async def get_train_locations_at(moment: datetime) -> pl.DataFrame:
+    async with QuestDBTrainProvider.from_env() as provider:
+        return await provider.get_train_locations(moment, moment)
+
 
 # START APP
 
@@ -47,7 +52,7 @@ if st.button("Play"):
         timeinfo_placeholder.info(f"Selected time: {selected_time}")
 
 
-trains = TRAIN_PROVIDER.get_train_locations(selected_time, selected_time).with_columns(
+trains = asyncio.run(get_train_locations_at(selected_time)).with_columns(
     pl.col("train_type").replace_strict(TRAIN_COLOR_MAP).alias("color")
 )
 
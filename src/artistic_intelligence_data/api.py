@@ -1,3 +1,7 @@
+import asyncio
+from collections.abc import AsyncGenerator
+from contextlib import asynccontextmanager
+
 import uvicorn
 from dotenv import load_dotenv
 from fastapi import FastAPI
@@ -5,6 +9,9 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.gzip import GZipMiddleware
 
 from artistic_intelligence_data.routers import datamon, trains
+from artistic_intelligence_data.trains.live_buffer import run_poller
+from artistic_intelligence_data.trains.live_feed import SnapshotBroadcaster, run_broadcaster
+from artistic_intelligence_data.trains.provider import create_train_provider
 
 # Load the environment file to set API key and such
 load_dotenv()
@@ -33,6 +40,46 @@ tags_metadata = [
     {"name": "datamon", "description": "Monitor incoming data streams."},
 ]
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncGenerator[None]:
+    """
+    Create a single train provider (and with it, the database connection pool) for the whole process,
+    as configured with `TRAIN_PROVIDER`.
+    Also start the poller that keeps its live buffer up to date, the broadcaster of new snapshots,
+    and the background refresh of train metadata.
+    """
+    provider = create_train_provider()
+    tasks: list[asyncio.Task[None]] = []
+    try:
+        await provider.open()
+        app.state.train_provider = provider
+        app.state.snapshot_broadcaster = SnapshotBroadcaster()
+
+        if provider.live_poll_interval:
+            tasks.append(asyncio.create_task(run_poller(provider.poll_live_tail, provider.live_poll_interval)))
+            tasks.append(
+                asyncio.create_task(
+                    run_broadcaster(
+                        provider.get_latest_snapshot, app.state.snapshot_broadcaster, provider.live_poll_interval
+                    )
+                )
+            )
+
+        if provider.metadata_refresh_interval:
+            tasks.append(asyncio.create_task(run_poller(provider.refresh_metadata, provider.metadata_refresh_interval)))
+
+        yield
+    finally:
+        # also when starting up failed halfway, or shutting down is cancelled
+        for task in tasks:
+            task.cancel()
+        try:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        finally:
+            await provider.close()
+
+
 app = FastAPI(
     title="AID - Artistic Intelligence Data",
     description=description,
@@ -43,6 +90,7 @@ app = FastAPI(
     },
     docs_url="/",
     redoc_url=None,
+    lifespan=lifespan,
 )
 
 # auto compress responses, size in bytes
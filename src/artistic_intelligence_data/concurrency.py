@@ -0,0 +1,21 @@
+"""
+Offload CPU-bound work (Polars transforms, serialization) from the event loop to a bounded pool of threads.
+Polars releases the GIL while it works, so these threads really do run in parallel.
+"""
+
+import asyncio
+import os
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+CPU_EXECUTOR = ThreadPoolExecutor(
+    max_workers=int(os.getenv("CPU_WORKERS", str(min(4, os.cpu_count() or 1)))),
+    thread_name_prefix="cpu",
+)
+
+
+async def run_cpu[T](func: Callable[..., T], *args, **kwargs) -> T:
+    """Run a blocking function in the CPU executor, so the event loop stays responsive."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(CPU_EXECUTOR, partial(func, *args, **kwargs))
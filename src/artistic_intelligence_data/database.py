@@ -0,0 +1,96 @@
+import os
+from collections.abc import Sequence
+from typing import Any, LiteralString
+
+import polars as pl
+from dotenv import load_dotenv
+from psycopg import AsyncConnection
+from psycopg.postgres import types as pg_types
+from psycopg_pool import AsyncConnectionPool
+
+from artistic_intelligence_data.concurrency import run_cpu
+from artistic_intelligence_data.logger import get_logger
+
+_logger = get_logger(__name__)
+
+# polars dtypes for the PostgreSQL types QuestDB reports over the wire, so empty results still have a schema
+PG_TYPE_DTYPES: dict[str, pl.DataType] = {
+    "timestamp": pl.Datetime("us"),
+    "timestamptz": pl.Datetime("us", "UTC"),
+    "date": pl.Date(),
+    "float8": pl.Float64(),
+    "float4": pl.Float32(),
+    "int8": pl.Int64(),
+    "int4": pl.Int32(),
+    "int2": pl.Int16(),
+    "bool": pl.Boolean(),
+    "varchar": pl.String(),
+    "text": pl.String(),
+}
+
+
+def get_questdb_conninfo() -> str:
+    """Build the PostgreSQL wire protocol connection string for QuestDB from the environment."""
+    qdb_host = os.getenv("QDB_HOST", "localhost")
+    qdb_port = os.getenv("QDB_PORT", "8812")
+    qdb_user = os.getenv("QDB_USER", "admin")
+    qdb_pass = os.getenv("QDB_PASS", "quest")
+
+    return f"host={qdb_host} port={qdb_port} user={qdb_user} password={qdb_pass} dbname=qdb"
+
+
+def create_questdb_pool() -> AsyncConnectionPool:
+    """
+    Create a bounded async connection pool to QuestDB, configured from the environment.
+
+    The pool is not opened yet, since that needs a running event loop: await `open()` on it before use.
+    Connections are health checked when they are handed out, and closed after sitting idle for too long,
+    so a restart of QuestDB does not leave the API with a pool of dead connections.
+    """
+    load_dotenv()
+
+    return AsyncConnectionPool(
+        conninfo=get_questdb_conninfo(),
+        kwargs={"autocommit": True},  # QuestDB has no use for transactions on reads
+        min_size=int(os.getenv("QDB_POOL_MIN_SIZE", "1")),
+        max_size=int(os.getenv("QDB_POOL_MAX_SIZE", "8")),
+        max_idle=float(os.getenv("QDB_POOL_MAX_IDLE", "300")),  # seconds
+        timeout=float(os.getenv("QDB_POOL_TIMEOUT", "10")),  # seconds to wait for a free connection
+        check=AsyncConnectionPool.check_connection,
+        name="questdb",
+        open=False,
+    )
+
+
+async def read_frame(conn: AsyncConnection, query: LiteralString, params: Sequence[Any] = ()) -> pl.DataFrame:
+    """
+    Run a query on the given connection and return the result as a DataFrame typed after the result columns.
+    Building the frame from the fetched rows is CPU-bound, so it happens in the CPU executor.
+
+    The query is run as prepared statement with the given parameters bound to its placeholders (`%s`).
+    Prepared statements are cached per connection by query text (up to `prepared_max` of them), so a query is
+    only compiled the first time it runs on a connection.
+    """
+    async with conn.cursor() as cur:
+        await cur.execute(query, params, prepare=True)
+        rows = await cur.fetchall()
+        columns = cur.description or []
+
+    schema: dict[str, pl.DataType | None] = {}
+    for column in columns:
+        type_info = pg_types.get(column.type_code)
+        schema[column.name] = PG_TYPE_DTYPES.get(type_info.name) if type_info else None
+
+    return await run_cpu(rows_to_frame, rows, schema)
+
+
+def rows_to_frame(rows: Sequence[tuple[Any, ...]], schema: dict[str, pl.DataType | None]) -> pl.DataFrame:
+    """
+    Build a frame from fetched rows, a typed series per column.
+    Transposing first and building the columns in bulk is faster than building the frame row by row,
+    see `benchmark_read_frame` in `scripts/trains/benchmarks.py`.
+    """
+    values = zip(*rows, strict=True) if rows else [() for _ in schema]
+    return pl.DataFrame(
+        [pl.Series(name, column, dtype=dtype) for (name, dtype), column in zip(schema.items(), values, strict=True)]
+    )
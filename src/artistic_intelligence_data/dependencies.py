@@ -1,10 +1,14 @@
 import os
+from typing import Annotated
 
 from dotenv import load_dotenv
-from fastapi import HTTPException, Security
+from fastapi import Depends, HTTPException, Request, Security
 from fastapi.security import APIKeyHeader
 from starlette.status import HTTP_403_FORBIDDEN
 
+from artistic_intelligence_data.trains.live_feed import SnapshotBroadcaster
+from artistic_intelligence_data.trains.provider import TrainProvider
+
 load_dotenv()
 
 API_KEY_HEADER = APIKeyHeader(name="x-api-key", auto_error=False)
@@ -25,3 +29,19 @@ def verify_api_key(api_key: str = Security(API_KEY_HEADER)) -> str:
         raise HTTPException(status_code=HTTP_403_FORBIDDEN, detail="API key missing or invalid")
 
     return api_key
+
+
+def get_train_provider(request: Request) -> TrainProvider:
+    """Get the process-wide train provider, created in the app lifespan."""
+    return request.app.state.train_provider
+
+
+TrainProviderDep = Annotated[TrainProvider, Depends(get_train_provider)]
+
+
+def get_snapshot_broadcaster(request: Request) -> SnapshotBroadcaster:
+    """Get the process-wide broadcaster of live train positions, created in the app lifespan."""
+    return request.app.state.snapshot_broadcaster
+
+
+SnapshotBroadcasterDep = Annotated[SnapshotBroadcaster, Depends(get_snapshot_broadcaster)]
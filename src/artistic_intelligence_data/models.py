@@ -23,3 +23,16 @@ class TrainPosition(BaseModel):
 class TrainType(BaseModel):
     id: int
     type: str
+
+
+class SourceIngestion(BaseModel):
+    source: str
+    latest: datetime
+    lag_seconds: float
+
+
+class IngestionStats(BaseModel):
+    records: int
+    trains: int
+    lag_seconds: float | None
+    sources: list[SourceIngestion]
@@ -1,3 +1,8 @@
+import io
+from enum import StrEnum
+from typing import Any
+
+import polars as pl
 from fastapi import Response
 
 
@@ -5,3 +10,71 @@ class CSVResponse(Response):
     """Custom response for returning CSV data."""
 
     media_type = "text/csv"
+
+
+class JSONBytesResponse(Response):
+    """Custom response for returning JSON that is already serialized, see `serialization.py`."""
+
+    media_type = "application/json"
+
+
+class ArrowResponse(Response):
+    """Custom response for returning a DataFrame as Arrow IPC stream, without creating any Python objects per row."""
+
+    media_type = "application/vnd.apache.arrow.stream"
+
+    def render(self, content: pl.DataFrame) -> bytes:
+        buffer = io.BytesIO()
+        content.write_ipc_stream(buffer)
+        return buffer.getvalue()
+
+
+class ParquetResponse(Response):
+    """Custom response for returning a DataFrame as Parquet file."""
+
+    media_type = "application/vnd.apache.parquet"
+
+    def render(self, content: pl.DataFrame) -> bytes:
+        buffer = io.BytesIO()
+        content.write_parquet(buffer)
+        return buffer.getvalue()
+
+
+class DataFormat(StrEnum):
+    """Output formats for endpoints that can return tabular data in binary form."""
+
+    JSON = "json"
+    ARROW = "arrow"
+    PARQUET = "parquet"
+
+
+FORMAT_MEDIA_TYPES = {
+    DataFormat.ARROW: ArrowResponse.media_type,
+    DataFormat.PARQUET: ParquetResponse.media_type,
+}
+
+BINARY_FORMAT_RESPONSES: dict[int | str, dict[str, Any]] = {
+    200: {"content": {media_type: {} for media_type in FORMAT_MEDIA_TYPES.values()}}
+}
+
+
+def negotiate_format(requested: DataFormat | None, accept: str | None) -> DataFormat:
+    """Pick the output format: an explicitly requested format wins, otherwise look at the Accept header."""
+    if requested is not None:
+        return requested
+
+    for data_format, media_type in FORMAT_MEDIA_TYPES.items():
+        if accept and media_type in accept:
+            return data_format
+
+    return DataFormat.JSON
+
+
+def frame_response(frame: pl.DataFrame, data_format: DataFormat) -> Response:
+    """Render a DataFrame straight to a binary response in the given format."""
+    if data_format == DataFormat.ARROW:
+        return ArrowResponse(frame)
+    if data_format == DataFormat.PARQUET:
+        return ParquetResponse(frame)
+
+    raise ValueError(f"Format `{data_format}` can not be rendered from a DataFrame directly.")
@@ -1,11 +1,53 @@
+from typing import Any
+
 from fastapi import APIRouter
 
-from artistic_intelligence_data.trains.questdb_train_provider import QuestDBTrainProvider
+from artistic_intelligence_data.dependencies import SnapshotBroadcasterDep, TrainProviderDep
+from artistic_intelligence_data.models import IngestionStats
 
 router = APIRouter(prefix="/datamon", tags=["datamon"])
 
 
 @router.get("/trains")
-def get_current_train_record_count() -> int:
-    """Get train record count for the last minute."""
-    return QuestDBTrainProvider().get_current_count()
+async def get_current_train_record_count(provider: TrainProviderDep) -> int:
+    """Get train record count for the last minute, may be a few seconds old."""
+    return await provider.get_current_count()
+
+
+@router.get("/ingestion", response_model=IngestionStats)
+async def get_ingestion_stats(provider: TrainProviderDep) -> dict[str, Any]:
+    """
+    Get train records and distinct trains for the last minute, and the latest timestamp and lag per data source.
+    Counts may be a few seconds old, so that frequent health checks do not load the database.
+    """
+    return await provider.get_ingestion_stats()
+
+
+@router.get("/pool")
+async def get_connection_pool_stats(provider: TrainProviderDep) -> dict[str, int]:
+    """Get metrics of the QuestDB connection pool, e.g. its size and the number of waiting requests."""
+    return provider.get_pool_stats()
+
+
+@router.get("/cache")
+async def get_cache_stats(provider: TrainProviderDep) -> dict[str, int]:
+    """Get metrics of the train location bucket cache, e.g. hits, misses, evictions and memory use."""
+    return provider.get_cache_stats()
+
+
+@router.get("/metadata")
+async def get_metadata_stats(provider: TrainProviderDep) -> dict[str, int]:
+    """Get metrics of the train metadata store, serving types and materials: trains known and age in seconds."""
+    return provider.get_metadata_stats()
+
+
+@router.get("/queries")
+async def get_query_stats(provider: TrainProviderDep) -> dict[str, int]:
+    """Get the number of QuestDB queries executed, and the number saved by sharing an identical concurrent query."""
+    return provider.get_query_stats()
+
+
+@router.get("/stream")
+async def get_stream_stats(broadcaster: SnapshotBroadcasterDep) -> dict[str, int]:
+    """Get metrics of the live train positions stream, e.g. subscribers and snapshots dropped for slow clients."""
+    return broadcaster.get_stats()
@@ -1,123 +1,310 @@
+import asyncio
+from collections.abc import AsyncIterator
 from datetime import datetime, timedelta
 from time import perf_counter
+from typing import Annotated
 
 import polars as pl
-from fastapi import APIRouter, Security
+from fastapi import APIRouter, Header, HTTPException, Query, Response, Security
+from fastapi.responses import StreamingResponse
+from starlette.status import HTTP_422_UNPROCESSABLE_CONTENT
 
-from artistic_intelligence_data.dependencies import verify_api_key
+from artistic_intelligence_data.concurrency import run_cpu
+from artistic_intelligence_data.constants import DEFAULT_TIMEZONE
+from artistic_intelligence_data.dependencies import SnapshotBroadcasterDep, TrainProviderDep, verify_api_key
+from artistic_intelligence_data.logger import logger
 from artistic_intelligence_data.models import TrainPosition, TrainRecord
-from artistic_intelligence_data.response import CSVResponse
+from artistic_intelligence_data.response import (
+    BINARY_FORMAT_RESPONSES,
+    CSVResponse,
+    DataFormat,
+    JSONBytesResponse,
+    frame_response,
+    negotiate_format,
+)
+from artistic_intelligence_data.serialization import mapping_json, positions_keyed_json, records_json
+from artistic_intelligence_data.trains.material import TrainMaterial
 from artistic_intelligence_data.trains.questdb_train_provider import QuestDBTrainProvider
-from src.artistic_intelligence_data.constants import DEFAULT_TIMEZONE
-from src.artistic_intelligence_data.logger import logger
+from artistic_intelligence_data.trains.spatial import BoundingBox
+from artistic_intelligence_data.utils import BBOX_PATTERN, INTERVAL_PATTERN, parse_bbox, parse_interval
 
-# TODO can I inject an instance of QuestDBTrainProvider to all routes?
 router = APIRouter(prefix="/trains", tags=["trains"], dependencies=[Security(verify_api_key)])
 
+IntervalParam = Annotated[str | None, Query(pattern=INTERVAL_PATTERN, examples=["30s", "1m", "5m"])]
+BBoxParam = Annotated[str | None, Query(pattern=BBOX_PATTERN, examples=["110000,440000,150000,500000"])]
+FieldsParam = Annotated[str | None, Query(pattern=r"^[a-z]+(,[a-z]+)*$", examples=["x,y", "x,y,speed,type"])]
 
-@router.get("/locations")
-def get_locations(start: datetime | None = None, end: datetime | None = None) -> list[TrainRecord]:
+# record fields, as they are built from the location columns; timestamp and id are always included
+RECORD_FIELDS = {
+    "timestamp": pl.col("timestamp"),
+    "id": pl.col("train_id").cast(pl.String).cast(pl.Int64).alias("id"),
+    "x": pl.col("x").cast(pl.Int64),
+    "y": pl.col("y").cast(pl.Int64),
+    "speed": pl.col("speed"),
+    "direction": pl.col("direction"),
+    "accuracy": pl.col("accuracy"),
+    "type": pl.col("train_type").cast(pl.String).alias("type"),
+}
+FIELD_COLUMNS = {
+    "x": "x",
+    "y": "y",
+    "speed": "speed",
+    "direction": "direction",
+    "accuracy": "accuracy",
+    "type": "train_type",
+}
+
+
+def _interval(interval: str | None) -> timedelta | None:
+    try:
+        return parse_interval(interval)
+    except ValueError as e:
+        raise HTTPException(status_code=HTTP_422_UNPROCESSABLE_CONTENT, detail=str(e)) from e
+
+
+def _bbox(bbox: str | None) -> BoundingBox | None:
+    try:
+        return parse_bbox(bbox)
+    except ValueError as e:
+        raise HTTPException(status_code=HTTP_422_UNPROCESSABLE_CONTENT, detail=str(e)) from e
+
+
+def _fields(fields: str | None) -> list[str] | None:
+    """Parse the requested record fields, checked against the allow-list."""
+    if fields is None:
+        return None
+
+    requested = fields.split(",")
+    unknown = [field for field in requested if field not in RECORD_FIELDS]
+    if unknown:
+        raise HTTPException(
+            status_code=HTTP_422_UNPROCESSABLE_CONTENT,
+            detail=f"Unknown fields: {', '.join(unknown)}, choose from {', '.join(RECORD_FIELDS)}",
+        )
+    return requested
+
+
+def _field_columns(fields: list[str] | None) -> list[str] | None:
+    return None if fields is None else [FIELD_COLUMNS[field] for field in fields if field in FIELD_COLUMNS]
+
+
+@router.get("/locations", response_model=list[TrainRecord], responses=BINARY_FORMAT_RESPONSES)
+async def get_locations(
+    provider: TrainProviderDep,
+    start: datetime | None = None,
+    end: datetime | None = None,
+    format: DataFormat | None = None,
+    interval: IntervalParam = None,
+    bbox: BBoxParam = None,
+    fields: FieldsParam = None,
+    accept: Annotated[str | None, Header()] = None,
+) -> Response:
     """
     Get train locations for the requested period as list of records.
 
     - **start**: start of the requested period (timestamp, defaults to 10 seconds ago)
     - **end**: end of the requested period (timestamp, defaults to current time)
+    - **format**: `json` (default), or `arrow` (IPC stream) / `parquet` to get the records as binary table,
+      which is much faster for long periods. Can also be requested through the `Accept` header.
+    - **interval**: downsample to a record per train per interval (e.g. `30s`, `1m`, `5m`), averaging positions
+      and speed. Recommended for long periods, when not every 10-second point is needed.
+    - **bbox**: only locations within this bounding box, as `x_min,y_min,x_max,y_max` in RD New meters
+      (e.g. the Randstad), so that installations showing a region do not download every train in the country.
+    - **fields**: only these record fields, comma separated (e.g. `x,y,type`). Timestamp and id are always included.
+      Other columns are not even queried, so this makes requests faster.
     """
-    provider = QuestDBTrainProvider()
-    locations = provider.get_train_locations(start, end)
-    return [
-        TrainRecord(
-            timestamp=rec["timestamp"],
-            id=rec["train_id"],
-            x=rec["x"],
-            y=rec["y"],
-            speed=rec["speed"],
-            direction=rec["direction"],
-            accuracy=rec["accuracy"],
-            type=rec["train_type"],
-        )
-        for rec in locations.to_dicts()
-    ]
+    requested = _fields(fields)
+    locations = await provider.get_train_locations(
+        start, end, _interval(interval), _bbox(bbox), columns=_field_columns(requested)
+    )
+    data_format = negotiate_format(format, accept)
+    return await run_cpu(_records_response, locations, data_format, requested)
+
+
+def _records_response(locations: pl.DataFrame, data_format: DataFormat, fields: list[str] | None = None) -> Response:
+    records = locations.select(
+        expr
+        for field, expr in RECORD_FIELDS.items()
+        if fields is None or field in fields or field in ("timestamp", "id")
+    )
+
+    if data_format != DataFormat.JSON:
+        return frame_response(records, data_format)
+
+    return JSONBytesResponse(records_json(records))
+
+
+@router.get("/latest", response_model=list[TrainRecord], responses=BINARY_FORMAT_RESPONSES)
+async def get_latest_locations(
+    provider: TrainProviderDep,
+    train_type: str | None = None,
+    material: TrainMaterial | None = None,
+    bbox: BBoxParam = None,
+    format: DataFormat | None = None,
+    accept: Annotated[str | None, Header()] = None,
+) -> Response:
+    """
+    Get the last known location of every train that reported recently (in the last 10 minutes), a record per train.
+    Use this instead of requesting a short period of `/locations` and deduplicating.
+
+    - **train_type**: only trains of this type (e.g. `IC`, `SPR`)
+    - **material**: only trains of this main material (e.g. `VIRM`)
+    - **bbox**: only trains within this bounding box, as in `/locations`
+    - **format**: `json` (default), `arrow` or `parquet`, as in `/locations`
+    """
+    locations = await provider.get_latest_positions(train_type, material, _bbox(bbox))
+    data_format = negotiate_format(format, accept)
+    return await run_cpu(_records_response, locations, data_format)
+
+
+@router.get("/nearest", response_model=list[TrainRecord])
+async def get_nearest_locations(
+    provider: TrainProviderDep,
+    x: Annotated[float, Query(examples=[121000])],
+    y: Annotated[float, Query(examples=[487000])],
+    count: Annotated[int, Query(ge=1, le=100)] = 10,
+) -> Response:
+    """
+    Get the last known locations of the trains nearest to a point, nearest first.
+
+    - **x**, **y**: the point in RD New meters
+    - **count**: the number of trains
+    """
+    locations = await provider.get_nearest_positions(x, y, count)
+    return await run_cpu(_records_response, locations, DataFormat.JSON)
 
 
-@router.get("/locations-keyed")
-def get_locations_keyed_by_timestamp(
-    start: datetime | None = None, end: datetime | None = None
-) -> dict[str, list[TrainPosition]]:
+@router.get("/locations-keyed", response_model=dict[str, list[TrainPosition]])
+async def get_locations_keyed_by_timestamp(
+    provider: TrainProviderDep,
+    start: datetime | None = None,
+    end: datetime | None = None,
+    interval: IntervalParam = None,
+    bbox: BBoxParam = None,
+) -> Response:
     """
     Get train positions for the requested period as lists keyed by timestamp.
     Contains a subset of location attributes to minimize transport size.
 
     - **start**: start of the requested period (timestamp, defaults to 10 seconds ago)
     - **end**: end of the requested period (timestamp, defaults to current time)
+    - **interval**: downsample to a position per train per interval, as in `/locations`
+    - **bbox**: only positions within this bounding box, as in `/locations`
     """
 
-    provider = QuestDBTrainProvider()
-    locations = provider.get_train_locations(start, end)
+    locations = await provider.get_train_locations(start, end, _interval(interval), _bbox(bbox), columns=["x", "y"])
+    return JSONBytesResponse(await run_cpu(positions_keyed_json, locations))
 
-    keyed_positions = (
-        locations.with_columns(
-            pl.col("timestamp").dt.strftime("%Y-%m-%dT%H:%M:%S"),  # removes timezone info
-        )
-        .select(["timestamp", "train_id", "x", "y"])
-        .rows_by_key(key="timestamp", named=True)
-    )
 
-    # TODO check if this cast can be more efficient inside the polars conversion
-    return {k: [TrainPosition(id=r["train_id"], x=r["x"], y=r["y"]) for r in v] for k, v in keyed_positions.items()}
+@router.get("/stream", response_class=StreamingResponse)
+async def stream_positions(broadcaster: SnapshotBroadcasterDep) -> StreamingResponse:
+    """
+    Get live train positions pushed as server-sent events, a new event every time a new snapshot comes in.
+    Every event holds the positions of all trains at a single timestamp, formatted as in `/locations-keyed`.
+
+    Slow clients skip snapshots rather than fall behind.
+    """
+    return StreamingResponse(broadcaster.events(), media_type="text/event-stream")
+
+
+def _write_touch_csv(pivoted_locations: pl.DataFrame, include_header: bool = True) -> str:
+    return pivoted_locations.with_columns(
+        pl.col("timestamp").dt.strftime("%H:%M:%S"),
+    ).write_csv(include_header=include_header)
 
 
-@router.get("/locations-pivoted", response_class=CSVResponse)
-def get_locations_pivoted(start: datetime | None = None, end: datetime | None = None) -> str:
+@router.get("/locations-pivoted", response_class=CSVResponse, response_model=None)
+async def get_locations_pivoted(
+    provider: TrainProviderDep,
+    start: datetime | None = None,
+    end: datetime | None = None,
+    interval: IntervalParam = None,
+    bbox: BBoxParam = None,
+    stream: bool = False,
+) -> str | StreamingResponse:
     """
     Get train locations pivoted for use in TouchDesigner.
-    Start and end parameters work the same as in `/records`.
+    Start, end, interval and bbox parameters work the same as in `/locations`.
+
+    - **stream**: send the CSV in chunks of one hour while it is being created, recommended for long periods.
+      All chunks have the same columns, being every train seen in the requested period.
     """
-    provider = QuestDBTrainProvider()
-    pivoted_locations = provider.get_locations_torbenized(start, end)
-    return pivoted_locations.with_columns(
-        pl.col("timestamp").dt.strftime("%H:%M:%S"),
-    ).write_csv()
+    sample_interval, bounding_box = _interval(interval), _bbox(bbox)
+    if stream:
+
+        async def csv_parts() -> AsyncIterator[str]:
+            include_header = True
+            async for chunk in provider.iter_locations_torbenized(
+                start, end, interval=sample_interval, bbox=bounding_box
+            ):
+                yield await run_cpu(_write_touch_csv, chunk, include_header)
+                include_header = False
+
+        return StreamingResponse(csv_parts(), media_type=CSVResponse.media_type)
+
+    pivoted_locations = await provider.get_locations_torbenized(start, end, interval=sample_interval, bbox=bounding_box)
+    return await run_cpu(_write_touch_csv, pivoted_locations)
 
 
 @router.get("/types/csv", response_class=CSVResponse)
-def get_train_types_csv(start: datetime | None = None, end: datetime | None = None) -> str:
+async def get_train_types_csv(
+    provider: TrainProviderDep, start: datetime | None = None, end: datetime | None = None
+) -> str:
     """
     Get train types for the requested period as a CSV string.
     """
-    provider = QuestDBTrainProvider()
-    train_types = provider.get_train_types(start, end)
+    train_types = await provider.get_train_types(start, end)
     return train_types.write_csv()
 
 
-@router.get("/types/json")
-def get_train_types_json(start: datetime | None = None, end: datetime | None = None) -> dict[int, str]:
+@router.get("/types/json", response_model=dict[int, str])
+async def get_train_types_json(
+    provider: TrainProviderDep, start: datetime | None = None, end: datetime | None = None
+) -> Response:
     """
     Get train types for the requested period as a JSON dictionary.
     """
-    provider = QuestDBTrainProvider()
-    train_types = provider.get_train_types(start, end)
-    return dict(train_types.select("train_id", "train_type").iter_rows())
+    train_types = await provider.get_train_types(start, end)
+    return JSONBytesResponse(
+        mapping_json(
+            train_types.with_columns(pl.col("train_id").cast(pl.String).cast(pl.Int64)),
+            key="train_id",
+            value="train_type",
+        )
+    )
 
 
-@router.get("/materials/main")
-def get_train_main_materials(start: datetime | None = None, end: datetime | None = None) -> dict[int, str]:
+@router.get("/materials/main", response_model=dict[int, str])
+async def get_train_main_materials(
+    provider: TrainProviderDep, start: datetime | None = None, end: datetime | None = None
+) -> Response:
     """
     Get train materials for the requested period as a JSON dictionary.
     These are the main type of 'materieel', not the subtype (e.g. 'VIRM', not 'VIRM IV').
+    Only trains with train info in the requested period are included, whether their locations were seen or not.
 
     - **start**: start of the requested period (timestamp, defaults to 1 hour ago)
     - **end**: end of the requested period (timestamp, defaults to current time)
     """
-    provider = QuestDBTrainProvider()
-    train_material = provider.get_train_material(start, end)
-    return dict(train_material.select("train_id", "material").iter_rows())
+    train_material = await provider.get_train_material(start, end)
+    return JSONBytesResponse(
+        mapping_json(
+            train_material.with_columns(pl.col("train_id").cast(pl.String).cast(pl.Int64)),
+            key="train_id",
+            value="material",
+        )
+    )
 
 
 if __name__ == "__main__":
-    time_start = perf_counter()
-    start = datetime.now(DEFAULT_TIMEZONE) - timedelta(hours=3)
-    data = get_locations_pivoted(start=start)
-    # data = get_train_types(start=start)
-    print(data)
-    logger.info("Local run done", duration=perf_counter() - time_start)
+
+    async def main() -> None:
+        time_start = perf_counter()
+        start = datetime.now(DEFAULT_TIMEZONE) - timedelta(hours=3)
+        async with QuestDBTrainProvider.from_env() as provider:
+            data = await get_locations_pivoted(provider, start=start)
+            # data = await get_train_types(start=start)
+        print(data)
+        logger.info("Local run done", duration=perf_counter() - time_start)
+
+    asyncio.run(main())
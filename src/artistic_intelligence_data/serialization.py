@@ -0,0 +1,134 @@
+"""
+Build JSON payloads from Polars columns in bulk, instead of creating a pydantic model or dict for every row.
+
+Every value is formatted as a JSON literal with column expressions, then the literals are concatenated into
+objects and arrays. The output is byte-identical to what FastAPI produces from the pydantic models in `models.py`.
+"""
+
+from collections.abc import Callable
+
+import polars as pl
+
+
+def json_literal(column: str | pl.Expr, dtype: pl.DataType) -> pl.Expr:
+    """Format a column of the given dtype as JSON literals, the same way pydantic serializes them."""
+    expr = pl.col(column) if isinstance(column, str) else column
+
+    if dtype.is_integer():
+        return expr.cast(pl.String).fill_null("null")
+
+    if dtype.is_float():
+        expr = expr.cast(pl.Float64)  # pydantic formats every float as double precision
+        return (
+            pl.when(expr.is_finite())
+            .then(expr.cast(pl.String).str.replace("e+", "e", literal=True))
+            .otherwise(pl.lit("null"))  # also for NaN and infinity
+        )
+
+    if isinstance(dtype, pl.Datetime):
+        return _map_unique(expr, _datetime_literal if dtype.time_zone else _naive_datetime_literal)
+
+    return _map_unique(expr, _string_literal)
+
+
+def _map_unique(expr: pl.Expr, format_literal: Callable[[pl.Expr], pl.Expr]) -> pl.Expr:
+    """
+    Format only the distinct values as literals, then map all values to them.
+    Timestamps and train types repeat for every train and record, and formatting them is the expensive part.
+    """
+    unique = expr.unique(maintain_order=True)
+    return expr.replace_strict(unique, format_literal(unique), default=None).fill_null("null")
+
+
+def _datetime_literal(expr: pl.Expr, offset: str = "%:z") -> pl.Expr:
+    formatted = (
+        pl.when(expr.dt.microsecond() == 0)
+        .then(expr.dt.strftime(f"%Y-%m-%dT%H:%M:%S{offset}"))
+        .otherwise(expr.dt.strftime(f"%Y-%m-%dT%H:%M:%S%.6f{offset}"))
+        .str.replace(r"\+00:00$", "Z")
+    )
+    return pl.concat_str(pl.lit('"'), formatted, pl.lit('"'))
+
+
+def _naive_datetime_literal(expr: pl.Expr) -> pl.Expr:
+    return _datetime_literal(expr, offset="")
+
+
+def _string_literal(expr: pl.Expr) -> pl.Expr:
+    # let polars take care of escaping, then strip the wrapping object
+    encoded = pl.struct(expr.cast(pl.String).alias("v")).struct.json_encode()
+    return encoded.str.slice(len('{"v":'), encoded.str.len_chars() - len('{"v":}'))
+
+
+def json_object(fields: dict[str, pl.Expr]) -> pl.Expr:
+    """Concatenate JSON literals into a JSON object per row, with the given keys in order."""
+    parts: list[pl.Expr] = []
+    for i, (key, literal) in enumerate(fields.items()):
+        parts.append(pl.lit(("{" if i == 0 else ",") + f'"{key}":'))
+        parts.append(literal)
+    parts.append(pl.lit("}"))
+
+    return pl.concat_str(parts)
+
+
+def _join(frame: pl.DataFrame, column: str, opening: str, closing: str) -> bytes:
+    joined = frame.get_column(column).str.join(",").item() if frame.height else ""
+    return f"{opening}{joined}{closing}".encode()
+
+
+def _row_object(schema: pl.Schema) -> pl.Expr:
+    return json_object({column: json_literal(column, dtype) for column, dtype in schema.items()})
+
+
+def records_json(frame: pl.DataFrame) -> bytes:
+    """Serialize a frame to a JSON array of objects, with the column names as keys."""
+    objects = frame.select(_row_object(frame.schema).alias("json"))
+    return _join(objects, "json", "[", "]")
+
+
+def records_keyed_json(frame: pl.DataFrame, key: str) -> bytes:
+    """
+    Serialize a frame to a JSON object of arrays of objects, grouped by the (string) key column in order of appearance.
+    The objects contain all other columns.
+    """
+    schema = frame.drop(key).schema
+    groups = (
+        frame.select(
+            json_literal(key, pl.String()).alias("key"),
+            _row_object(schema).alias("json"),
+        )
+        .group_by("key", maintain_order=True)
+        .agg(pl.col("json").str.join(","))
+        .select(pl.concat_str("key", pl.lit(":["), "json", pl.lit("]")).alias("json"))
+    )
+    return _join(groups, "json", "{", "}")
+
+
+def mapping_json(frame: pl.DataFrame, key: str, value: str) -> bytes:
+    """
+    Serialize two columns to a JSON object mapping one to the other.
+
+    Like building a dict from the rows, a repeated key keeps its first position but gets its last value.
+    """
+    schema = frame.schema
+    entries = (
+        frame.group_by(key, maintain_order=True)
+        .agg(pl.col(value).last())
+        .select(
+            pl.concat_str(
+                pl.lit('"'), pl.col(key).cast(pl.String), pl.lit('":'), json_literal(value, schema[value])
+            ).alias("json")
+        )
+    )
+    return _join(entries, "json", "{", "}")
+
+
+def positions_keyed_json(locations: pl.DataFrame) -> bytes:
+    """Serialize train locations to train positions (see `TrainPosition`) keyed by timestamp."""
+    positions = locations.select(
+        pl.col("timestamp").dt.strftime("%Y-%m-%dT%H:%M:%S"),  # removes timezone info
+        pl.col("train_id").cast(pl.String).cast(pl.Int64).alias("id"),
+        pl.col("x").cast(pl.Int64),
+        pl.col("y").cast(pl.Int64),
+    )
+    return records_keyed_json(positions, key="timestamp")
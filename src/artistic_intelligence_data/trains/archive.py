@@ -0,0 +1,210 @@
+"""
+Parquet archive of closed days of train locations, the cold tier next to QuestDB.
+
+The archive is a hive partitioned dataset, with a file per (UTC) day:
+
+    <archive dir>/train_locations/date=2026-03-05/data.parquet
+
+and a manifest (`manifest.json`) with the days exported so far: their row count, size and export time.
+Days are exported by `QuestDBTrainProvider.archive_closed_days` (see `scripts/trains/export_archive.py`),
+and queries for periods within the archive are answered from it instead of from QuestDB.
+The same layout can be served on its own by the `ParquetTrainProvider`.
+"""
+
+import json
+import os
+from datetime import UTC, date, datetime, time, timedelta
+from pathlib import Path
+from threading import Lock
+from typing import Any, cast
+from zoneinfo import ZoneInfo
+
+import polars as pl
+
+from artistic_intelligence_data.constants import DEFAULT_TIMEZONE
+from artistic_intelligence_data.trains.categories import TRAIN_ID, TRAIN_TYPE, encode_categories
+from artistic_intelligence_data.trains.spatial import BoundingBox
+
+LOCATIONS_TABLE = "train_locations"
+
+# columns of train locations as returned, for periods without any files
+LOCATIONS_SCHEMA = pl.Schema(
+    {
+        "timestamp": pl.Datetime("us", DEFAULT_TIMEZONE.key),
+        "train_id": TRAIN_ID,
+        "train_type": TRAIN_TYPE,
+        "x": pl.Float64,
+        "y": pl.Float64,
+        "speed": pl.Float64,
+        "direction": pl.Float64,
+        "accuracy": pl.Float64,
+        "source": pl.String,
+    }
+)
+
+
+def empty_locations(columns: list[str] | None = None) -> pl.DataFrame:
+    """Get an empty frame of train locations, with all columns or the given ones besides timestamp and train id."""
+    names = list(LOCATIONS_SCHEMA) if columns is None else ["timestamp", "train_id", *columns]
+    return pl.DataFrame(schema={name: LOCATIONS_SCHEMA[name] for name in names})
+
+
+def scan_dataset(
+    directory: Path,
+    start: datetime,
+    end: datetime,
+    valid_locations: bool = False,
+    bbox: BoundingBox | None = None,
+    end_inclusive: bool = True,
+    time_shift: timedelta = timedelta(0),
+) -> pl.LazyFrame | None:
+    """
+    Lazily scan the rows of a Parquet dataset in the given period that have a train id, or None if there are no files.
+
+    Optionally only valid locations, or only locations within the bounding box. All filters are pushed down into
+    the scan, and a hive `date` partition (UTC days) is pruned, so that only the files and row groups that can match
+    are read. Rows are as stored, the given period is shifted back by the given time shift (e.g. to replay old data).
+    """
+    if not any(directory.rglob("*.parquet")):
+        return None
+
+    scan = pl.scan_parquet(directory / "**" / "*.parquet", hive_partitioning=True)
+    schema = scan.collect_schema()
+
+    # compare with moments in the time zone of the files, so that the filter is pushed down into the scan
+    time_zone = cast(pl.Datetime, schema["timestamp"]).time_zone
+
+    def stored_time(moment: datetime) -> datetime:
+        # shift in UTC, local time would be off by an hour when the shift spans a DST change
+        moment = (moment.astimezone(UTC) - time_shift).astimezone(ZoneInfo(time_zone or "UTC"))
+        return moment if time_zone else moment.replace(tzinfo=None)
+
+    first, last = stored_time(start), stored_time(end)
+    conditions = [
+        pl.col("timestamp").is_between(first, last, closed="both" if end_inclusive else "left"),
+        pl.col("train_id") != "",
+    ]
+    if "date" in schema:
+        conditions.append(pl.col("date").is_between(first.astimezone(UTC).date(), last.astimezone(UTC).date()))
+    if valid_locations:
+        conditions += [pl.col("x") > 0, pl.col("y") > 0]
+    if bbox:
+        conditions.append(bbox.expr())
+
+    return scan.filter(*conditions)
+
+
+def read_dataset(
+    directory: Path,
+    start: datetime,
+    end: datetime,
+    columns: list[str] | None = None,
+    valid_locations: bool = False,
+    bbox: BoundingBox | None = None,
+    end_inclusive: bool = True,
+    time_shift: timedelta = timedelta(0),
+) -> pl.DataFrame | None:
+    """
+    Read the rows of a Parquet dataset in the given period that have a train id, or None if there are no files.
+    See `scan_dataset` for the filters, and optionally only the given columns besides timestamp and train id.
+    Timestamps are returned in local time, shifted forward by the given time shift.
+    """
+    scan = scan_dataset(directory, start, end, valid_locations, bbox, end_inclusive, time_shift)
+    if scan is None:
+        return None
+
+    scan = scan.select("timestamp", "train_id", *columns) if columns is not None else scan.drop("date", strict=False)
+    result = cast(pl.DataFrame, scan.collect())
+
+    stored = cast(pl.Datetime, result.schema["timestamp"])
+    timestamp = pl.col("timestamp") if stored.time_zone else pl.col("timestamp").dt.replace_time_zone("UTC")
+    return encode_categories(result).with_columns((timestamp + time_shift).dt.convert_time_zone("Europe/Amsterdam"))
+
+
+class ParquetArchive:
+    """
+    Closed days of train locations in Parquet, see the module docs for the layout.
+
+    Only the most recent run of consecutive days in the manifest counts as covered, so that a gap (e.g. a day that
+    failed to export) sends queries for that period to QuestDB instead of returning nothing.
+    The manifest is reloaded when the export job (possibly another process) changed it.
+    """
+
+    def __init__(self, directory: Path):
+        self.directory = directory
+        self._manifest_path = directory / "manifest.json"
+        self._manifest: dict[str, Any] = {"days": {}}
+        self._manifest_mtime: float | None = None
+        self._lock = Lock()
+
+    def _load(self) -> dict[str, Any]:
+        with self._lock:
+            try:
+                mtime = self._manifest_path.stat().st_mtime
+            except FileNotFoundError:
+                return self._manifest
+
+            if mtime != self._manifest_mtime:
+                self._manifest = json.loads(self._manifest_path.read_text())
+                self._manifest_mtime = mtime
+            return self._manifest
+
+    def days(self) -> list[date]:
+        """Get the days in the archive, in order."""
+        return sorted(date.fromisoformat(day) for day in self._load()["days"])
+
+    def coverage(self) -> tuple[datetime, datetime] | None:
+        """Get the (UTC) period covered by the most recent run of consecutive days, end exclusive, if any."""
+        days = self.days()
+        if not days:
+            return None
+
+        first = days[-1]
+        while first - timedelta(days=1) in days:
+            first -= timedelta(days=1)
+
+        return _day_start(first), _day_start(days[-1] + timedelta(days=1))
+
+    def write_day(self, day: date, locations: pl.DataFrame) -> dict[str, Any]:
+        """
+        Write the locations of a (UTC) day to its partition, and add the day to the manifest.
+        Files are written next to their destination first and then moved, so readers never see a partial file.
+        """
+        partition = self.directory / LOCATIONS_TABLE / f"date={day.isoformat()}"
+        partition.mkdir(parents=True, exist_ok=True)
+
+        # stored as QuestDB has it: naive UTC timestamps and plain strings
+        stored = locations.with_columns(
+            pl.col("timestamp").dt.convert_time_zone("UTC").dt.replace_time_zone(None),
+            *(pl.col(column).cast(pl.String) for column in ("train_id", "train_type") if column in locations.columns),
+        )
+        path = partition / "data.parquet"
+        stored.sort("timestamp", "train_id").write_parquet(path.with_suffix(".tmp"), statistics=True)
+        os.replace(path.with_suffix(".tmp"), path)
+
+        entry = {"rows": stored.height, "bytes": path.stat().st_size, "exported_at": datetime.now(tz=UTC).isoformat()}
+        with self._lock:
+            manifest = json.loads(self._manifest_path.read_text()) if self._manifest_path.exists() else {"days": {}}
+            manifest["days"][day.isoformat()] = entry
+            self._manifest_path.with_suffix(".tmp").write_text(json.dumps(manifest, indent=2, sort_keys=True))
+            os.replace(self._manifest_path.with_suffix(".tmp"), self._manifest_path)
+        return entry
+
+    def read(
+        self,
+        start: datetime,
+        end: datetime,
+        columns: list[str] | None = None,
+        bbox: BoundingBox | None = None,
+        end_inclusive: bool = True,
+    ) -> pl.DataFrame:
+        """Read the valid train locations in the given period, ordered by timestamp and train id."""
+        result = read_dataset(self.directory / LOCATIONS_TABLE, start, end, columns, True, bbox, end_inclusive)
+        if result is None:
+            return empty_locations(columns)
+
+        return result.sort("timestamp", pl.col("train_id").cast(pl.String))
+
+
+def _day_start(day: date) -> datetime:
+    return datetime.combine(day, time(), tzinfo=UTC)
@@ -0,0 +1,103 @@
+from collections import OrderedDict
+from collections.abc import Hashable
+from datetime import UTC, datetime, timedelta
+from threading import Lock
+
+import polars as pl
+
+
+class TimeBucketCache:
+    """
+    In-memory LRU cache of query results split into aligned time buckets, bounded by a byte budget.
+
+    Only closed buckets should be stored: buckets that lie far enough in the past that no new data will arrive.
+    Their contents never change, so cached buckets never have to be invalidated, only evicted.
+    """
+
+    def __init__(self, bucket_size: timedelta, max_bytes: int, settle_time: timedelta = timedelta(seconds=30)):
+        self.bucket_size = bucket_size
+        self.max_bytes = max_bytes
+        self.settle_time = settle_time
+
+        self._buckets: OrderedDict[Hashable, pl.DataFrame] = OrderedDict()
+        self._bucket_bytes: dict[Hashable, int] = {}
+        self._total_bytes = 0
+        self._lock = Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _floor(self, moment: datetime) -> datetime:
+        """Round a moment down to the nearest bucket boundary, buckets are aligned to the unix epoch."""
+        bucket_seconds = self.bucket_size.total_seconds()
+        epoch_seconds = moment.timestamp()
+        return datetime.fromtimestamp(epoch_seconds - epoch_seconds % bucket_seconds, tz=UTC)
+
+    def closed_until(self, now: datetime) -> datetime:
+        """Get the moment up to which all buckets are closed, i.e. the start of the oldest open bucket."""
+        return self._floor(now - self.settle_time)
+
+    def split(self, start: datetime, end: datetime) -> list[tuple[datetime, datetime]]:
+        """Get the aligned buckets (start inclusive, end exclusive) that together cover the given range."""
+        buckets = []
+        bucket_start = self._floor(start)
+        while bucket_start < end:
+            bucket_end = bucket_start + self.bucket_size
+            buckets.append((bucket_start, bucket_end))
+            bucket_start = bucket_end
+
+        return buckets
+
+    def partition(self, frame: pl.DataFrame, buckets: list[tuple[datetime, datetime]]) -> list[pl.DataFrame]:
+        """Split a frame with the rows for consecutive buckets into a frame per bucket, by its timestamp column."""
+        bucket_us = self.bucket_size // timedelta(microseconds=1)
+        parts = frame.with_columns(_bucket=pl.col("timestamp").dt.epoch("us") // bucket_us).partition_by(
+            "_bucket", as_dict=True, include_key=False, maintain_order=True
+        )
+        return [parts.get((self._index(bucket_start),), frame.clear()) for bucket_start, _ in buckets]
+
+    def _index(self, bucket_start: datetime) -> int:
+        return int(bucket_start.timestamp() // self.bucket_size.total_seconds())
+
+    def get(self, key: Hashable) -> pl.DataFrame | None:
+        with self._lock:
+            frame = self._buckets.get(key)
+            if frame is None:
+                self.misses += 1
+                return None
+
+            self._buckets.move_to_end(key)
+            self.hits += 1
+            return frame
+
+    def put(self, key: Hashable, frame: pl.DataFrame) -> None:
+        size = int(frame.estimated_size())
+        if size > self.max_bytes:
+            return  # would evict everything else and still not fit
+
+        with self._lock:
+            if key in self._buckets:
+                self._total_bytes -= self._bucket_bytes[key]
+
+            self._buckets[key] = frame
+            self._buckets.move_to_end(key)
+            self._bucket_bytes[key] = size
+            self._total_bytes += size
+
+            while self._total_bytes > self.max_bytes:
+                evicted_key, _ = self._buckets.popitem(last=False)
+                self._total_bytes -= self._bucket_bytes.pop(evicted_key)
+                self.evictions += 1
+
+    def get_stats(self) -> dict[str, int]:
+        """Get cache metrics: hit, miss and eviction counts and current memory use."""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "buckets": len(self._buckets),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+            }
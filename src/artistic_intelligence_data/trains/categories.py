@@ -0,0 +1,29 @@
+"""
+Process-wide dictionaries for the string columns of train data that repeat on every row.
+
+Train ids and types are stored as Polars categoricals, of which the codes are stable for the lifetime of the process:
+every frame maps the same string to the same code. So filtering, grouping and pivoting can run on integer codes,
+and codes can be kept outside of Polars (e.g. in the live buffer) and turned back into categoricals later.
+
+Note that casting a categorical to an integer gives its code, cast to string first to parse the value as a number.
+"""
+
+import polars as pl
+
+_NAMESPACE = "artistic_intelligence_data.trains"
+
+TRAIN_ID = pl.Categorical(pl.Categories("train_id", namespace=_NAMESPACE))
+TRAIN_TYPE = pl.Categorical(pl.Categories("train_type", namespace=_NAMESPACE))
+
+CATEGORY_DTYPES = {"train_id": TRAIN_ID, "train_type": TRAIN_TYPE}
+
+# polars frees the mapping of named categories as soon as no column uses them anymore, after which codes start over:
+# keep an (empty) column of each alive, so that codes stay valid for the lifetime of the process
+_ANCHORS = [pl.Series(dtype=dtype) for dtype in CATEGORY_DTYPES.values()]
+
+
+def encode_categories(frame: pl.DataFrame) -> pl.DataFrame:
+    """Cast the train id and train type columns of a frame (if there) to their process-wide categoricals."""
+    return frame.with_columns(
+        pl.col(column).cast(dtype) for column, dtype in CATEGORY_DTYPES.items() if column in frame.columns
+    )
@@ -0,0 +1,77 @@
+from datetime import datetime, timedelta
+from threading import Lock
+from zoneinfo import ZoneInfo
+
+import polars as pl
+
+from artistic_intelligence_data.trains.spatial import BoundingBox, GridIndex
+
+DEFAULT_MAX_AGE = timedelta(minutes=10)
+
+
+class LatestPositions:
+    """
+    The last known location of every train, keyed by train id: the answer to "where is every train right now".
+
+    Seeded once with a `LATEST ON` query (see `replace`), after which every poll of the live tail is merged in,
+    so that requests are answered from memory in the number of trains. Trains that have not reported for longer than
+    the maximum age are dropped, e.g. trains that ended their trip.
+    Positions are indexed with a grid, for region and nearest-N queries.
+    """
+
+    def __init__(self, max_age: timedelta = DEFAULT_MAX_AGE, max_staleness: timedelta = timedelta(seconds=30)):
+        self.max_age = max_age
+        self.max_staleness = max_staleness  # serve from memory only if the poller updated it at most this long ago
+
+        self._positions: pl.DataFrame | None = None  # a row per train id, ordered by train id
+        self._index: GridIndex | None = None
+        self._lock = Lock()
+
+        self.updated_at: datetime | None = None
+
+    def replace(self, latest: pl.DataFrame, updated_at: datetime) -> None:
+        """Replace all positions with the given latest location per train, e.g. the result of a `LATEST ON` query."""
+        with self._lock:
+            self._set(latest.unique("train_id", keep="last"), updated_at)
+
+    def update(self, locations: pl.DataFrame, updated_at: datetime) -> None:
+        """Merge newly polled locations (ordered by timestamp), if seeded: the newest location per train wins."""
+        with self._lock:
+            if self._positions is None:
+                return
+
+            merged = pl.concat([self._positions, locations.select(self._positions.columns)], how="vertical_relaxed")
+            self._set(merged.unique("train_id", keep="last"), updated_at)
+
+    def _set(self, positions: pl.DataFrame, now: datetime) -> None:
+        if not positions.is_empty():
+            local = ZoneInfo("Europe/Amsterdam")
+            positions = positions.filter(pl.col("timestamp") >= (now - self.max_age).astimezone(local))
+
+        self._positions = positions.sort(pl.col("train_id").cast(pl.String))
+        self._index = GridIndex.from_frame(self._positions)
+        self.updated_at = now
+
+    def is_fresh(self, now: datetime) -> bool:
+        """Whether the positions are seeded and kept up to date."""
+        return self.updated_at is not None and now - self.updated_at <= self.max_staleness
+
+    def get(self, bbox: BoundingBox | None = None) -> pl.DataFrame:
+        """Get the last known location of every train (within the bounding box, if given), ordered by train id."""
+        with self._lock:
+            positions, index = self._positions, self._index
+
+        if positions is None or index is None:
+            return pl.DataFrame()
+
+        return positions if bbox is None else positions[index.within(bbox)]
+
+    def nearest(self, x: float, y: float, count: int) -> pl.DataFrame:
+        """Get the last known locations of the `count` trains nearest to the given point, nearest first."""
+        with self._lock:
+            positions, index = self._positions, self._index
+
+        if positions is None or index is None:
+            return pl.DataFrame()
+
+        return positions[index.nearest(x, y, count)]
@@ -0,0 +1,168 @@
+import asyncio
+from collections.abc import Awaitable, Callable
+from datetime import UTC, datetime, timedelta
+from threading import Lock
+from typing import cast
+
+import numpy as np
+import polars as pl
+
+from artistic_intelligence_data.logger import get_logger
+
+_logger = get_logger(__name__)
+
+EPOCH = datetime(1970, 1, 1, tzinfo=UTC)
+
+
+class LiveTailBuffer:
+    """
+    Ring buffer with the most recent train locations, kept in preallocated arrays per column.
+
+    Rows are appended in time order by a single poller, that fetches only the rows since the last seen timestamp
+    minus the settle time. Those replace the rows from that moment on, so rows ingested late are picked up
+    by the next poll. Requests for a period that falls inside the buffer can then be served without touching
+    the database.
+    Numeric columns are kept as floats (null as NaN), as are the codes of categoricals; other columns as objects.
+    Timestamps are kept as epoch microseconds.
+    """
+
+    def __init__(
+        self,
+        retention: timedelta,
+        capacity: int,
+        poll_interval: timedelta = timedelta(seconds=5),
+        settle_time: timedelta = timedelta(0),
+    ):
+        self.retention = retention
+        self.capacity = capacity
+        self.poll_interval = poll_interval  # also the staleness we accept when serving the most recent period
+        self.settle_time = settle_time  # refetched on every poll, for rows ingested late
+
+        self._schema: pl.Schema | None = None
+        self._columns: dict[str, np.ndarray] = {}
+        self._size = 0  # number of valid rows
+        self._head = 0  # position of the next write, which is also the oldest row once the buffer is full
+        self._lock = Lock()
+
+        self.covered_from: datetime | None = None  # start of the period of which the buffer holds all rows
+        self.polled_at: datetime | None = None  # wall clock time of the last successful poll
+        self.last_timestamp: datetime | None = None
+
+    def _allocate(self, schema: pl.Schema) -> None:
+        self._schema = schema
+        for name, dtype in schema.items():
+            if isinstance(dtype, pl.Datetime):
+                self._columns[name] = np.zeros(self.capacity, dtype=np.int64)
+            elif dtype.is_numeric() or isinstance(dtype, pl.Categorical):
+                self._columns[name] = np.full(self.capacity, np.nan, dtype=np.float64)
+            else:
+                self._columns[name] = np.empty(self.capacity, dtype=object)
+
+    def _to_numpy(self, series: pl.Series) -> np.ndarray:
+        if isinstance(series.dtype, pl.Datetime):
+            return series.dt.epoch("us").to_numpy()
+        if isinstance(series.dtype, pl.Categorical):
+            return series.to_physical().cast(pl.Float64).to_numpy()  # codes are stable, see categories.py
+        if series.dtype.is_numeric():
+            return series.cast(pl.Float64).to_numpy()
+        return series.to_numpy()
+
+    def append(
+        self, frame: pl.DataFrame, covered_from: datetime, polled_at: datetime, replace_from: datetime | None = None
+    ) -> None:
+        """
+        Append newly polled rows, sorted by timestamp. Rows in the buffer from `replace_from` on are replaced by them,
+        the other rows in the buffer must all be older.
+
+        The period from `covered_from` to `polled_at` is complete after this append, if it connects to the buffer.
+        """
+        with self._lock:
+            if self._schema is None:
+                if frame.is_empty():
+                    return  # nothing to learn the schema from yet
+                self._allocate(frame.schema)
+                self.covered_from = covered_from
+
+            if replace_from is not None:
+                self._truncate(replace_from)
+
+            frame = frame.select(self._columns.keys()).tail(self.capacity)
+            row_count = frame.height
+            positions = (self._head + np.arange(row_count)) % self.capacity
+            overwritten = max(0, self._size + row_count - self.capacity)
+
+            for name, values in self._columns.items():
+                values[positions] = self._to_numpy(frame.get_column(name))
+
+            self._head = (self._head + row_count) % self.capacity
+            self._size = min(self._size + row_count, self.capacity)
+            self.polled_at = polled_at
+            if row_count:
+                self.last_timestamp = cast(datetime, frame.get_column("timestamp").max())
+            elif self._size:
+                newest = int(self._columns["timestamp"][(self._head - 1) % self.capacity])
+                self.last_timestamp = EPOCH + timedelta(microseconds=newest)
+
+            if overwritten:
+                # the oldest timestamp left may have lost some of its rows, so only count what comes after it
+                oldest = int(self._columns["timestamp"][self._head])
+                self.covered_from = EPOCH + timedelta(microseconds=oldest + 1)
+
+            if self.covered_from is not None:
+                self.covered_from = max(self.covered_from, polled_at - self.retention)
+
+    def _truncate(self, start: datetime) -> None:
+        """Drop the newest rows, from the given moment on."""
+        order = (self._head - self._size + np.arange(self._size)) % self.capacity
+        kept = int(np.searchsorted(self._columns["timestamp"][order], _epoch_us(start), side="left"))
+        self._head = (self._head - (self._size - kept)) % self.capacity
+        self._size = kept
+
+    def covers(self, start: datetime, end: datetime) -> bool:
+        """Whether the buffer holds all rows for the given period."""
+        if self.covered_from is None or self.polled_at is None:
+            return False
+
+        return start >= self.covered_from and end <= self.polled_at + self.poll_interval
+
+    def get(self, start: datetime, end: datetime) -> pl.DataFrame:
+        """Get the rows for the given period (inclusive), in the order they were appended."""
+        with self._lock:
+            if self._schema is None:
+                return pl.DataFrame()
+
+            order = (self._head - self._size + np.arange(self._size)) % self.capacity
+            timestamps = self._columns["timestamp"][order]
+            first = np.searchsorted(timestamps, _epoch_us(start), side="left")
+            last = np.searchsorted(timestamps, _epoch_us(end), side="right")
+            selected = order[first:last]
+
+            series = []
+            for name, dtype in self._schema.items():
+                values = self._columns[name][selected]
+                if isinstance(dtype, pl.Datetime):
+                    timestamp = pl.from_epoch(pl.Series(name, values), time_unit="us").dt.replace_time_zone("UTC")
+                    series.append(timestamp.dt.convert_time_zone(dtype.time_zone or "UTC"))
+                elif isinstance(dtype, pl.Categorical):
+                    series.append(pl.Series(name, values).fill_nan(None).cast(pl.UInt32).cast(dtype))
+                elif dtype.is_numeric():
+                    series.append(pl.Series(name, values).fill_nan(None).cast(dtype))
+                else:
+                    series.append(pl.Series(name, values, dtype=dtype))
+
+            return pl.DataFrame(series)
+
+
+def _epoch_us(moment: datetime) -> int:
+    return (moment - EPOCH) // timedelta(microseconds=1)
+
+
+async def run_poller(poll: Callable[[], Awaitable[None]], interval: timedelta) -> None:
+    """Await the poll function every interval, until cancelled."""
+    while True:
+        try:
+            await poll()
+        except Exception:
+            _logger.exception("Polling failed, retrying next interval", poll=getattr(poll, "__name__", repr(poll)))
+
+        await asyncio.sleep(interval.total_seconds())
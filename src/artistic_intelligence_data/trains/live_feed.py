@@ -0,0 +1,93 @@
+import asyncio
+from collections.abc import AsyncIterator, Callable
+from datetime import datetime, timedelta
+from typing import cast
+
+import polars as pl
+
+from artistic_intelligence_data.logger import get_logger
+from artistic_intelligence_data.serialization import positions_keyed_json
+
+_logger = get_logger(__name__)
+
+# get the newest complete snapshot of train locations (all trains at a single timestamp), if there is one
+SnapshotSource = Callable[[], pl.DataFrame | None]
+
+
+class SnapshotBroadcaster:
+    """
+    Fan out server-sent events to every subscriber of the live train positions stream.
+
+    Each snapshot is serialized once and handed to all subscribers. Every subscriber has a small queue:
+    when a slow consumer has not picked up its previous events, the oldest is dropped instead of blocking the others.
+    """
+
+    def __init__(self, queue_size: int = 2):
+        self.queue_size = queue_size
+        self.latest_event: bytes | None = None
+        self.published = 0
+        self.dropped = 0
+
+        self._subscribers: set[asyncio.Queue[bytes]] = set()
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def publish(self, event: bytes) -> None:
+        self.latest_event = event
+        self.published += 1
+
+        for queue in self._subscribers:
+            if queue.full():
+                queue.get_nowait()
+                self.dropped += 1
+            queue.put_nowait(event)
+
+    async def events(self) -> AsyncIterator[bytes]:
+        """Subscribe and get events until the subscriber goes away, starting with the latest one (if any)."""
+        queue: asyncio.Queue[bytes] = asyncio.Queue(maxsize=self.queue_size)
+        if self.latest_event is not None:
+            queue.put_nowait(self.latest_event)
+
+        self._subscribers.add(queue)
+        try:
+            while True:
+                yield await queue.get()
+        finally:
+            self._subscribers.discard(queue)
+
+    def get_stats(self) -> dict[str, int]:
+        return {"subscribers": self.subscriber_count, "published": self.published, "dropped": self.dropped}
+
+
+def format_event(snapshot: pl.DataFrame, timestamp: datetime) -> bytes:
+    """Format a snapshot as server-sent event, with the same data as `/trains/locations-keyed` would have."""
+    return (
+        b"event: positions\nid: "
+        + timestamp.isoformat().encode()
+        + b"\ndata: "
+        + positions_keyed_json(snapshot)
+        + b"\n\n"
+    )
+
+
+async def run_broadcaster(source: SnapshotSource, broadcaster: SnapshotBroadcaster, interval: timedelta) -> None:
+    """
+    Check the source for a new snapshot every interval and publish it, until cancelled.
+    A snapshot that gained locations ingested late is published again.
+    """
+    last_timestamp: datetime | None = None
+    last_height = 0
+    while True:
+        try:
+            snapshot = source()
+            if snapshot is not None and not snapshot.is_empty():
+                timestamp = cast(datetime, snapshot.get_column("timestamp").max())
+                if last_timestamp is None or (timestamp, snapshot.height) > (last_timestamp, last_height):
+                    broadcaster.publish(format_event(snapshot, timestamp))
+                    last_timestamp, last_height = timestamp, snapshot.height
+        except Exception:
+            _logger.exception("Publishing the live snapshot failed, retrying next interval")
+
+        await asyncio.sleep(interval.total_seconds())
@@ -1,5 +1,7 @@
 from enum import StrEnum
 
+import polars as pl
+
 
 class TrainMaterial(StrEnum):
     """Main types of 'materieel' for trains. Every type has subtypes e.g. 'VIRM IV' but they are not here."""
@@ -12,3 +14,19 @@ class TrainMaterial(StrEnum):
     GTW = "GTW"
     ICM = "ICM"
     ICNG = "ICNG"
+
+
+MATERIAL_DTYPE = pl.Enum([material.value for material in TrainMaterial])
+
+
+def classify_material(first_part_type: pl.Expr) -> pl.Expr:
+    """
+    Get the main material of a first part type (e.g. 'VIRM IV' is VIRM) as `MATERIAL_DTYPE`, or null if unknown.
+    Types are matched by prefix, in order of `TrainMaterial`: the first match wins.
+    """
+    upper = first_part_type.str.to_uppercase()
+    material = pl.when(upper.str.starts_with(TrainMaterial.VIRM.value)).then(pl.lit(TrainMaterial.VIRM.value))
+    for other in list(TrainMaterial)[1:]:
+        material = material.when(upper.str.starts_with(other.value)).then(pl.lit(other.value))
+
+    return material.otherwise(None).cast(MATERIAL_DTYPE)
@@ -0,0 +1,116 @@
+from datetime import datetime, timedelta
+from threading import Lock
+from zoneinfo import ZoneInfo
+
+import polars as pl
+
+from artistic_intelligence_data.trains.categories import TRAIN_ID, TRAIN_TYPE
+from artistic_intelligence_data.trains.material import MATERIAL_DTYPE, classify_material
+
+METADATA_SCHEMA = pl.Schema(
+    {
+        "train_id": TRAIN_ID,
+        "train_type": TRAIN_TYPE,
+        "first_seen": pl.Datetime("us", "Europe/Amsterdam"),
+        "last_seen": pl.Datetime("us", "Europe/Amsterdam"),
+        "first_part_type": pl.String(),
+        "material": MATERIAL_DTYPE,
+        # period of the train info rows of the train, which may differ from when its locations were seen
+        "first_info": pl.Datetime("us", "Europe/Amsterdam"),
+        "last_info": pl.Datetime("us", "Europe/Amsterdam"),
+    }
+)
+
+
+class TrainMetadataStore:
+    """
+    Dimension table with a row per train seen recently: its type, the type of its first part, and its material.
+    Trains are known from their locations, their train info, or both.
+
+    This metadata changes at most hourly, so it is refreshed in the background (see `refresh_metadata` of the
+    provider) and requests for types or materials are answered from memory, in the number of trains.
+    In between refreshes, the trains in every poll of the live tail are observed, so new trains show up right away.
+    """
+
+    def __init__(self, retention: timedelta, refresh_interval: timedelta = timedelta(minutes=5)):
+        self.retention = retention
+        self.refresh_interval = refresh_interval
+
+        self._trains = METADATA_SCHEMA.to_frame()
+        self._lock = Lock()
+
+        self.covered_from: datetime | None = None  # start of the period of which the store knows all trains
+        self.refreshed_at: datetime | None = None
+
+    def replace(
+        self, train_types: pl.DataFrame, first_part_types: pl.DataFrame, covered_from: datetime, refreshed_at: datetime
+    ) -> None:
+        """
+        Replace all metadata, with the type and first and last seen timestamp per train from the train locations,
+        and the first part type and first and last info timestamp per train from the train info.
+        """
+        trains = train_types.join(first_part_types, on="train_id", how="full", coalesce=True).with_columns(
+            material=classify_material(pl.col("first_part_type"))
+        )
+        with self._lock:
+            self._trains = trains.select(METADATA_SCHEMA.names()).cast(METADATA_SCHEMA)
+            self.covered_from = covered_from
+            self.refreshed_at = refreshed_at
+
+    def observe(self, locations: pl.DataFrame) -> None:
+        """Update the type and last seen timestamp of the trains in the given locations, adding new trains."""
+        if locations.is_empty():
+            return
+
+        seen = locations.group_by("train_id").agg(
+            pl.col("train_type").last(), first_seen=pl.col("timestamp").min(), last_seen=pl.col("timestamp").max()
+        )
+        with self._lock:
+            merged = self._trains.join(seen, on="train_id", how="full", coalesce=True, suffix="_seen")
+            self._trains = merged.select(
+                "train_id",
+                pl.coalesce("train_type_seen", "train_type").alias("train_type"),
+                pl.min_horizontal("first_seen", "first_seen_seen").alias("first_seen"),
+                pl.max_horizontal("last_seen", "last_seen_seen").alias("last_seen"),
+                "first_part_type",
+                "material",
+                "first_info",
+                "last_info",
+            )
+
+    def covers(self, start: datetime) -> bool:
+        """Check if the store knows all trains seen from the given moment on."""
+        return self.covered_from is not None and start >= self.covered_from
+
+    def get(self, start: datetime, end: datetime) -> pl.DataFrame:
+        """Get the metadata of the trains seen in the given period, ordered by train id."""
+        with self._lock:
+            trains = self._trains
+
+        local = ZoneInfo("Europe/Amsterdam")
+        return (
+            trains.filter(pl.col("last_seen") >= start.astimezone(local), pl.col("first_seen") <= end.astimezone(local))
+            .select("train_id", "train_type", "first_part_type", "material")
+            .sort(pl.col("train_id").cast(pl.String))
+        )
+
+    def get_materials(self, start: datetime, end: datetime) -> pl.DataFrame:
+        """Get the first part type and material of the trains with train info in the given period, by train id."""
+        with self._lock:
+            trains = self._trains
+
+        local = ZoneInfo("Europe/Amsterdam")
+        return (
+            trains.filter(pl.col("last_info") >= start.astimezone(local), pl.col("first_info") <= end.astimezone(local))
+            .select("train_id", "first_part_type", "material")
+            .sort(pl.col("train_id").cast(pl.String))
+        )
+
+    def get_stats(self) -> dict[str, int]:
+        """Get the number of trains known, and the age of the metadata in seconds (-1 if never refreshed)."""
+        with self._lock:
+            trains = self._trains.height
+            refreshed_at = self.refreshed_at
+
+        age = int((datetime.now(tz=refreshed_at.tzinfo) - refreshed_at).total_seconds()) if refreshed_at else -1
+        return {"trains": trains, "age_seconds": age}
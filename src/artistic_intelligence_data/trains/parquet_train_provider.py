@@ -0,0 +1,297 @@
+import asyncio
+import os
+from collections.abc import AsyncIterator
+from datetime import datetime, timedelta
+from pathlib import Path
+from types import TracebackType
+from typing import Any, Self, cast
+
+import polars as pl
+
+from artistic_intelligence_data.concurrency import run_cpu
+from artistic_intelligence_data.constants import DEFAULT_TIMEZONE
+from artistic_intelligence_data.logger import get_logger
+from artistic_intelligence_data.trains.archive import empty_locations, read_dataset, scan_dataset
+from artistic_intelligence_data.trains.latest import DEFAULT_MAX_AGE
+from artistic_intelligence_data.trains.material import MATERIAL_DTYPE, TrainMaterial, classify_material
+from artistic_intelligence_data.trains.pivot import pivot_locations
+from artistic_intelligence_data.trains.sampling import SAMPLE_AGGREGATES, downsample, floor_to_interval
+from artistic_intelligence_data.trains.spatial import BoundingBox
+from artistic_intelligence_data.utils import validate_start_end
+
+_logger = get_logger(__name__)
+
+
+class ParquetTrainProvider:
+    """
+    Get train data from local Parquet files instead of a database, e.g. to benchmark or load test the API offline.
+
+    The data directory holds a dataset per table (`train_locations` and optionally `train_info`), as Parquet files
+    in any (hive partitioned) directory layout, with the same columns as the QuestDB tables, e.g. the archive
+    written by `ParquetArchive`.
+    Files are scanned lazily: filters on timestamp, coordinates and train id are pushed down into the scan,
+    so that only the row groups that can match are read.
+
+    To replay archived data as if it were live, give a replay offset: the archive is shifted forward in time by it,
+    so that e.g. the default "last minute" requests get data.
+    """
+
+    def __init__(self, data_dir: Path, replay_offset: timedelta = timedelta(0)):
+        self._data_dir = data_dir
+        self._replay_offset = replay_offset
+        self._scans = 0
+
+    @classmethod
+    def from_env(cls) -> Self:
+        """
+        Create a provider for the files in `PARQUET_DATA_DIR`. If `PARQUET_REPLAY_FROM` is set (an ISO timestamp),
+        the archive is replayed from that moment on, starting now.
+        """
+        data_dir = Path(os.getenv("PARQUET_DATA_DIR", "data/parquet"))
+
+        replay_offset = timedelta(0)
+        if replay_from := os.getenv("PARQUET_REPLAY_FROM"):
+            moment = datetime.fromisoformat(replay_from)
+            if moment.tzinfo is None:
+                moment = moment.replace(tzinfo=DEFAULT_TIMEZONE)
+            replay_offset = datetime.now(tz=DEFAULT_TIMEZONE) - moment
+
+        _logger.info("Serving train data from Parquet", data_dir=str(data_dir), replay_offset=str(replay_offset))
+        return cls(data_dir, replay_offset)
+
+    @property
+    def live_poll_interval(self) -> timedelta | None:
+        """There is no live data to poll."""
+        return None
+
+    @property
+    def metadata_refresh_interval(self) -> timedelta | None:
+        """Metadata is derived from the files on every request."""
+        return None
+
+    async def open(self) -> None:
+        """Nothing to open, files are scanned per request."""
+
+    async def close(self) -> None:
+        """Nothing to close."""
+
+    async def __aenter__(self) -> Self:
+        await self.open()
+        return self
+
+    async def __aexit__(
+        self, exc_type: type[BaseException] | None, exc: BaseException | None, traceback: TracebackType | None
+    ) -> None:
+        await self.close()
+
+    async def poll_live_tail(self) -> None:
+        """Nothing to poll."""
+
+    async def refresh_metadata(self) -> None:
+        """Nothing to refresh."""
+
+    def get_latest_snapshot(self) -> pl.DataFrame | None:
+        return None
+
+    def get_pool_stats(self) -> dict[str, int]:
+        return {}
+
+    def get_cache_stats(self) -> dict[str, int]:
+        return {}
+
+    def get_metadata_stats(self) -> dict[str, int]:
+        return {}
+
+    def get_query_stats(self) -> dict[str, int]:
+        """Get the number of Parquet scans executed."""
+        return {"scans": self._scans}
+
+    def _read(
+        self,
+        table: str,
+        start: datetime,
+        end: datetime,
+        columns: list[str] | None = None,
+        valid_locations: bool = False,
+        bbox: BoundingBox | None = None,
+    ) -> pl.DataFrame | None:
+        """Read the rows of a table in the given (inclusive) period, see `read_dataset`."""
+        self._scans += 1
+        return read_dataset(
+            self._data_dir / table, start, end, columns, valid_locations, bbox, time_shift=self._replay_offset
+        )
+
+    def _read_locations(
+        self, start: datetime, end: datetime, columns: list[str] | None, bbox: BoundingBox | None
+    ) -> pl.DataFrame:
+        """Read the valid train locations in the given period, ordered by timestamp and train id."""
+        locations = self._read("train_locations", start, end, columns, True, bbox)
+        if locations is None:
+            return empty_locations(columns)
+
+        return locations.sort("timestamp", pl.col("train_id").cast(pl.String))
+
+    def _read_train_ids(self, start: datetime, end: datetime, bbox: BoundingBox | None) -> list[str]:
+        """Get the ids of the trains with valid locations in the given period, in order, without reading those."""
+        self._scans += 1
+        scan = scan_dataset(self._data_dir / "train_locations", start, end, True, bbox, time_shift=self._replay_offset)
+        if scan is None:
+            return []
+
+        train_ids = cast(pl.DataFrame, scan.select(pl.col("train_id").cast(pl.String).unique().sort()).collect())
+        return train_ids.to_series().to_list()
+
+    async def get_train_locations(
+        self,
+        start: datetime | None = None,
+        end: datetime | None = None,
+        interval: timedelta | None = None,
+        bbox: BoundingBox | None = None,
+        columns: list[str] | None = None,
+    ) -> pl.DataFrame:
+        """
+        Get train locations in table format, as `QuestDBTrainProvider.get_train_locations`.
+        Downsampling is done in memory.
+        """
+        unknown = set(columns or []) - set(SAMPLE_AGGREGATES)
+        if unknown:
+            raise ValueError(f"Unknown location columns: {', '.join(sorted(unknown))}")
+
+        start, end = validate_start_end(start, end)
+        if interval:
+            columns = [column for column in SAMPLE_AGGREGATES if columns is None or column in columns]
+
+        locations = await run_cpu(self._read_locations, start, end, columns, bbox)
+        return await run_cpu(downsample, locations, interval) if interval else locations
+
+    async def get_latest_positions(
+        self,
+        train_type: str | None = None,
+        material: TrainMaterial | None = None,
+        bbox: BoundingBox | None = None,
+    ) -> pl.DataFrame:
+        """Get the last known location of every train that reported recently, ordered by train id."""
+        end = datetime.now(tz=DEFAULT_TIMEZONE)
+        locations = await self.get_train_locations(end - DEFAULT_MAX_AGE, end, bbox=bbox)
+        if locations.is_empty():
+            return locations
+
+        positions = locations.unique("train_id", keep="last").sort(pl.col("train_id").cast(pl.String))
+        if train_type is not None:
+            positions = positions.filter(pl.col("train_type") == train_type)
+        if material is not None:
+            materials = await self.get_train_material()
+            train_ids = materials.filter(pl.col("material") == material.value).get_column("train_id")
+            positions = positions.filter(pl.col("train_id").is_in(train_ids))
+
+        return positions
+
+    async def get_nearest_positions(self, x: float, y: float, count: int) -> pl.DataFrame:
+        """Get the last known locations of the trains nearest to the given RD New point, nearest first."""
+        positions = await self.get_latest_positions()
+        if positions.is_empty():
+            return positions
+
+        distance = ((pl.col("x") - x) ** 2 + (pl.col("y") - y) ** 2).sqrt()
+        return positions.sort(distance, maintain_order=True).head(count)
+
+    async def get_locations_torbenized(
+        self,
+        start: datetime | None = None,
+        end: datetime | None = None,
+        scale: bool = True,
+        interval: timedelta | None = None,
+        bbox: BoundingBox | None = None,
+    ) -> pl.DataFrame:
+        """Get train locations pivoted to wide format where every train_id has its own column."""
+        locations = await self.get_train_locations(start, end, interval, bbox, ["train_type", "x", "y", "speed"])
+        train_ids = locations.get_column("train_id").unique().cast(pl.String).sort().to_list()
+        return await run_cpu(lambda: pivot_locations(locations, train_ids, scale).to_frame())
+
+    async def iter_locations_torbenized(
+        self,
+        start: datetime | None = None,
+        end: datetime | None = None,
+        scale: bool = True,
+        chunk_size: timedelta = timedelta(hours=1),
+        interval: timedelta | None = None,
+        bbox: BoundingBox | None = None,
+    ) -> AsyncIterator[pl.DataFrame]:
+        """
+        Same as `get_locations_torbenized`, but yields the result in time-ordered chunks to bound memory use,
+        reading the files per chunk.
+
+        All chunks have the same columns: the trains seen anywhere in the requested period, looked up front.
+        When downsampling, chunks are aligned to whole intervals so that no sample is split over two chunks.
+        """
+        start, end = validate_start_end(start, end)
+        train_ids = await run_cpu(self._read_train_ids, start, end, bbox)
+
+        origin = start
+        if interval:
+            chunk_size = max(chunk_size // interval, 1) * interval
+            origin = floor_to_interval(start, interval)
+
+        chunk_start = start
+        while chunk_start <= end:
+            next_start = origin + ((chunk_start - origin) // chunk_size + 1) * chunk_size
+            chunk_end = min(next_start - timedelta(microseconds=1), end)  # prevent overlap, the end is inclusive
+
+            locations = await self.get_train_locations(
+                chunk_start, chunk_end, interval, bbox, ["train_type", "x", "y", "speed"]
+            )
+            yield await run_cpu(lambda chunk: pivot_locations(chunk, train_ids, scale).to_frame(), locations)
+
+            chunk_start = next_start
+
+    async def get_train_types(self, start: datetime | None = None, end: datetime | None = None) -> pl.DataFrame:
+        """Get type (IC, SPR, ...) for each train_id in the given period."""
+        locations = await self.get_train_locations(start, end, columns=["train_type"])
+        if locations.is_empty():
+            return pl.DataFrame(schema={"train_id": pl.String, "train_type": pl.String})
+
+        return locations.group_by("train_id").agg(pl.col("train_type").last()).sort(pl.col("train_id").cast(pl.String))
+
+    async def get_train_material(self, start: datetime | None = None, end: datetime | None = None) -> pl.DataFrame:
+        """Get the material of the first part of each train in the given period (default last hour)."""
+        start, end = validate_start_end(start=start, end=end, minutes=60)
+        info = await run_cpu(self._read, "train_info", start, end, ["first_part_type"])
+        if info is None:
+            return pl.DataFrame(
+                schema={"train_id": pl.String, "first_part_type": pl.String, "material": MATERIAL_DTYPE}
+            )
+
+        return (
+            info.group_by("train_id")
+            .agg(pl.col("first_part_type").first())
+            .with_columns(material=classify_material(pl.col("first_part_type")))
+            .filter(pl.col("material").is_not_null())
+            .sort(pl.col("train_id").cast(pl.String))
+        )
+
+    async def get_current_count(self) -> int:
+        """Get the number of train records for the last default period."""
+        return (await self.get_train_locations(columns=[])).height
+
+    async def get_ingestion_stats(self) -> dict[str, Any]:
+        """Get the number of records and trains for the last default period, and the lag of the replayed data."""
+        now = datetime.now(tz=DEFAULT_TIMEZONE)
+        recent, latest = await asyncio.gather(
+            self.get_train_locations(columns=[]),
+            run_cpu(self._read, "train_locations", now - DEFAULT_MAX_AGE, now, ["source"]),
+        )
+
+        sources = []
+        if latest is not None and not latest.is_empty():
+            per_source = latest.group_by("source").agg(pl.col("timestamp").max().alias("latest")).sort("source")
+            sources = [
+                {"source": source, "latest": timestamp, "lag_seconds": round((now - timestamp).total_seconds(), 3)}
+                for source, timestamp in per_source.iter_rows()
+            ]
+
+        return {
+            "records": recent.height,
+            "trains": recent.get_column("train_id").n_unique() if recent.height else 0,
+            "lag_seconds": min((source["lag_seconds"] for source in sources), default=None),
+            "sources": sources,
+        }
@@ -0,0 +1,241 @@
+"""
+Pivot engine for the torbenized (TouchDesigner) format of train locations.
+
+Train ids and timestamps are dictionary encoded to matrix indices, and the numeric values are scattered into a
+preallocated float32 matrix (timestamps x vars x trains). The train type is kept apart as codes into a dictionary
+of type names, so numbers and strings never have to share a column until the frame is written out.
+Train ids and types are looked up by their categorical codes, see `categories.py`.
+"""
+
+import asyncio
+from datetime import UTC, datetime, timedelta
+from typing import cast
+
+import numpy as np
+import polars as pl
+
+from artistic_intelligence_data.trains.categories import TRAIN_ID, TRAIN_TYPE, encode_categories
+
+# numeric variables, in the order of the middle axis of the values matrix
+NUMERIC_VARS = ("speed", "x", "y")
+
+# rows for each timestamp in the pivoted layout, in this order
+PIVOT_VARS = ("speed", "train_type", "x", "y")
+
+
+class PivotedLocations:
+    """Train locations in wide format: a value for every timestamp, variable and train id."""
+
+    def __init__(
+        self,
+        timestamps: pl.Series,
+        train_ids: list[str],
+        values: np.ndarray,
+        type_codes: np.ndarray,
+        type_names: list[str],
+    ):
+        self.timestamps = timestamps  # unique and sorted
+        self.train_ids = train_ids
+        self.values = values  # float32 (timestamps, NUMERIC_VARS, trains), NaN where there is no record
+        self.type_codes = type_codes  # int16 (timestamps, trains), index into type_names or -1 if no record
+        self.type_names = type_names
+
+    @property
+    def height(self) -> int:
+        return len(self.timestamps)
+
+    def present(self) -> np.ndarray:
+        """Get a mask of the trains that have at least one record."""
+        has_record = (self.type_codes >= 0) | ~np.isnan(self.values).all(axis=1)
+        return has_record.any(axis=0)
+
+    def subset(self, rows: slice, columns: np.ndarray | None = None) -> "PivotedLocations":
+        """Get the given range of timestamps, for the trains at the given column indices (or all trains)."""
+        if columns is None:
+            columns = np.arange(len(self.train_ids))
+
+        return PivotedLocations(
+            self.timestamps[rows],
+            [self.train_ids[i] for i in columns],
+            self.values[rows][:, :, columns],
+            self.type_codes[rows][:, columns],
+            self.type_names,
+        )
+
+    def between(self, start: datetime, end: datetime | None = None) -> slice:
+        """Get the range of rows with a timestamp in the given period, start and end inclusive, or open ended."""
+        epochs = self.timestamps.dt.epoch("us").to_numpy()
+        return slice(
+            int(np.searchsorted(epochs, _epoch_us(start), side="left")),
+            None if end is None else int(np.searchsorted(epochs, _epoch_us(end), side="right")),
+        )
+
+    def to_frame(self) -> pl.DataFrame:
+        """
+        Get the pivoted locations as a frame with a row per timestamp and variable (ordered as in `PIVOT_VARS`),
+        and a string column per train id. Missing values are null.
+        """
+        height, width = self.height, len(self.train_ids)
+
+        frame = pl.DataFrame(
+            {
+                "timestamp": self.timestamps.gather(np.repeat(np.arange(height), len(PIVOT_VARS))),
+                "var": pl.Series(PIVOT_VARS * height, dtype=pl.String),
+            }
+        )
+        if width == 0:
+            return frame
+
+        numeric = pl.DataFrame(
+            self.values.reshape(height * len(NUMERIC_VARS), width), schema=self.train_ids, orient="row"
+        ).select(pl.all().fill_nan(None).cast(pl.String))
+        types = pl.DataFrame(self.type_codes, schema=self.train_ids, orient="row").select(
+            pl.all().replace_strict(range(len(self.type_names)), self.type_names, default=None, return_dtype=pl.String)
+        )
+
+        # interleave the numeric rows with the train type rows, in the order of PIVOT_VARS
+        order = np.empty((height, len(PIVOT_VARS)), dtype=np.int64)
+        for i, var in enumerate(PIVOT_VARS):
+            if var == "train_type":
+                order[:, i] = height * len(NUMERIC_VARS) + np.arange(height)
+            else:
+                order[:, i] = np.arange(height) * len(NUMERIC_VARS) + NUMERIC_VARS.index(var)
+
+        wide = pl.concat([numeric, types]).select(pl.all().gather(order.ravel()))
+        return frame.hstack(wide.get_columns())
+
+
+def pivot_locations(locations: pl.DataFrame, train_ids: list[str], scale: bool = True) -> PivotedLocations:
+    """
+    Pivot train locations (with timestamp, train_id, train_type, x, y and speed) to the wide format,
+    with a column for each of the given train ids. Locations of other trains are left out.
+
+    If a train has more than one record at a timestamp, the first one is used.
+    The 'scale' parameter scales the RDNew x/y coordinates to a (-1,1) square grid for use in TouchDesigner.
+    """
+    if scale:
+        locations = locations.with_columns(
+            ((pl.col("x") - 155_000) / (325_000 / 2)).round(5),
+            ((pl.col("y") - 463_000) / (325_000 / 2)).round(5),
+        )
+
+    locations = encode_categories(locations)
+    column_index = _index_of(locations.get_column("train_id"), pl.Series(train_ids, dtype=TRAIN_ID))
+    locations = locations.filter(column_index >= 0)
+    columns = column_index[column_index >= 0]
+
+    timestamps = locations.get_column("timestamp").unique().sort()
+    rows = np.searchsorted(timestamps.to_physical().to_numpy(), locations.get_column("timestamp").to_physical())
+
+    type_names = locations.get_column("train_type").drop_nulls().unique().sort().to_list()
+    codes = _index_of(locations.get_column("train_type"), pl.Series(type_names, dtype=TRAIN_TYPE))
+
+    values = np.full((len(timestamps), len(NUMERIC_VARS), len(train_ids)), np.nan, dtype=np.float32)
+    type_codes = np.full((len(timestamps), len(train_ids)), -1, dtype=np.int16)
+
+    # of duplicate records for a train at a timestamp, only scatter the first
+    first = pl.Series(rows * len(train_ids) + columns).is_first_distinct().to_numpy()
+    rows, columns = rows[first], columns[first]
+
+    numeric = locations.select(pl.col(list(NUMERIC_VARS)).cast(pl.Float32)).to_numpy()
+    values[rows, :, columns] = numeric[first]
+    type_codes[rows, columns] = codes[first]
+
+    return PivotedLocations(timestamps, train_ids, values, type_codes, type_names)
+
+
+def _index_of(series: pl.Series, values: pl.Series) -> np.ndarray:
+    """Get the index in the given values of every item in a categorical series, or -1 if not in there (or null)."""
+    codes = series.to_physical()
+    value_codes = values.to_physical().to_numpy()
+
+    # a lookup table from categorical code to index, with an extra last entry for null
+    size = max(cast(int | None, codes.max()) or 0, value_codes.max(initial=0)) + 2
+    lookup = np.full(size, -1, dtype=np.int32)
+    lookup[value_codes] = np.arange(len(value_codes))
+    return lookup[codes.fill_null(size - 1).to_numpy()]
+
+
+class RollingPivot:
+    """
+    Pivoted train locations for a sliding window (e.g. the last 3 hours) that is kept up to date incrementally.
+
+    Instead of pivoting the whole window again, only the locations that came in since the previous update are pivoted
+    and appended, with new columns for newly seen trains, and rows that slid out of the window are dropped.
+
+    Locations are ingested with some lag, so the last `settle_time` of an update may still be incomplete: it is
+    served, but not counted as covered. The next update drops it and fetches it again, so late locations are not missed.
+    """
+
+    def __init__(self, scale: bool = True, settle_time: timedelta = timedelta(0)):
+        self.scale = scale
+        self.settle_time = settle_time
+        self.covered_from: datetime | None = None
+        self.covered_until: datetime | None = None
+        self.lock = asyncio.Lock()  # held while updating, by the provider
+
+        self._pivoted: PivotedLocations | None = None
+
+    def covers(self, start: datetime) -> bool:
+        """Check if a window starting at the given moment can be served after appending newer locations only."""
+        if self.covered_from is None or self.covered_until is None:
+            return False
+
+        return self.covered_from <= start <= self.covered_until
+
+    def reset(self, locations: pl.DataFrame, start: datetime, end: datetime) -> None:
+        """Pivot all the locations for the given period, replacing whatever was there."""
+        train_ids = locations.get_column("train_id").cast(pl.String).unique().sort().to_list()
+        self._pivoted = pivot_locations(locations, train_ids, self.scale)
+        self.covered_from, self.covered_until = start, max(start, end - self.settle_time)
+
+    def extend(self, locations: pl.DataFrame, end: datetime) -> None:
+        """
+        Append the locations after `covered_until`, up to the given end. The rows after `covered_until` that were
+        served before are replaced by them, as they may have been incomplete.
+        """
+        current = cast(PivotedLocations, self._pivoted)
+        current = current.subset(current.between(cast(datetime, self.covered_from), cast(datetime, self.covered_until)))
+        new_ids = sorted(set(locations.get_column("train_id").unique().cast(pl.String)) - set(current.train_ids))
+        train_ids = current.train_ids + new_ids
+        added = pivot_locations(locations, train_ids, self.scale)
+
+        # map the type codes of the added rows to the type names known so far, extended with new ones
+        type_names = current.type_names + [name for name in added.type_names if name not in current.type_names]
+        type_map = np.array([type_names.index(name) for name in added.type_names] + [-1], dtype=np.int16)
+
+        padding = len(new_ids)
+        self._pivoted = PivotedLocations(
+            pl.concat([current.timestamps, added.timestamps]),
+            train_ids,
+            np.concatenate(
+                [np.pad(current.values, ((0, 0), (0, 0), (0, padding)), constant_values=np.nan), added.values]
+            ),
+            np.concatenate(
+                [np.pad(current.type_codes, ((0, 0), (0, padding)), constant_values=-1), type_map[added.type_codes]]
+            ),
+            type_names,
+        )
+        self.covered_until = max(cast(datetime, self.covered_until), end - self.settle_time)
+
+    def trim(self, start: datetime) -> None:
+        """Drop the rows before the given moment, and the columns of trains that have no records left."""
+        pivoted = cast(PivotedLocations, self._pivoted)
+        kept = pivoted.subset(pivoted.between(start))
+        self._pivoted = kept.subset(slice(None), np.flatnonzero(kept.present()))
+        self.covered_from = max(cast(datetime, self.covered_from), start)
+
+    def get(self, start: datetime, end: datetime) -> pl.DataFrame:
+        """
+        Get the pivoted locations for the given period, in the same layout as a fresh pivot of the period would be:
+        with columns for the trains seen in the period only, in order of train id.
+        """
+        pivoted = cast(PivotedLocations, self._pivoted)
+        window = pivoted.subset(pivoted.between(start, end))
+        columns = np.flatnonzero(window.present())
+        columns = columns[np.argsort([window.train_ids[i] for i in columns], kind="stable")]
+        return window.subset(slice(None), columns).to_frame()
+
+
+def _epoch_us(moment: datetime) -> int:
+    return (moment - datetime(1970, 1, 1, tzinfo=UTC)) // timedelta(microseconds=1)
@@ -0,0 +1,115 @@
+import os
+from collections.abc import AsyncIterator
+from datetime import datetime, timedelta
+from types import TracebackType
+from typing import Any, Protocol, Self
+
+import polars as pl
+
+from artistic_intelligence_data.trains.material import TrainMaterial
+from artistic_intelligence_data.trains.spatial import BoundingBox
+
+
+class TrainProvider(Protocol):
+    """
+    Source of train data for the API, e.g. QuestDB (`QuestDBTrainProvider`) or archived Parquet files for benchmarks
+    and load tests (`ParquetTrainProvider`). Select one with the `TRAIN_PROVIDER` env var, see `create_train_provider`.
+
+    Returned timestamps are in local time (Europe/Amsterdam), train ids and types are process-wide categoricals.
+    Background work (live polling, metadata refresh) only runs for providers that have an interval for it.
+    """
+
+    @property
+    def live_poll_interval(self) -> timedelta | None: ...
+
+    @property
+    def metadata_refresh_interval(self) -> timedelta | None: ...
+
+    async def open(self) -> None: ...
+
+    async def close(self) -> None: ...
+
+    async def __aenter__(self) -> Self: ...
+
+    async def __aexit__(
+        self, exc_type: type[BaseException] | None, exc: BaseException | None, traceback: TracebackType | None
+    ) -> None: ...
+
+    async def poll_live_tail(self) -> None: ...
+
+    async def refresh_metadata(self) -> None: ...
+
+    def get_latest_snapshot(self) -> pl.DataFrame | None: ...
+
+    async def get_train_locations(
+        self,
+        start: datetime | None = None,
+        end: datetime | None = None,
+        interval: timedelta | None = None,
+        bbox: BoundingBox | None = None,
+        columns: list[str] | None = None,
+    ) -> pl.DataFrame: ...
+
+    async def get_latest_positions(
+        self,
+        train_type: str | None = None,
+        material: TrainMaterial | None = None,
+        bbox: BoundingBox | None = None,
+    ) -> pl.DataFrame: ...
+
+    async def get_nearest_positions(self, x: float, y: float, count: int) -> pl.DataFrame: ...
+
+    async def get_locations_torbenized(
+        self,
+        start: datetime | None = None,
+        end: datetime | None = None,
+        scale: bool = True,
+        interval: timedelta | None = None,
+        bbox: BoundingBox | None = None,
+    ) -> pl.DataFrame: ...
+
+    def iter_locations_torbenized(
+        self,
+        start: datetime | None = None,
+        end: datetime | None = None,
+        scale: bool = True,
+        chunk_size: timedelta = timedelta(hours=1),
+        interval: timedelta | None = None,
+        bbox: BoundingBox | None = None,
+    ) -> AsyncIterator[pl.DataFrame]: ...
+
+    async def get_train_types(self, start: datetime | None = None, end: datetime | None = None) -> pl.DataFrame: ...
+
+    async def get_train_material(self, start: datetime | None = None, end: datetime | None = None) -> pl.DataFrame: ...
+
+    async def get_current_count(self) -> int: ...
+
+    async def get_ingestion_stats(self) -> dict[str, Any]: ...
+
+    def get_pool_stats(self) -> dict[str, int]: ...
+
+    def get_cache_stats(self) -> dict[str, int]: ...
+
+    def get_metadata_stats(self) -> dict[str, int]: ...
+
+    def get_query_stats(self) -> dict[str, int]: ...
+
+
+def create_train_provider() -> TrainProvider:
+    """
+    Create the train provider configured from environment: `TRAIN_PROVIDER` is `questdb` (default),
+    or `parquet` to serve archived data from `PARQUET_DATA_DIR` without a database.
+    """
+    # imported here, so that a provider's dependencies are only needed when it is used
+    kind = os.getenv("TRAIN_PROVIDER", "questdb")
+    if kind == "questdb":
+        from artistic_intelligence_data.trains.questdb_train_provider import QuestDBTrainProvider
+
+        return QuestDBTrainProvider.from_env()
+
+    if kind == "parquet":
+        from artistic_intelligence_data.trains.parquet_train_provider import ParquetTrainProvider
+
+        return ParquetTrainProvider.from_env()
+
+    raise ValueError(f"Unknown train provider '{kind}', expected 'questdb' or 'parquet'")
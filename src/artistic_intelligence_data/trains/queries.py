@@ -0,0 +1,63 @@
+"""
+Query builder for the train tables in QuestDB.
+
+Values (timestamps, coordinates) are never formatted into the query text but passed as bind parameters, so the text
+of a query only depends on its shape. Queries are executed as prepared statements (see `read_frame`): the hot
+"locations between two timestamps" query is compiled once per connection, and reused with new parameters after that.
+
+Only names from the code (columns, tables, clauses) end up in the query text, never API input.
+"""
+
+from datetime import UTC, datetime
+from typing import Any, LiteralString, NamedTuple
+
+from artistic_intelligence_data.trains.spatial import BoundingBox
+
+# records without train id, or without valid coordinates, are never served
+VALID_LOCATION: tuple[LiteralString, ...] = ("train_id != ''", "x is not null", "y is not null", "x > 0", "y > 0")
+
+
+class SQLQuery(NamedTuple):
+    """Query text with placeholders (`%s`), and the values to bind to them."""
+
+    text: LiteralString
+    params: tuple[Any, ...] = ()
+
+
+def to_questdb_timestamp(moment: datetime) -> datetime:
+    """Normalize a moment to the naive UTC timestamp QuestDB stores. Naive moments are taken as UTC already."""
+    if moment.tzinfo is None:
+        return moment
+
+    return moment.astimezone(UTC).replace(tzinfo=None)
+
+
+def select_between(
+    select: LiteralString,
+    table: LiteralString,
+    start: datetime,
+    end: datetime,
+    *,
+    end_inclusive: bool = True,
+    valid_locations: bool = False,
+    bbox: BoundingBox | None = None,
+    tail: LiteralString = "",
+) -> SQLQuery:
+    """
+    Build a query on the rows of a table between two timestamps, that have a train id.
+
+    - **valid_locations**: only rows with valid coordinates as well, see `VALID_LOCATION`
+    - **bbox**: only rows within the bounding box
+    - **tail**: clauses after the where clause, e.g. `group by`, `sample by` or `order by`
+    """
+    conditions: list[LiteralString] = ["timestamp >= %s", "timestamp <= %s" if end_inclusive else "timestamp < %s"]
+    params: list[Any] = [to_questdb_timestamp(start), to_questdb_timestamp(end)]
+
+    conditions.extend(VALID_LOCATION if valid_locations else VALID_LOCATION[:1])
+    if bbox:
+        conditions.extend(["x >= %s", "x <= %s", "y >= %s", "y <= %s"])
+        params.extend([bbox.x_min, bbox.x_max, bbox.y_min, bbox.y_max])
+
+    # only literal column and table names from the code are interpolated, all values are bound parameters
+    text = f"select {select} from {table} where {' and '.join(conditions)} {tail}"  # nosec B608
+    return SQLQuery(text.strip(), tuple(params))
@@ -1,61 +1,315 @@
+import asyncio
 import os
-from datetime import datetime
+from collections import OrderedDict
+from collections.abc import AsyncIterator, Sequence
+from datetime import UTC, date, datetime, time, timedelta
+from pathlib import Path
 from time import perf_counter
-from typing import cast
+from types import TracebackType
+from typing import Any, LiteralString, Self, cast
 from zoneinfo import ZoneInfo
 
 import polars as pl
-from dotenv import load_dotenv
+from psycopg_pool import AsyncConnectionPool
 
+from artistic_intelligence_data.concurrency import run_cpu
+from artistic_intelligence_data.database import create_questdb_pool, read_frame
 from artistic_intelligence_data.logger import get_logger
-from artistic_intelligence_data.trains.material import TrainMaterial
+from artistic_intelligence_data.trains.archive import ParquetArchive
+from artistic_intelligence_data.trains.bucket_cache import TimeBucketCache
+from artistic_intelligence_data.trains.categories import encode_categories
+from artistic_intelligence_data.trains.latest import DEFAULT_MAX_AGE, LatestPositions
+from artistic_intelligence_data.trains.live_buffer import LiveTailBuffer
+from artistic_intelligence_data.trains.material import TrainMaterial, classify_material
+from artistic_intelligence_data.trains.metadata import TrainMetadataStore
+from artistic_intelligence_data.trains.pivot import RollingPivot, pivot_locations
+from artistic_intelligence_data.trains.queries import SQLQuery, select_between
+from artistic_intelligence_data.trains.sampling import (
+    SAMPLE_AGGREGATES,
+    downsample,
+    floor_to_interval,
+    sample_by_select,
+)
+from artistic_intelligence_data.trains.single_flight import SingleFlight
+from artistic_intelligence_data.trains.spatial import BoundingBox
+from artistic_intelligence_data.ttl_cache import TTLCache
 from artistic_intelligence_data.utils import validate_start_end
 
 _logger = get_logger(__name__)
 
+# torbenized requests for a period ending at most this long ago are served from a rolling pivot
+ROLLING_WINDOW_LAG = timedelta(minutes=1)
+
 
-# TODO add an interface so we can swap implementations easier
 class QuestDBTrainProvider:
     """
-    Get train data from the QuestDB time series database.
+    Get train data from the QuestDB time series database, implementing `TrainProvider`.
 
     Note that any timestamps returned from the database are in UTC.
-    """
 
-    def __init__(self):
-        load_dotenv()
+    One provider is meant to live for the whole process, sharing its connection pool between requests.
+    Location queries are split into time buckets, of which the closed ones are kept in the bucket cache.
+    Recent periods are served from the live buffer, if a poller keeps it up to date with `poll_live_tail`.
+    Sliding windows of torbenized locations (e.g. the last 3 hours) are kept pivoted, per window length.
+    Train types and materials are served from the metadata store, if kept up to date with `refresh_metadata`.
+    Closed days that were exported to the Parquet archive (see `archive_closed_days`) are read from there.
+    The last known location of every train is kept in memory as well, updated by `poll_live_tail`.
 
-        qdb_host = os.getenv("QDB_HOST", "localhost")
-        qdb_port = os.getenv("QDB_PORT", "8812")
-        qdb_user = os.getenv("QDB_USER", "admin")
-        qdb_pass = os.getenv("QDB_PASS", "quest")
+    All database access is async. Use the provider as async context manager, to open and close the connection pool.
+    """
 
-        # use redshift protocol to disable features not supported by QuestDB
-        self._qdb_uri = f"redshift://{qdb_user}:{qdb_pass}@{qdb_host}:{qdb_port}/qdb"
+    def __init__(
+        self,
+        pool: AsyncConnectionPool,
+        cache: TimeBucketCache | None = None,
+        live_buffer: LiveTailBuffer | None = None,
+        metadata: TrainMetadataStore | None = None,
+        latest: LatestPositions | None = None,
+        archive: ParquetArchive | None = None,
+        partition_size: timedelta = timedelta(hours=1),
+        parallelism: int = 4,
+        rolling_windows: int = 4,
+        rolling_settle_time: timedelta = timedelta(seconds=30),
+        stats_ttl: timedelta = timedelta(seconds=5),
+    ):
+        self._pool = pool
+        self._cache = cache
+        self._live_buffer = live_buffer
+        self._metadata = metadata
+        self._latest = latest
+        self._archive = archive
+        self._single_flight = SingleFlight()
+
+        # long periods are split into partitions that are fetched concurrently, each on its own connection
+        self._partition_size = partition_size
+        self._parallelism = parallelism
+
+        # rolling pivots by window length (in whole minutes) and scaling, the least recently used are dropped
+        self._rolling: OrderedDict[tuple[timedelta, bool], RollingPivot] = OrderedDict()
+        self._rolling_windows = rolling_windows
+        self._rolling_settle_time = rolling_settle_time  # refetched on every update, for locations ingested late
+
+        # monitoring numbers may be a little old, so that aggressive health checks cost next to nothing
+        self._stats_cache = TTLCache(stats_ttl)
+
+    @classmethod
+    def from_env(cls) -> Self:
+        """
+        Create a provider with its own connection pool, bucket cache, live buffer, metadata store and latest
+        positions, configured from environment. The Parquet archive is used if `ARCHIVE_DIR` is set.
+        """
+        settle_time = timedelta(seconds=int(os.getenv("TRAIN_CACHE_SETTLE_SECONDS", "30")))
+        cache = TimeBucketCache(
+            bucket_size=timedelta(seconds=int(os.getenv("TRAIN_CACHE_BUCKET_SECONDS", "60"))),
+            max_bytes=int(os.getenv("TRAIN_CACHE_MAX_MB", "256")) * 1024**2,
+            settle_time=settle_time,
+        )
+        live_buffer = LiveTailBuffer(
+            retention=timedelta(minutes=int(os.getenv("LIVE_BUFFER_MINUTES", "10"))),
+            capacity=int(os.getenv("LIVE_BUFFER_CAPACITY", "200000")),  # rows
+            poll_interval=timedelta(seconds=int(os.getenv("LIVE_POLL_SECONDS", "5"))),
+            settle_time=settle_time,
+        )
+        metadata = TrainMetadataStore(
+            retention=timedelta(hours=int(os.getenv("METADATA_RETENTION_HOURS", "6"))),
+            refresh_interval=timedelta(seconds=int(os.getenv("METADATA_REFRESH_SECONDS", "300"))),
+        )
+        latest = LatestPositions(max_age=timedelta(minutes=int(os.getenv("LATEST_MAX_AGE_MINUTES", "10"))))
+        archive_dir = os.getenv("ARCHIVE_DIR")
+        return cls(
+            create_questdb_pool(),
+            cache,
+            live_buffer,
+            metadata,
+            latest,
+            ParquetArchive(Path(archive_dir)) if archive_dir else None,
+            partition_size=timedelta(minutes=int(os.getenv("QDB_PARTITION_MINUTES", "60"))),
+            parallelism=int(os.getenv("QDB_PARTITION_PARALLELISM", "4")),
+            rolling_settle_time=settle_time,
+            stats_ttl=timedelta(seconds=int(os.getenv("DATAMON_CACHE_SECONDS", "5"))),
+        )
 
-    def _get_fields_from_db(
-        self, start: datetime | None = None, end: datetime | None = None, select: str = "*", order_by: str = "timestamp"
+    @property
+    def live_poll_interval(self) -> timedelta | None:
+        """How often `poll_live_tail` should be called, or None if there is no live buffer to keep up to date."""
+        return self._live_buffer.poll_interval if self._live_buffer else None
+
+    @property
+    def metadata_refresh_interval(self) -> timedelta | None:
+        """How often `refresh_metadata` should be called, or None if there is no metadata store."""
+        return self._metadata.refresh_interval if self._metadata else None
+
+    async def open(self) -> None:
+        """Open the connection pool, call this on startup."""
+        await self._pool.open()
+        _logger.info("QuestDB connection pool opened", min_size=self._pool.min_size, max_size=self._pool.max_size)
+
+    async def close(self) -> None:
+        """Close the connection pool, call this on shutdown."""
+        await self._pool.close()
+
+    async def __aenter__(self) -> Self:
+        await self.open()
+        return self
+
+    async def __aexit__(
+        self, exc_type: type[BaseException] | None, exc: BaseException | None, traceback: TracebackType | None
+    ) -> None:
+        await self.close()
+
+    def get_pool_stats(self) -> dict[str, int]:
+        """Get connection pool metrics, e.g. pool size, available connections and waiting requests."""
+        return self._pool.get_stats()
+
+    def get_cache_stats(self) -> dict[str, int]:
+        """Get bucket cache metrics, e.g. hits, misses, evictions and memory use."""
+        return self._cache.get_stats() if self._cache else {}
+
+    def get_metadata_stats(self) -> dict[str, int]:
+        """Get metadata store metrics: the number of trains known and the age of the metadata."""
+        return self._metadata.get_stats() if self._metadata else {}
+
+    def get_query_stats(self) -> dict[str, int]:
+        """Get the number of queries executed, and the number saved by sharing the result of an identical query."""
+        return self._single_flight.get_stats()
+
+    async def _read_database(self, query: SQLQuery) -> pl.DataFrame:
+        async def execute() -> pl.DataFrame:
+            async with self._pool.connection() as conn:
+                return await read_frame(conn, query.text, query.params)
+
+        # identical queries running at the same time share a single execution
+        return await self._single_flight.do((" ".join(query.text.split()), query.params), execute)
+
+    async def _get_fields_from_db(
+        self,
+        start: datetime | None = None,
+        end: datetime | None = None,
+        select: LiteralString = "*",
+        order_by: LiteralString = "timestamp",
+        end_inclusive: bool = True,
+        bbox: BoundingBox | None = None,
     ) -> pl.DataFrame:
+        """
+        Query train locations from the database, within the bounding box if given.
+
+        Every part of the period is sent to the tier that holds it: closed days in the Parquet archive are read
+        from there, the rest is queried from QuestDB. The parts are fetched concurrently and merged in order.
+        """
         start, end = validate_start_end(start, end)
+        coverage = self._archive.coverage() if self._archive else None
+        if coverage is None or end < coverage[0] or start >= coverage[1]:
+            return await self._get_fields_from_questdb(start, end, select, order_by, end_inclusive, bbox)
+
+        archived_from, archived_until = coverage
+        parts = []
+        if start < archived_from:
+            parts.append(self._get_fields_from_questdb(start, archived_from, select, order_by, False, bbox))
+
+        parts.append(
+            self._get_fields_from_archive(
+                max(start, archived_from),
+                min(end, archived_until),
+                select,
+                end_inclusive and end < archived_until,
+                bbox,
+            )
+        )
+        if end >= archived_until:
+            parts.append(self._get_fields_from_questdb(archived_until, end, select, order_by, end_inclusive, bbox))
+
+        frames = await asyncio.gather(*parts)
+        return await run_cpu(self._merge_parts, frames, select, order_by)
+
+    async def _get_fields_from_archive(
+        self, start: datetime, end: datetime, select: LiteralString, end_inclusive: bool, bbox: BoundingBox | None
+    ) -> pl.DataFrame:
+        """Same as `_get_fields_from_questdb`, for a period within the archive. Only plain selections are supported."""
+        columns = [column.strip() for column in select.removeprefix("distinct ").split(",")]
+        if columns == ["*"]:
+            return await run_cpu(cast(ParquetArchive, self._archive).read, start, end, None, bbox, end_inclusive)
+
+        extra = [column for column in columns if column not in ("timestamp", "train_id")]
+        result = await run_cpu(cast(ParquetArchive, self._archive).read, start, end, extra, bbox, end_inclusive)
+        return result.select(columns)
+
+    @staticmethod
+    def _merge_parts(frames: list[pl.DataFrame], select: LiteralString, order_by: LiteralString) -> pl.DataFrame:
+        """Concatenate parts of a period in time order, and make them distinct and ordered as a single query would."""
+        result = pl.concat(frames, how="vertical_relaxed")
+        if select.startswith("distinct "):
+            result = result.unique(maintain_order=True)
+        if not order_by.startswith("timestamp"):
+            result = result.sort(
+                pl.col(column.strip()).cast(pl.String) if column.strip() == "train_id" else column.strip()
+                for column in order_by.split(",")
+            )
+        return result
+
+    async def _get_fields_from_questdb(
+        self,
+        start: datetime,
+        end: datetime,
+        select: LiteralString = "*",
+        order_by: LiteralString = "timestamp",
+        end_inclusive: bool = True,
+        bbox: BoundingBox | None = None,
+    ) -> pl.DataFrame:
+        """
+        Query train locations from QuestDB, within the bounding box if given.
+
+        Long periods of which the results are ordered by timestamp are split into partitions, that are fetched
+        concurrently and concatenated in order.
+        """
+        if not order_by.startswith("timestamp") or end - start <= self._partition_size:
+            return await self._query_fields(start, end, select, order_by, end_inclusive, bbox)
+
+        partitions = []
+        partition_start = start
+        while partition_start < end:
+            partition_end = min(partition_start + self._partition_size, end)
+            partitions.append((partition_start, partition_end, end_inclusive and partition_end == end))
+            partition_start = partition_end
+
+        semaphore = asyncio.Semaphore(self._parallelism)
+
+        async def fetch(partition_start: datetime, partition_end: datetime, inclusive: bool) -> pl.DataFrame:
+            async with semaphore:
+                return await self._query_fields(partition_start, partition_end, select, order_by, inclusive, bbox)
+
+        frames = await asyncio.gather(*(fetch(*partition) for partition in partitions))
+        return await run_cpu(pl.concat, frames, how="vertical_relaxed")
+
+    async def _query_fields(
+        self,
+        start: datetime,
+        end: datetime,
+        select: LiteralString,
+        order_by: LiteralString,
+        end_inclusive: bool,
+        bbox: BoundingBox | None = None,
+    ) -> pl.DataFrame:
+        query = select_between(
+            select,
+            "train_locations",
+            start,
+            end,
+            end_inclusive=end_inclusive,
+            valid_locations=True,
+            bbox=bbox,
+            tail=f"order by {order_by}",
+        )
 
-        # QuestDB docs recommend using read_database_uri, but note this is not safe against SQL injection!
-        # however in our case the API will prevent passing anything that is not a datetime
-        query = f"""
-            select {select}
-            from train_locations
-            where timestamp >= '{start}'
-            and timestamp <= '{end}'
-            and train_id != ''
-            and x is not null
-            and y is not null
-            and x > 0
-            and y > 0
-            order by {order_by}
-            ;
-        """  # nosec
-
-        result = pl.read_database_uri(query=query, uri=self._qdb_uri)
+        result = await self._read_database(query)
+        return await run_cpu(self._clean_locations, result, start)
 
+    @staticmethod
+    def _clean_locations(result: pl.DataFrame, start: datetime) -> pl.DataFrame:
+        """
+        Drop records without train id or at a corrupted (epoch) timestamp, and convert timestamps to local time.
+        Train ids and types are encoded as process-wide categoricals.
+        """
+        result = encode_categories(result)
         if "train_id" in result.columns:
             result = result.filter(pl.col("train_id") != "")  # somehow questdb filtering is not working fully
 
@@ -70,100 +324,339 @@ class QuestDBTrainProvider:
 
         return result
 
-    def get_train_locations(self, start: datetime | None = None, end: datetime | None = None) -> pl.DataFrame:
+    async def poll_live_tail(self) -> None:
         """
-        Get train locations in table format straight from the database.
+        Fetch the train locations since the newest in the live buffer minus its settle time, and replace the
+        locations from then on in the buffer with them, so that locations ingested late are picked up.
+        The latest positions are seeded on the first poll, and updated with the new locations on every poll.
         """
+        if self._live_buffer is None:
+            return
+
+        now = datetime.now(tz=ZoneInfo("UTC"))
+        if self._latest and self._latest.updated_at is None:
+            await self._seed_latest(now)
+
+        if self._live_buffer.last_timestamp is None:
+            since = now - self._live_buffer.retention
+        else:
+            since = self._live_buffer.last_timestamp - self._live_buffer.settle_time
+
+        locations = await self._get_fields_from_db(since, now, order_by="timestamp, train_id")
+        await run_cpu(self._live_buffer.append, locations, covered_from=since, polled_at=now, replace_from=since)
+        if self._metadata:
+            await run_cpu(self._metadata.observe, locations)
+        if self._latest:
+            await run_cpu(self._latest.update, locations, updated_at=now)
+
+    async def refresh_metadata(self) -> None:
+        """Replace the metadata store contents with the trains seen within its retention period."""
+        if self._metadata is None:
+            return
+
+        now = datetime.now(tz=ZoneInfo("UTC"))
+        start = now - self._metadata.retention
+        train_types, first_part_types = await asyncio.gather(
+            self._query_train_types(start, now), self._query_first_part_types(start, now)
+        )
+        await run_cpu(self._metadata.replace, train_types, first_part_types, covered_from=start, refreshed_at=now)
 
-        return self._get_fields_from_db(start, end, order_by="timestamp, train_id")
+    async def archive_closed_days(
+        self, first_day: date | None = None, settle_time: timedelta = timedelta(hours=1)
+    ) -> list[date]:
+        """
+        Export the (UTC) days that are closed, and not in the archive yet, from QuestDB to the Parquet archive.
+        A day is closed once the settle time has passed after its end, so that late records are in.
 
-    def get_locations_pivoted(self, start: datetime | None = None, end: datetime | None = None) -> pl.DataFrame:
+        Starts at the given day, or else after the last day in the archive (or with the last closed day, if empty).
+        Returns the days exported.
+        """
+        if self._archive is None:
+            raise ValueError("No archive configured, set ARCHIVE_DIR")
+
+        now = datetime.now(tz=UTC)
+        last_closed = (now - settle_time).date() - timedelta(days=1)
+        archived = self._archive.days()
+        day = first_day or (archived[-1] + timedelta(days=1) if archived else last_closed)
+
+        exported = []
+        while day <= last_closed:
+            if day not in archived:
+                time_start = perf_counter()
+                day_start = datetime.combine(day, time(), tzinfo=UTC)
+                locations = await self._get_fields_from_questdb(
+                    day_start, day_start + timedelta(days=1), order_by="timestamp, train_id", end_inclusive=False
+                )
+                entry = await run_cpu(self._archive.write_day, day, locations)
+                _logger.info(
+                    "Archived day", day=str(day), duration_seconds=round(perf_counter() - time_start, 3), **entry
+                )
+                exported.append(day)
+            day += timedelta(days=1)
+
+        return exported
+
+    def get_latest_snapshot(self) -> pl.DataFrame | None:
+        """Get the newest snapshot from the live buffer: the locations of all trains at the last timestamp."""
+        if self._live_buffer is None or self._live_buffer.last_timestamp is None:
+            return None
+
+        last_timestamp = self._live_buffer.last_timestamp
+        return self._live_buffer.get(last_timestamp, last_timestamp)
+
+    async def get_latest_positions(
+        self,
+        train_type: str | None = None,
+        material: TrainMaterial | None = None,
+        bbox: BoundingBox | None = None,
+    ) -> pl.DataFrame:
         """
-        NEW VERSION OF THE TORBENIZER BUT AS A SQL QUERY YEAH BITCHES.
+        Get the last known location of every train that reported recently, ordered by train id.
+        Served from memory if the live poller keeps it up to date, otherwise queried with `LATEST ON`.
+        Optionally only trains of the given type, of the given material (see `get_train_material`),
+        or within the bounding box.
+        """
+        now = datetime.now(tz=ZoneInfo("UTC"))
+        if self._latest is None:
+            positions = await self._query_latest(now - DEFAULT_MAX_AGE, now)
+            if bbox:
+                positions = positions.filter(bbox.expr())
+        else:
+            if not self._latest.is_fresh(now):
+                await self._seed_latest(now)
+            positions = await run_cpu(self._latest.get, bbox)
+
+        if train_type is not None:
+            positions = positions.filter(pl.col("train_type") == train_type)
+        if material is not None:
+            materials = await self.get_train_material()
+            train_ids = materials.filter(pl.col("material") == material.value).get_column("train_id")
+            positions = positions.filter(pl.col("train_id").is_in(train_ids))
+
+        return positions
+
+    async def get_nearest_positions(self, x: float, y: float, count: int) -> pl.DataFrame:
+        """Get the last known locations of the trains nearest to the given RD New point, nearest first."""
+        now = datetime.now(tz=ZoneInfo("UTC"))
+        if self._latest is None:
+            positions = await self._query_latest(now - DEFAULT_MAX_AGE, now)
+            distance = ((pl.col("x") - x) ** 2 + (pl.col("y") - y) ** 2).sqrt()
+            return positions.sort(distance, maintain_order=True).head(count)
+
+        if not self._latest.is_fresh(now):
+            await self._seed_latest(now)
+        return await run_cpu(self._latest.nearest, x, y, count)
+
+    async def _seed_latest(self, now: datetime) -> None:
+        latest = cast(LatestPositions, self._latest)
+        positions = await self._query_latest(now - latest.max_age, now)
+        await run_cpu(latest.replace, positions, updated_at=now)
+
+    async def _query_latest(self, start: datetime, end: datetime) -> pl.DataFrame:
+        query = select_between(
+            "*", "train_locations", start, end, valid_locations=True, tail="latest on timestamp partition by train_id"
+        )
 
-        BUT performance is terrible, the query takes ages to perform. Needs further investigation.
+        result = await self._read_database(query)
+        locations = await run_cpu(self._clean_locations, result, start)
+        return locations.sort(pl.col("train_id").cast(pl.String))
+
+    async def _get_fields_cached(
+        self,
+        start: datetime | None = None,
+        end: datetime | None = None,
+        select: LiteralString = "*",
+        order_by: LiteralString = "timestamp",
+        bbox: BoundingBox | None = None,
+    ) -> pl.DataFrame:
+        """
+        Same as `_get_fields_from_db`, but served from cached time buckets where possible.
+
+        Recent periods come from the live buffer (which is ordered by timestamp and train_id).
+        Otherwise, closed buckets are fetched (whole) once and cached, and only the open tail is queried every time.
+        With a bounding box, cached buckets are filtered in memory, but missing buckets are queried for the box only
+        and not cached.
+        The selection must contain the timestamp (and x and y, with a bounding box), and results must be ordered by
+        timestamp first.
         """
         start, end = validate_start_end(start, end)
+        if self._live_buffer and self._live_buffer.covers(start, end):
+            locations = await self._get_fields_live(start, end, bbox)
+            return locations if select == "*" else locations.select(column.strip() for column in select.split(","))
 
-        # TODO add x/y scaling in query
-        query = f"""
-        with base as (
-            select timestamp, train_id, x, y, speed
-            from train_locations
-            where timestamp between '{start}' and '{end}'
-        ),
-        melted as (
-            select timestamp, train_id, 'x' as var, x as value
-            from base
-            where x is not null
-            union all
-            select timestamp, train_id, 'y' as var, y as value
-            from base
-            where y is not null
-            union all
-            select timestamp, train_id, 'speed' as var, speed as value
-            from base
-            where speed is not null
-        )
-        select * from melted
-        pivot (
-            first(value)
-            for train_id in (select distinct train_id from base)
-            group by timestamp, var
-        )
-        order by timestamp, var
-        """  # nosec
-
-        result = pl.read_database_uri(query=query, uri=self._qdb_uri)
-
-        result = result.with_columns(timestamp=pl.col("timestamp").dt.replace_time_zone("UTC"))
-
-        # filter for corrupted data in questdb that is somehow at epoch
-        result = result.filter(pl.col("timestamp") >= start.astimezone(ZoneInfo("UTC")))
-
-        # convert resulting timestamps to local time
-        result = result.with_columns(timestamp=pl.col("timestamp").dt.convert_time_zone("Europe/Amsterdam"))
+        if self._cache is None:
+            return await self._get_fields_from_db(start, end, select=select, order_by=order_by, bbox=bbox)
 
-        return result
+        open_from = self._cache.closed_until(datetime.now(tz=ZoneInfo("UTC")))
+
+        buckets = self._cache.split(start, min(end, open_from))
+        frames = [self._cache.get((select, order_by, bucket_start)) for bucket_start, _ in buckets]
+
+        # fetch every run of consecutive missing buckets with a single (partitioned) query
+        first = 0
+        while first < len(buckets):
+            if frames[first] is not None:
+                first += 1
+                continue
+
+            last = first
+            while last + 1 < len(buckets) and frames[last + 1] is None:
+                last += 1
+
+            run = await self._get_fields_from_db(
+                buckets[first][0], buckets[last][1], select, order_by, end_inclusive=False, bbox=bbox
+            )
+            parts = await run_cpu(self._cache.partition, run, buckets[first : last + 1])
+            for i, bucket in enumerate(parts, start=first):
+                if bbox is None:
+                    self._cache.put((select, order_by, buckets[i][0]), bucket)
+                frames[i] = bucket
+
+            first = last + 1
+
+        if end >= open_from or not frames:
+            frames.append(await self._get_fields_from_db(max(start, open_from), end, select, order_by, bbox=bbox))
+
+        def combine() -> pl.DataFrame:
+            result = pl.concat(cast(list[pl.DataFrame], frames), how="vertical_relaxed")
+            result = result.filter(
+                pl.col("timestamp").is_between(
+                    start.astimezone(ZoneInfo("Europe/Amsterdam")), end.astimezone(ZoneInfo("Europe/Amsterdam"))
+                )
+            )
+            return result.filter(bbox.expr()) if bbox else result
+
+        return await run_cpu(combine)
+
+    async def _get_fields_live(self, start: datetime, end: datetime, bbox: BoundingBox | None) -> pl.DataFrame:
+        """Get train locations from the live buffer, which must cover the period."""
+        locations = await run_cpu(cast(LiveTailBuffer, self._live_buffer).get, start, end)
+        return locations.filter(bbox.expr()) if bbox else locations
+
+    async def _get_fields_sampled(
+        self,
+        start: datetime | None,
+        end: datetime | None,
+        columns: Sequence[str],
+        interval: timedelta,
+        bbox: BoundingBox | None = None,
+    ) -> pl.DataFrame:
+        """
+        Get train locations downsampled to a record per train per interval, see `SAMPLE_AGGREGATES`.
+        With a bounding box, only the records within the box are sampled.
+
+        Recent periods are downsampled in memory from the live buffer, as are periods in the archive.
+        Otherwise, the sampling is done by QuestDB.
+        """
+        start, end = validate_start_end(start, end)
+        coverage = self._archive.coverage() if self._archive else None
+        if coverage and coverage[0] <= floor_to_interval(start, interval) and end < coverage[1]:
+            columns_read = [column for column in columns if column != "train_id"]
+            archived = await run_cpu(cast(ParquetArchive, self._archive).read, start, end, columns_read, bbox)
+            return await run_cpu(downsample, archived, interval)
+
+        if self._live_buffer and self._live_buffer.covers(start, end):
+            locations = await self._get_fields_live(start, end, bbox)
+            return await run_cpu(downsample, locations.select("timestamp", "train_id", *columns), interval)
+
+        return await self._query_sampled(start, end, columns, interval, bbox)
+
+    async def _query_sampled(
+        self,
+        start: datetime,
+        end: datetime,
+        columns: Sequence[str],
+        interval: timedelta,
+        bbox: BoundingBox | None = None,
+    ) -> pl.DataFrame:
+        query = select_between(
+            sample_by_select(columns),
+            "train_locations",
+            start,
+            end,
+            valid_locations=True,
+            bbox=bbox,
+            # the interval is a number formatted by the code, QuestDB has no parameters in SAMPLE BY
+            tail=cast(
+                LiteralString,
+                f"sample by {int(interval.total_seconds())}s align to calendar order by timestamp, train_id",
+            ),
+        )
 
-    def get_locations_torbenized(
-        self, start: datetime | None = None, end: datetime | None = None, scale: bool = True
+        result = await self._read_database(query)
+
+        # the first sample starts at the interval boundary before the start of the period
+        return await run_cpu(self._clean_locations, result, floor_to_interval(start, interval))
+
+    async def get_train_locations(
+        self,
+        start: datetime | None = None,
+        end: datetime | None = None,
+        interval: timedelta | None = None,
+        bbox: BoundingBox | None = None,
+        columns: list[str] | None = None,
+    ) -> pl.DataFrame:
+        """
+        Get train locations in table format, from the bucket cache or the database.
+        If an interval is given, locations are downsampled to a record per train per interval.
+        If a bounding box is given, only the locations within it are returned.
+
+        Only the given columns (see `SAMPLE_AGGREGATES`) are queried besides timestamp and train_id, or all columns
+        if None. Any other column name raises a ValueError, so the selection is never raw input.
+        """
+        unknown = set(columns or []) - set(SAMPLE_AGGREGATES)
+        if unknown:
+            raise ValueError(f"Unknown location columns: {', '.join(sorted(unknown))}")
+
+        # in a fixed order, so that equal selections share cached buckets and queries
+        queried = [
+            column
+            for column in SAMPLE_AGGREGATES
+            if columns is None or column in columns or (bbox and column in ("x", "y"))
+        ]
+        if interval:
+            locations = await self._get_fields_sampled(start, end, queried, interval, bbox)
+        else:
+            select = "*" if columns is None else ", ".join(["timestamp", "train_id", *queried])
+            locations = await self._get_fields_cached(start, end, select, order_by="timestamp, train_id", bbox=bbox)
+
+        if columns is None:
+            return locations
+        return locations.select("timestamp", "train_id", *(column for column in queried if column in columns))
+
+    async def get_locations_torbenized(
+        self,
+        start: datetime | None = None,
+        end: datetime | None = None,
+        scale: bool = True,
+        interval: timedelta | None = None,
+        bbox: BoundingBox | None = None,
     ) -> pl.DataFrame:
         """
         Get train locations pivoted to wide format where every train_id has its own column.
 
         The 'scale' parameter scales the RDNew x/y coordinates to a (-1,1) square grid for use in TouchDesigner.
+        With a bounding box, only the locations within it are pivoted (before scaling).
+        Periods up to about now, as polled by live clients, are served from a rolling pivot of that window length.
         """
+        start, end = validate_start_end(start, end)
+        if interval is None and bbox is None and datetime.now(tz=ZoneInfo("UTC")) - end <= ROLLING_WINDOW_LAG:
+            return await self._get_torbenized_rolling(start, end, scale)
+
         time_start = perf_counter()
 
-        locations = self._get_fields_from_db(
-            start, end, select="train_id, train_type, x, y, speed, timestamp", order_by="timestamp, train_id"
-        )
+        locations = await self._get_torbenize_fields(start, end, interval, bbox)
 
         time_retrieved = perf_counter()
         _logger.info(
-            "Retrieved data from QuestDB",
+            "Retrieved data from QuestDB and cache",
             record_count=locations.height,
             duration_seconds=round(time_retrieved - time_start, 3),
         )
 
-        train_ids = locations.select("train_id").unique().to_series().to_list()
-
-        if scale:
-            locations = locations.with_columns(
-                ((pl.col("x") - 155_000) / (325_000 / 2)).round(5),
-                ((pl.col("y") - 463_000) / (325_000 / 2)).round(5),
-            )
+        train_ids = locations.get_column("train_id").unique().cast(pl.String).sort().to_list()
+        locations = await run_cpu(self._torbenize, locations, train_ids, scale)
 
-        locations = locations.lazy()
-        locations = locations.unpivot(
-            on=["x", "y", "speed", "train_type"], index=["timestamp", "train_id"], variable_name="var"
-        )
-        locations = locations.pivot(
-            on="train_id", on_columns=train_ids, index=["timestamp", "var"], values="value", aggregate_function="first"
-        )
-        locations = locations.sort(by=["timestamp", "var"])
-        locations = cast(pl.DataFrame, locations.collect())
         _logger.info(
             "Pivoted data to format",
             record_count=locations.height,
@@ -171,77 +664,230 @@ class QuestDBTrainProvider:
         )
         return locations
 
-    def get_train_types(self, start: datetime | None = None, end: datetime | None = None) -> pl.DataFrame:
+    async def _get_torbenized_rolling(self, start: datetime, end: datetime, scale: bool) -> pl.DataFrame:
+        """
+        Get torbenized locations from the rolling pivot for the length of the given window.
+        Only the locations since its previous update (minus the settle time) are fetched and pivoted,
+        unless the window is not covered.
+        """
+        window = timedelta(minutes=round((end - start) / timedelta(minutes=1)))
+        key = (window, scale)
+        rolling = self._rolling.get(key)
+        if rolling is None:
+            rolling = self._rolling[key] = RollingPivot(scale, self._rolling_settle_time)
+            while len(self._rolling) > self._rolling_windows:
+                self._rolling.popitem(last=False)
+        self._rolling.move_to_end(key)
+
+        async with rolling.lock:
+            # locations after now are yet to come, so a window ending in the future is only fetched up to now
+            fetched_until = min(end, datetime.now(tz=end.tzinfo))
+            if not rolling.covers(start):
+                locations = await self._get_torbenize_fields(start, end, None)
+                await run_cpu(rolling.reset, locations, start, fetched_until)
+            elif end > cast(datetime, rolling.covered_until):
+                since = cast(datetime, rolling.covered_until) + timedelta(microseconds=1)
+                locations = await self._get_torbenize_fields(since, end, None)
+                await run_cpu(rolling.extend, locations, fetched_until)
+
+            # keep a little extra, so that the next poll can start a bit earlier than this one
+            await run_cpu(rolling.trim, end - window - ROLLING_WINDOW_LAG)
+            return await run_cpu(rolling.get, start, end)
+
+    async def iter_locations_torbenized(
+        self,
+        start: datetime | None = None,
+        end: datetime | None = None,
+        scale: bool = True,
+        chunk_size: timedelta = timedelta(hours=1),
+        interval: timedelta | None = None,
+        bbox: BoundingBox | None = None,
+    ) -> AsyncIterator[pl.DataFrame]:
+        """
+        Same as `get_locations_torbenized`, but yields the result in time-ordered chunks to bound memory use.
+
+        All chunks have the same columns: the trains seen anywhere in the requested period, looked up front.
+        When downsampling, chunks are aligned to whole intervals so that no sample is split over two chunks.
+        """
+        start, end = validate_start_end(start, end)
+        train_ids = (
+            (await self._get_fields_from_db(start, end, select="distinct train_id", order_by="train_id", bbox=bbox))
+            .get_column("train_id")
+            .to_list()
+        )
+
+        origin = start
+        if interval:
+            chunk_size = max(chunk_size // interval, 1) * interval
+            origin = floor_to_interval(start, interval)
+
+        chunk_start = start
+        while chunk_start <= end:
+            next_start = origin + ((chunk_start - origin) // chunk_size + 1) * chunk_size
+            chunk_end = min(next_start - timedelta(microseconds=1), end)  # prevent overlap, the end is inclusive
+
+            locations = await self._get_torbenize_fields(chunk_start, chunk_end, interval, bbox)
+            yield await run_cpu(self._torbenize, locations, train_ids, scale)
+
+            chunk_start = next_start
+
+    async def _get_torbenize_fields(
+        self,
+        start: datetime | None,
+        end: datetime | None,
+        interval: timedelta | None,
+        bbox: BoundingBox | None = None,
+    ) -> pl.DataFrame:
+        if interval:
+            return await self._get_fields_sampled(start, end, ["train_type", "x", "y", "speed"], interval, bbox)
+
+        return await self._get_fields_cached(
+            start,
+            end,
+            select="train_id, train_type, x, y, speed, timestamp",
+            order_by="timestamp, train_id",
+            bbox=bbox,
+        )
+
+    @staticmethod
+    def _torbenize(locations: pl.DataFrame, train_ids: list[str], scale: bool) -> pl.DataFrame:
+        """Pivot train locations to the wide format, with a column for each of the given train ids."""
+        return pivot_locations(locations, train_ids, scale).to_frame()
+
+    async def get_train_types(self, start: datetime | None = None, end: datetime | None = None) -> pl.DataFrame:
         """
-        Get type (IC, SPR, ...) for each train_id in the given period, straight from the database.
+        Get type (IC, SPR, ...) for each train_id in the given period,
+        from the metadata store or, for periods before it, straight from the database.
         """
+        start, end = validate_start_end(start, end)
+        if self._metadata and self._metadata.covers(start):
+            return self._metadata.get(start, end).select("train_id", "train_type")
 
-        return self._get_fields_from_db(start, end, select="distinct train_id, train_type", order_by="train_id").filter(
-            pl.col("train_id") != "",
+        train_types = await self._get_fields_from_db(
+            start, end, select="distinct train_id, train_type", order_by="train_id"
+        )
+        return train_types.filter(pl.col("train_id") != "")
+
+    async def _query_train_types(self, start: datetime, end: datetime) -> pl.DataFrame:
+        query = select_between(
+            "train_id, last(train_type) as train_type, min(timestamp) as first_seen, max(timestamp) as last_seen",
+            "train_locations",
+            start,
+            end,
+            tail="group by train_id order by train_id",
         )
 
-    def get_current_count(self) -> int:
+        result = await self._read_database(query)
+        return encode_categories(result).with_columns(
+            pl.col("first_seen", "last_seen").dt.replace_time_zone("UTC").dt.convert_time_zone("Europe/Amsterdam")
+        )
+
+    async def get_current_count(self) -> int:
+        """
+        Get the number of train records for the last default period, counted by QuestDB.
+        """
+        counts = await self._stats_cache.get("counts", self._query_counts)
+        return counts["records"]
+
+    async def get_ingestion_stats(self) -> dict[str, Any]:
         """
-        Get train records for the last default period.
+        Get ingestion metrics: the number of records and distinct trains for the last default period,
+        and the latest timestamp and ingestion lag per source. The numbers may be a few seconds old, lags are not.
         """
+        counts, latest = await asyncio.gather(
+            self._stats_cache.get("counts", self._query_counts),
+            self._stats_cache.get("latest", self._query_latest_per_source),
+        )
+
+        now = datetime.now(tz=ZoneInfo("UTC"))
+        sources = [
+            {"source": source, "latest": timestamp, "lag_seconds": round((now - timestamp).total_seconds(), 3)}
+            for source, timestamp in latest.iter_rows()
+        ]
+        return {
+            **counts,
+            "lag_seconds": min((source["lag_seconds"] for source in sources), default=None),
+            "sources": sources,
+        }
+
+    async def _query_counts(self) -> dict[str, int]:
         start, end = validate_start_end(start=None, end=None)  # use defaults
-        return self.get_train_locations(start=start, end=end).height  # not optimized, loads all data first
 
-    def get_train_material(self, start: datetime | None = None, end: datetime | None = None) -> pl.DataFrame:
+        # the same rows as the locations endpoints serve
+        query = select_between(
+            "count() as records, count_distinct(train_id) as trains",
+            "train_locations",
+            start,
+            end,
+            valid_locations=True,
+        )
+
+        result = await self._read_database(query)
+        return {"records": result.item(0, "records") or 0, "trains": result.item(0, "trains") or 0}
+
+    async def _query_latest_per_source(self) -> pl.DataFrame:
+        query = SQLQuery(
+            "select source, timestamp as latest from train_locations latest on timestamp partition by source"
+        )
+
+        result = await self._read_database(query)
+        return result.with_columns(
+            pl.col("latest").dt.replace_time_zone("UTC").dt.convert_time_zone("Europe/Amsterdam")
+        ).sort("source")
+
+    async def get_train_material(self, start: datetime | None = None, end: datetime | None = None) -> pl.DataFrame:
         """
         Get train 'materieel'.
         Currently, this is the material type of the first car ('treindeel') at the first stop (station).
         Data is retrieved every hour, so validate missing start time as such.
+        Only trains with train info in the given period are included, whether their locations were seen or not.
+        Served from the metadata store or, for periods before it, straight from the database.
         """
         start, end = validate_start_end(start=start, end=end, minutes=60)
+        if self._metadata and self._metadata.covers(start):
+            trains = self._metadata.get_materials(start, end)
+            return trains.filter(pl.col("material").is_not_null())
 
-        query = f"""
-            select train_id, first(first_part_type) as first_part_type,
-            from train_info
-            where timestamp >= '{start}'
-            and timestamp <= '{end}'
-            and train_id != ''
-            group by train_id
-            order by train_id
-            ;
-        """  # nosec
-
-        result = pl.read_database_uri(query=query, uri=self._qdb_uri)
-
-        # TODO using apply is bad practice but not sure how to do this natively
-        result = result.with_columns(
-            pl.col("first_part_type")
-            .map_elements(
-                lambda x: next((m for m in TrainMaterial if x.upper().startswith(m.value)), None),
-                return_dtype=pl.String,
-            )
-            .alias("material")
+        result = await self._query_first_part_types(start, end)
+        result = result.select("train_id", "first_part_type", material=classify_material(pl.col("first_part_type")))
+        return result.filter(pl.col("material").is_not_null())
+
+    async def _query_first_part_types(self, start: datetime, end: datetime) -> pl.DataFrame:
+        query = select_between(
+            "train_id, first(first_part_type) as first_part_type, min(timestamp) as first_info, "
+            "max(timestamp) as last_info",
+            "train_info",
+            start,
+            end,
+            tail="group by train_id order by train_id",
         )
 
-        return result.filter(pl.col("material").is_not_null())
+        result = await self._read_database(query)
+        return encode_categories(result).with_columns(
+            pl.col("first_info", "last_info").dt.replace_time_zone("UTC").dt.convert_time_zone("Europe/Amsterdam")
+        )
 
 
 if __name__ == "__main__":
-    provider = QuestDBTrainProvider()
-
-    materials = provider.get_train_material()
-    print(materials)
-
-    # start = datetime.now(tz=DEFAULT_TIMEZONE) - timedelta(days=4)
-    # start = datetime(2026, 2, 8, 4, 0, 0, 0, tzinfo=DEFAULT_TIMEZONE)
-    #
-    # print("--records--")
-    # train_locations = provider.get_train_locations(start=start)
-    # print(train_locations.head())
-    #
-    # print("--types--")
-    # train_types = provider.get_train_types(start=start)
-    # print(train_types.head())
-    #
-    # print("--torbenized--")
-    # tl_torbenized = provider.get_locations_torbenized(start=start)
-    # print(tl_torbenized.head())
-    #
-    # print("--torbenized v2--")
-    # tl_torbenized_v2 = provider.get_locations_pivoted(start=start)
-    # print(tl_torbenized_v2.head())
+
+    async def main() -> None:
+        async with QuestDBTrainProvider.from_env() as provider:
+            materials = await provider.get_train_material()
+            print(materials)
+
+            # start = datetime.now(tz=DEFAULT_TIMEZONE) - timedelta(days=4)
+            # start = datetime(2026, 2, 8, 4, 0, 0, 0, tzinfo=DEFAULT_TIMEZONE)
+            #
+            # print("--records--")
+            # train_locations = await provider.get_train_locations(start=start)
+            # print(train_locations.head())
+            #
+            # print("--types--")
+            # train_types = await provider.get_train_types(start=start)
+            # print(train_types.head())
+            #
+            # print("--torbenized--")
+            # tl_torbenized = await provider.get_locations_torbenized(start=start)
+            # print(tl_torbenized.head())
+
+    asyncio.run(main())
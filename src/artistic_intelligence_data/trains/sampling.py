@@ -0,0 +1,54 @@
+from collections.abc import Sequence
+from datetime import UTC, datetime, timedelta
+from typing import LiteralString
+
+import polars as pl
+
+# how each column is aggregated when train locations are downsampled, per train:
+# measurements are averaged over the interval, attributes take their last value
+SAMPLE_AGGREGATES: dict[LiteralString, LiteralString] = {
+    "train_type": "last",
+    "x": "avg",
+    "y": "avg",
+    "speed": "avg",
+    "direction": "last",
+    "accuracy": "last",
+}
+
+
+def floor_to_interval(moment: datetime, interval: timedelta) -> datetime:
+    """Round a moment down to the start of its sample, samples are aligned to the unix epoch like in QuestDB."""
+    interval_seconds = interval.total_seconds()
+    epoch_seconds = moment.timestamp()
+    return datetime.fromtimestamp(epoch_seconds - epoch_seconds % interval_seconds, tz=UTC)
+
+
+def sample_by_select(columns: Sequence[str]) -> LiteralString:
+    """
+    Build the select clause for a QuestDB SAMPLE BY query on train locations, keyed by train id.
+    Column names are taken from `SAMPLE_AGGREGATES`, so only names from the code end up in the query.
+    """
+    aggregates: list[LiteralString] = [
+        f"{aggregate}({column}) as {column}" for column, aggregate in SAMPLE_AGGREGATES.items() if column in columns
+    ]
+    return ", ".join(["timestamp", "train_id", *aggregates])
+
+
+def downsample(locations: pl.DataFrame, interval: timedelta) -> pl.DataFrame:
+    """
+    Downsample train locations in memory, the same way a QuestDB SAMPLE BY query with `sample_by_select` would.
+
+    Input must be ordered by timestamp, the result is ordered by timestamp and train id,
+    with the start of each sample as timestamp.
+    """
+    aggregates = [
+        pl.col(column).mean() if aggregate == "avg" else pl.col(column).last()
+        for column, aggregate in SAMPLE_AGGREGATES.items()
+        if column in locations.columns
+    ]
+    return (
+        locations.group_by_dynamic("timestamp", every=interval, group_by="train_id", label="left", closed="left")
+        .agg(aggregates)
+        .select(["timestamp", "train_id", *(column for column in locations.columns if column in SAMPLE_AGGREGATES)])
+        .sort("timestamp", "train_id")
+    )
@@ -0,0 +1,41 @@
+import asyncio
+from collections.abc import Awaitable, Callable, Hashable
+
+import polars as pl
+
+
+class SingleFlight:
+    """
+    Deduplicate concurrent queries: callers asking for the same key while a query for it is in flight
+    wait for that query and share its resulting frame, instead of running it again.
+
+    The query runs in a task of its own, so a caller going away (e.g. a client disconnecting) does not cancel it
+    for the other callers waiting on it.
+    """
+
+    def __init__(self):
+        self._calls: dict[Hashable, asyncio.Future[pl.DataFrame]] = {}
+
+        self.executed = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[pl.DataFrame]]) -> pl.DataFrame:
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(func())
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+            self.executed += 1
+        else:
+            self.coalesced += 1
+
+        return await asyncio.shield(task)
+
+    def _finish(self, key: Hashable, task: asyncio.Future[pl.DataFrame]) -> None:
+        self._calls.pop(key, None)
+        if not task.cancelled():
+            task.exception()  # mark as retrieved, in case all callers went away before the query failed
+
+    def get_stats(self) -> dict[str, int]:
+        """Get the number of queries executed, and the number of queries saved by waiting on another."""
+        return {"executed": self.executed, "coalesced": self.coalesced}
@@ -0,0 +1,107 @@
+"""
+Spatial filtering of train locations, in RD New (Rijksdriehoek) coordinates.
+
+A bounding box is pushed down to QuestDB as a range filter on x and y (see `queries.py`).
+Snapshots kept in memory (e.g. the latest position of every train) are indexed with a uniform grid, so that region
+and nearest-N queries only look at the rows in the grid cells around the region or point instead of at all rows.
+"""
+
+from typing import NamedTuple
+
+import numpy as np
+import polars as pl
+
+
+class BoundingBox(NamedTuple):
+    """Rectangle in RD New coordinates (meters), bounds inclusive."""
+
+    x_min: float
+    y_min: float
+    x_max: float
+    y_max: float
+
+    def expr(self) -> pl.Expr:
+        """Get a filter expression for locations within the box."""
+        return pl.col("x").is_between(self.x_min, self.x_max) & pl.col("y").is_between(self.y_min, self.y_max)
+
+
+class GridIndex:
+    """
+    Uniform grid over the x/y coordinates of a frame of locations: rows are sorted by grid cell, with the offset
+    at which every cell starts. The cells in a column of the grid are consecutive, so the rows of a range of cells in
+    one column are a single slice. Rows without coordinates are not indexed.
+    """
+
+    def __init__(self, x: np.ndarray, y: np.ndarray, cell_size: float = 5_000.0):
+        self.cell_size = cell_size
+        self._x = x
+        self._y = y
+
+        rows = np.flatnonzero(~(np.isnan(x) | np.isnan(y)))
+        cell_x = np.floor(x[rows] / cell_size).astype(np.int64)
+        cell_y = np.floor(y[rows] / cell_size).astype(np.int64)
+
+        self._origin = (int(cell_x.min(initial=0)), int(cell_y.min(initial=0)))
+        self._shape = (
+            int(cell_x.max(initial=0)) - self._origin[0] + 1,
+            int(cell_y.max(initial=0)) - self._origin[1] + 1,
+        )
+
+        cells = (cell_x - self._origin[0]) * self._shape[1] + (cell_y - self._origin[1])
+        order = np.argsort(cells, kind="stable")
+        self._rows = rows[order]
+        self._offsets = np.searchsorted(cells[order], np.arange(self._shape[0] * self._shape[1] + 1))
+
+    @classmethod
+    def from_frame(cls, locations: pl.DataFrame, cell_size: float = 5_000.0) -> "GridIndex":
+        """Index the x and y columns of the given locations."""
+        x = locations.get_column("x").cast(pl.Float64).fill_null(np.nan).to_numpy()
+        y = locations.get_column("y").cast(pl.Float64).fill_null(np.nan).to_numpy()
+        return cls(x, y, cell_size)
+
+    def _cell(self, x: float, y: float) -> tuple[int, int]:
+        return (
+            int(np.floor(x / self.cell_size)) - self._origin[0],
+            int(np.floor(y / self.cell_size)) - self._origin[1],
+        )
+
+    def _candidates(self, first: tuple[int, int], last: tuple[int, int]) -> np.ndarray:
+        """Get the rows in the given (inclusive) range of cells, clipped to the grid."""
+        x_from, x_to = max(first[0], 0), min(last[0], self._shape[0] - 1)
+        y_from, y_to = max(first[1], 0), min(last[1], self._shape[1] - 1)
+        if x_from > x_to or y_from > y_to:
+            return np.empty(0, dtype=np.int64)
+
+        starts = self._offsets[np.arange(x_from, x_to + 1) * self._shape[1] + y_from]
+        ends = self._offsets[np.arange(x_from, x_to + 1) * self._shape[1] + y_to + 1]
+        return np.concatenate([self._rows[start:end] for start, end in zip(starts, ends, strict=True)])
+
+    def within(self, bbox: BoundingBox) -> np.ndarray:
+        """Get the (sorted) indices of the rows within the bounding box."""
+        rows = self._candidates(self._cell(bbox.x_min, bbox.y_min), self._cell(bbox.x_max, bbox.y_max))
+        x, y = self._x[rows], self._y[rows]
+        inside = (x >= bbox.x_min) & (x <= bbox.x_max) & (y >= bbox.y_min) & (y <= bbox.y_max)
+        return np.sort(rows[inside])
+
+    def nearest(self, x: float, y: float, count: int) -> np.ndarray:
+        """Get the indices of the (at most) `count` rows nearest to the given point, nearest first."""
+        if count <= 0 or len(self._rows) == 0:
+            return np.empty(0, dtype=np.int64)
+
+        center = self._cell(x, y)
+        # rings beyond this distance (in cells) from the center cover no more of the grid
+        max_ring = max(
+            abs(center[0]), abs(center[0] - self._shape[0] + 1), abs(center[1]), abs(center[1] - self._shape[1] + 1)
+        )
+
+        ring = 0
+        while True:
+            rows = self._candidates((center[0] - ring, center[1] - ring), (center[0] + ring, center[1] + ring))
+            distances = np.hypot(self._x[rows] - x, self._y[rows] - y)
+
+            # all rows within `ring` cells from the point are in the square of cells around the center cell
+            if np.count_nonzero(distances <= ring * self.cell_size) >= count or ring >= max_ring:
+                nearest = np.argsort(distances, kind="stable")[:count]
+                return rows[nearest]
+
+            ring += 1
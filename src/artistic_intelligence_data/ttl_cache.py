@@ -0,0 +1,30 @@
+from collections.abc import Awaitable, Callable, Hashable
+from datetime import timedelta
+from time import monotonic
+from typing import Any
+
+
+class TTLCache:
+    """
+    Keep results of async calls for a short time, e.g. monitoring numbers that may be a few seconds old.
+    Meant for small, fixed sets of keys: expired entries are replaced, never evicted.
+    """
+
+    def __init__(self, ttl: timedelta):
+        self.ttl = ttl
+        self._entries: dict[Hashable, tuple[float, Any]] = {}
+
+        self.hits = 0
+        self.misses = 0
+
+    async def get[T](self, key: Hashable, fetch: Callable[[], Awaitable[T]]) -> T:
+        """Get the cached result for the key, or await the fetch function if there is none or it expired."""
+        entry = self._entries.get(key)
+        if entry is not None and monotonic() < entry[0]:
+            self.hits += 1
+            return entry[1]
+
+        self.misses += 1
+        value = await fetch()
+        self._entries[key] = (monotonic() + self.ttl.total_seconds(), value)
+        return value
@@ -1,6 +1,15 @@
+import re
 from datetime import datetime, timedelta
 
 from artistic_intelligence_data.constants import DEFAULT_TIMEZONE
+from artistic_intelligence_data.trains.spatial import BoundingBox
+
+# sampling interval as API param, e.g. 30s, 1m or 5m
+INTERVAL_PATTERN = r"^[1-9][0-9]*[smh]$"
+INTERVAL_UNITS = {"s": "seconds", "m": "minutes", "h": "hours"}
+
+# bounding box as API param in RD New meters: x_min,y_min,x_max,y_max
+BBOX_PATTERN = r"^\d+(\.\d+)?(,\d+(\.\d+)?){3}$"
 
 
 def validate_start_end(
@@ -8,8 +17,11 @@ def validate_start_end(
 ) -> tuple[datetime, datetime]:
     """
     Validate a time range usually provided as API params, providing defaults if necessary.
+
+    The default end is the current time truncated to whole seconds, so that requests for the default period
+    arriving at the same moment result in identical queries, which can share a single execution.
     """
-    now = datetime.now(tz=DEFAULT_TIMEZONE)
+    now = datetime.now(tz=DEFAULT_TIMEZONE).replace(microsecond=0)
     start = start or now - timedelta(minutes=minutes)
     end = end or now
 
@@ -20,3 +32,32 @@ def validate_start_end(
         end = end.replace(tzinfo=DEFAULT_TIMEZONE)
 
     return start, end
+
+
+def parse_interval(interval: str | None) -> timedelta | None:
+    """Parse a sampling interval usually provided as API param, like 30s, 1m or 5m."""
+    if interval is None:
+        return None
+
+    if not re.fullmatch(INTERVAL_PATTERN, interval):
+        raise ValueError(f"Invalid interval '{interval}', expected a number followed by s, m or h")
+
+    try:
+        return timedelta(**{INTERVAL_UNITS[interval[-1]]: int(interval[:-1])})
+    except OverflowError as e:
+        raise ValueError(f"Invalid interval '{interval}', too long") from e
+
+
+def parse_bbox(bbox: str | None) -> BoundingBox | None:
+    """Parse a bounding box usually provided as API param, like 110000,440000,150000,500000 (x/y min, x/y max)."""
+    if bbox is None:
+        return None
+
+    if not re.fullmatch(BBOX_PATTERN, bbox):
+        raise ValueError(f"Invalid bounding box '{bbox}', expected x_min,y_min,x_max,y_max in RD New meters")
+
+    x_min, y_min, x_max, y_max = (float(value) for value in bbox.split(","))
+    if x_min > x_max or y_min > y_max:
+        raise ValueError(f"Invalid bounding box '{bbox}', the minimum must not be greater than the maximum")
+
+    return BoundingBox(x_min, y_min, x_max, y_max)
@@ -0,0 +1,37 @@
+from collections.abc import Callable
+from datetime import UTC, datetime
+from typing import Any
+
+import polars as pl
+import pytest
+from psycopg_pool import AsyncConnectionPool
+
+from artistic_intelligence_data.trains.queries import SQLQuery
+from artistic_intelligence_data.trains.questdb_train_provider import QuestDBTrainProvider
+
+# answers a query as QuestDB would, with naive UTC timestamps
+type Answer = Callable[[SQLQuery], pl.DataFrame]
+
+
+class FakeQuestDBTrainProvider(QuestDBTrainProvider):
+    """Answers queries with the given function instead of querying QuestDB, and remembers the queries."""
+
+    def __init__(self, answer: Answer, **kwargs: Any):
+        super().__init__(pool=AsyncConnectionPool("", open=False), **kwargs)
+        self.answer = answer
+        self.queries: list[SQLQuery] = []
+
+    @property
+    def ranges(self) -> list[tuple[datetime, datetime]]:
+        """The periods queried, for queries between two timestamps (see `select_between`)."""
+        return [(query.params[0].replace(tzinfo=UTC), query.params[1].replace(tzinfo=UTC)) for query in self.queries]
+
+    async def _read_database(self, query: SQLQuery) -> pl.DataFrame:
+        self.queries.append(query)
+        return self.answer(query)
+
+
+@pytest.fixture
+def fake_provider() -> type[FakeQuestDBTrainProvider]:
+    """The QuestDB provider, answering queries with a function given per test instead of querying QuestDB."""
+    return FakeQuestDBTrainProvider
@@ -0,0 +1,87 @@
+import asyncio
+from datetime import UTC, date, datetime, timedelta
+from typing import Literal
+
+import polars as pl
+
+from artistic_intelligence_data.trains.archive import LOCATIONS_SCHEMA, ParquetArchive
+from artistic_intelligence_data.trains.categories import encode_categories
+from artistic_intelligence_data.trains.queries import SQLQuery
+
+DAY = date(2026, 3, 5)
+START = datetime(2026, 3, 5, tzinfo=UTC)
+
+
+def _locations(start: datetime, end: datetime, closed: Literal["both", "left"] = "both") -> pl.DataFrame:
+    """A record every minute for two trains, as the provider returns them."""
+    timestamps = pl.datetime_range(start, end, interval="1m", closed=closed, eager=True)
+    return encode_categories(
+        pl.DataFrame(
+            {
+                "timestamp": pl.concat([timestamps, timestamps]).dt.convert_time_zone("Europe/Amsterdam"),
+                "train_id": ["1"] * len(timestamps) + ["2"] * len(timestamps),
+                "train_type": "IC",
+                "x": 100_000.0,
+                "y": 450_000.0,
+            }
+        )
+    ).sort("timestamp", "train_id")
+
+
+def stored_locations(query: SQLQuery) -> pl.DataFrame:
+    """The locations of the queried period, as QuestDB stores them."""
+    start, end = (moment.replace(tzinfo=UTC) for moment in query.params[:2])
+    locations = _locations(start, end, "both" if "timestamp <= %s" in query.text else "left")
+    return locations.with_columns(pl.col("timestamp").dt.convert_time_zone("UTC").dt.replace_time_zone(None))
+
+
+def test_archive_coverage_is_the_last_run_of_days(tmp_path):
+    archive = ParquetArchive(tmp_path)
+    for day in [DAY, DAY + timedelta(days=2), DAY + timedelta(days=3)]:
+        start = datetime(day.year, day.month, day.day, tzinfo=UTC)
+        archive.write_day(day, _locations(start, start + timedelta(days=1), closed="left"))
+
+    assert archive.coverage() == (START + timedelta(days=2), START + timedelta(days=4))
+    assert (tmp_path / "train_locations" / "date=2026-03-07" / "data.parquet").exists()
+
+    read = archive.read(START + timedelta(days=2, hours=1), START + timedelta(days=2, hours=2), columns=["x"])
+    assert read.columns == ["timestamp", "train_id", "x"]
+    assert read.height == 2 * 61
+
+
+def test_periods_are_routed_to_archive_and_questdb(tmp_path, fake_provider):
+    archive = ParquetArchive(tmp_path)
+    archive.write_day(DAY, _locations(START, START + timedelta(days=1), closed="left"))
+    provider = fake_provider(stored_locations, archive=archive)
+
+    start, end = START + timedelta(hours=23), START + timedelta(days=1, minutes=30)
+    locations = asyncio.run(provider.get_train_locations(start, end))
+
+    assert provider.ranges == [(START + timedelta(days=1), end)]  # only the part after the archive
+    assert locations.select("timestamp", "train_id").equals(_locations(start, end).select("timestamp", "train_id"))
+
+
+def test_archived_period_without_files_has_the_table_columns(tmp_path, fake_provider):
+    archive = ParquetArchive(tmp_path)
+    archive.write_day(DAY, _locations(START, START + timedelta(days=1), closed="left"))
+    (tmp_path / "train_locations" / "date=2026-03-05" / "data.parquet").unlink()
+    provider = fake_provider(stored_locations, archive=archive)
+
+    start, end = START + timedelta(hours=1), START + timedelta(hours=2)
+    assert archive.read(start, end).schema == LOCATIONS_SCHEMA
+
+    locations = asyncio.run(provider.get_train_locations(start, end, columns=["x", "y"]))
+    assert locations.is_empty()
+    assert locations.columns == ["timestamp", "train_id", "x", "y"]
+    assert provider.queries == []  # all in the archive
+
+
+def test_closed_days_are_exported_once(tmp_path, fake_provider):
+    provider = fake_provider(stored_locations, archive=ParquetArchive(tmp_path))
+    yesterday = (datetime.now(tz=UTC) - timedelta(hours=1)).date() - timedelta(days=1)
+
+    assert asyncio.run(provider.archive_closed_days(first_day=yesterday - timedelta(days=1))) == [
+        yesterday - timedelta(days=1),
+        yesterday,
+    ]
+    assert asyncio.run(provider.archive_closed_days()) == []
@@ -0,0 +1,103 @@
+import gzip
+import json
+from datetime import UTC, datetime, timedelta
+from threading import Lock
+from typing import cast
+
+import pytest
+from influxdb_client import InfluxDBClient
+from influxdb_client.client.flux_table import FluxRecord
+
+from scripts.migrate.backup_influx_data import backup_influx_data_csv, backup_single_day, file_sha256
+
+FIRST_DATE = datetime(2026, 3, 5, tzinfo=UTC)
+
+
+class StandInInflux:
+    """Stands in for the InfluxDB client: streams a record per hour of the queried day, failing some days once."""
+
+    def __init__(self, failing_days: set[str]):
+        self.failing_days = failing_days
+        self.queried_days: list[str] = []
+        self._lock = Lock()
+
+    def query_api(self) -> "StandInInflux":
+        return self
+
+    def query_stream(self, query: str, params: dict[str, str]):
+        day = params["start"][:10]
+        with self._lock:
+            self.queried_days.append(day)
+            if day in self.failing_days:
+                self.failing_days.remove(day)
+                raise ConnectionError("connection reset")
+
+        start = datetime.fromisoformat(params["start"])
+        for hour in range(24):
+            yield FluxRecord(0, {"_time": start + timedelta(hours=hour), "train_id": "1", "lat": 52.0, "lng": 5.0})
+
+
+def test_failed_day_leaves_only_a_partial_file(tmp_path):
+    client = cast(InfluxDBClient, StandInInflux(failing_days={"2026-03-05"}))
+
+    with pytest.raises(ConnectionError):
+        backup_single_day(client, FIRST_DATE, str(tmp_path))
+    assert [path.name for path in tmp_path.iterdir()] == ["train_locations_2026-03-05.csv.gz.partial"]
+
+    # the retry writes the partial file anew, and renames it when complete
+    assert backup_single_day(client, FIRST_DATE, str(tmp_path)) == 24
+    assert [path.name for path in tmp_path.iterdir()] == ["train_locations_2026-03-05.csv.gz"]
+    with gzip.open(tmp_path / "train_locations_2026-03-05.csv.gz", "rt") as f:
+        assert len(f.readlines()) == 25  # with header
+
+
+def test_backup_resumes_from_manifest(tmp_path):
+    client = StandInInflux(failing_days={"2026-03-06"})
+    last_date = FIRST_DATE + timedelta(days=2)
+
+    failed = backup_influx_data_csv(
+        cast(InfluxDBClient, client), FIRST_DATE, last_date, str(tmp_path), workers=2, backoff_seconds=0
+    )
+
+    assert failed == []
+    assert sorted(client.queried_days) == ["2026-03-05", "2026-03-06", "2026-03-06", "2026-03-07"]  # one retry
+
+    manifest = json.loads((tmp_path / "manifest.json").read_text())
+    entry = manifest["days"]["2026-03-06"]
+    assert entry["rows"] == 24
+    assert entry["sha256"] == file_sha256(str(tmp_path / entry["file"]))
+    with gzip.open(tmp_path / entry["file"], "rt") as f:
+        assert len(f.readlines()) == 25  # with header
+
+    # a rerun only backs up the days that are not completed yet
+    (tmp_path / entry["file"]).unlink()
+    client.queried_days.clear()
+    backup_influx_data_csv(
+        cast(InfluxDBClient, client), FIRST_DATE, last_date + timedelta(days=1), str(tmp_path), backoff_seconds=0
+    )
+    assert sorted(client.queried_days) == ["2026-03-06", "2026-03-08"]
+
+
+def test_backup_leaves_out_the_current_day(tmp_path):
+    client = StandInInflux(failing_days=set())
+    today = datetime.now(UTC).replace(hour=0, minute=0, second=0, microsecond=0)
+
+    backup_influx_data_csv(cast(InfluxDBClient, client), today - timedelta(days=1), datetime.now(UTC), str(tmp_path))
+
+    assert client.queried_days == [str((today - timedelta(days=1)).date())]
+    assert list(json.loads((tmp_path / "manifest.json").read_text())["days"]) == client.queried_days
+
+
+def test_backup_redoes_a_day_with_a_changed_file(tmp_path):
+    client = StandInInflux(failing_days=set())
+    backup_influx_data_csv(cast(InfluxDBClient, client), FIRST_DATE, FIRST_DATE, str(tmp_path))
+
+    # same size, different content
+    filepath = tmp_path / "train_locations_2026-03-05.csv.gz"
+    content = filepath.read_bytes()
+    filepath.write_bytes(content[:-1] + bytes([content[-1] ^ 1]))
+    client.queried_days.clear()
+    backup_influx_data_csv(cast(InfluxDBClient, client), FIRST_DATE, FIRST_DATE, str(tmp_path))
+
+    assert client.queried_days == ["2026-03-05"]
+    assert gzip.decompress(filepath.read_bytes()) == gzip.decompress(content)
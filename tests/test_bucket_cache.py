@@ -0,0 +1,84 @@
+import asyncio
+from datetime import UTC, datetime, timedelta
+
+import polars as pl
+
+from artistic_intelligence_data.trains.bucket_cache import TimeBucketCache
+from artistic_intelligence_data.trains.queries import SQLQuery
+
+
+def every_10_seconds(query: SQLQuery) -> pl.DataFrame:
+    """A record every 10 seconds of the queried period."""
+    start, end = query.params[:2]
+    closed = "both" if "timestamp <= %s" in query.text else "left"
+    return pl.DataFrame(
+        {"timestamp": pl.datetime_range(start, end, interval="10s", closed=closed, eager=True), "train_id": "1"}
+    )
+
+
+def test_split_aligns_buckets():
+    cache = TimeBucketCache(bucket_size=timedelta(minutes=1), max_bytes=1_000_000)
+    buckets = cache.split(datetime(2026, 3, 5, 10, 0, 30, tzinfo=UTC), datetime(2026, 3, 5, 10, 2, tzinfo=UTC))
+
+    assert buckets == [
+        (datetime(2026, 3, 5, 10, 0, tzinfo=UTC), datetime(2026, 3, 5, 10, 1, tzinfo=UTC)),
+        (datetime(2026, 3, 5, 10, 1, tzinfo=UTC), datetime(2026, 3, 5, 10, 2, tzinfo=UTC)),
+    ]
+
+
+def test_lru_eviction_respects_byte_budget():
+    frame = pl.DataFrame({"value": range(100)})
+    cache = TimeBucketCache(bucket_size=timedelta(minutes=1), max_bytes=int(frame.estimated_size()) * 2)
+
+    cache.put("a", frame)
+    cache.put("b", frame)
+    assert cache.get("a") is not None  # makes "b" the least recently used
+    cache.put("c", frame)
+
+    assert cache.get("b") is None
+    assert cache.get_stats() | {"bytes": 0} == {
+        "hits": 1,
+        "misses": 1,
+        "evictions": 1,
+        "buckets": 2,
+        "bytes": 0,
+        "max_bytes": frame.estimated_size() * 2,
+    }
+
+
+def test_closed_buckets_are_served_from_cache(fake_provider):
+    provider = fake_provider(
+        every_10_seconds, cache=TimeBucketCache(bucket_size=timedelta(minutes=1), max_bytes=1_000_000)
+    )
+    start = datetime(2026, 3, 5, 10, 0, 30, tzinfo=UTC)
+    end = datetime(2026, 3, 5, 10, 3, 30, tzinfo=UTC)
+
+    first = asyncio.run(provider.get_train_locations(start, end))
+    query_count = len(provider.queries)
+    second = asyncio.run(provider.get_train_locations(start, end))
+
+    assert len(provider.queries) == query_count  # nothing new queried
+    assert first.equals(second)
+    assert first["timestamp"].min() == start
+    assert first["timestamp"].max() == end
+    assert first["timestamp"].is_sorted()
+    assert first.height == 19
+
+
+def test_missing_buckets_are_fetched_in_concurrent_partitions(fake_provider):
+    provider = fake_provider(
+        every_10_seconds,
+        cache=TimeBucketCache(bucket_size=timedelta(seconds=30), max_bytes=1_000_000),
+        partition_size=timedelta(minutes=1),
+    )
+    start = datetime(2026, 3, 5, 10, 0, tzinfo=UTC)
+    end = datetime(2026, 3, 5, 10, 3, tzinfo=UTC)
+
+    locations = asyncio.run(provider.get_train_locations(start, end - timedelta(microseconds=1)))
+
+    assert sorted(provider.ranges) == [
+        (start + timedelta(minutes=i), start + timedelta(minutes=i + 1)) for i in range(3)
+    ]
+    assert locations["timestamp"].is_sorted()
+    assert locations.height == 18
+    assert provider.get_cache_stats()["buckets"] == 6
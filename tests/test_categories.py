@@ -0,0 +1,13 @@
+import gc
+
+import polars as pl
+
+from artistic_intelligence_data.trains.categories import TRAIN_ID, encode_categories
+
+
+def test_codes_are_stable_after_frames_are_dropped():
+    codes = encode_categories(pl.DataFrame({"train_id": ["31", "42"]})).get_column("train_id").to_physical()
+    gc.collect()
+
+    assert pl.Series(codes).cast(TRAIN_ID).to_list() == ["31", "42"]
+    assert encode_categories(pl.DataFrame({"train_id": ["42"]}))["train_id"].to_physical().item() == codes[1]
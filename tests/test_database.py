@@ -0,0 +1,147 @@
+import asyncio
+import time
+from datetime import datetime, timedelta
+from typing import Any, NamedTuple, cast
+
+import polars as pl
+import pytest
+from fastapi.testclient import TestClient
+from psycopg import AsyncConnection
+from psycopg.postgres import types as pg_types
+
+from artistic_intelligence_data import api
+from artistic_intelligence_data.api import app
+from artistic_intelligence_data.database import create_questdb_pool, get_questdb_conninfo, read_frame
+from artistic_intelligence_data.trains.parquet_train_provider import ParquetTrainProvider
+
+
+class Column(NamedTuple):
+    name: str
+    type_code: int
+
+
+class StandInCursor:
+    """Returns the given rows for any query, and remembers how queries were executed."""
+
+    def __init__(self, description: list[Column], rows: list[tuple[Any, ...]]):
+        self.description = description
+        self.rows = rows
+        self.executed: list[tuple[str, tuple[Any, ...], bool]] = []
+
+    async def __aenter__(self) -> "StandInCursor":
+        return self
+
+    async def __aexit__(self, *exc_info: object) -> None:
+        pass
+
+    async def execute(self, query: str, params: tuple[Any, ...], prepare: bool = False) -> None:
+        self.executed.append((query, params, prepare))
+
+    async def fetchall(self) -> list[tuple[Any, ...]]:
+        return self.rows
+
+
+class StandInConnection:
+    def __init__(self, cursor: StandInCursor):
+        self._cursor = cursor
+
+    def cursor(self) -> StandInCursor:
+        return self._cursor
+
+
+class StandInProvider:
+    """Provider with background work that only ends when cancelled, that remembers whether it was closed."""
+
+    live_poll_interval = timedelta(milliseconds=1)
+
+    def __init__(self, failing_startup: bool = False):
+        self.failing_startup = failing_startup
+        self.polling = 0
+        self.closed = False
+
+    @property
+    def metadata_refresh_interval(self) -> timedelta:
+        if self.failing_startup:
+            raise RuntimeError("misconfigured")
+        return timedelta(milliseconds=1)
+
+    async def open(self) -> None:
+        pass
+
+    async def close(self) -> None:
+        self.closed = True
+
+    async def poll_live_tail(self) -> None:
+        self.polling += 1
+        try:
+            await asyncio.Event().wait()
+        finally:
+            self.polling -= 1
+
+    async def refresh_metadata(self) -> None:
+        await self.poll_live_tail()
+
+    def get_latest_snapshot(self) -> None:
+        return None
+
+
+def test_pool_is_configured_from_env(monkeypatch):
+    monkeypatch.setenv("QDB_HOST", "questdb.internal")
+    monkeypatch.setenv("QDB_POOL_MAX_SIZE", "3")
+
+    pool = create_questdb_pool()
+
+    assert pool.closed  # opened in the app lifespan, with a running event loop
+    assert pool.max_size == 3
+    assert pool.conninfo == get_questdb_conninfo()
+    assert get_questdb_conninfo().startswith("host=questdb.internal port=8812 ")
+
+
+def test_read_frame_is_typed_after_the_result_columns():
+    description = [Column("timestamp", pg_types["timestamp"].oid), Column("x", pg_types["float8"].oid)]
+    moment = datetime(2026, 3, 5, 10)
+    cursor = StandInCursor(description, [(moment, 1.5), (moment, None)])
+    conn = cast(AsyncConnection, StandInConnection(cursor))
+
+    frame = asyncio.run(read_frame(conn, "select timestamp, x from train_locations where x > %s", (1.0,)))
+
+    assert frame.schema == pl.Schema({"timestamp": pl.Datetime("us"), "x": pl.Float64})
+    assert frame.rows() == [(moment, 1.5), (moment, None)]
+    assert cursor.executed == [("select timestamp, x from train_locations where x > %s", (1.0,), True)]
+
+    cursor.rows = []
+    empty = asyncio.run(read_frame(conn, "select timestamp, x from train_locations"))
+    assert empty.is_empty()
+    assert empty.schema == frame.schema
+
+
+def test_lifespan_shares_one_provider(monkeypatch, tmp_path):
+    monkeypatch.setenv("TRAIN_PROVIDER", "parquet")
+    monkeypatch.setenv("PARQUET_DATA_DIR", str(tmp_path))
+
+    with TestClient(app) as client:
+        provider = app.state.train_provider
+        assert isinstance(provider, ParquetTrainProvider)
+
+        assert client.get("/datamon/trains").json() == 0
+        assert client.get("/datamon/trains").json() == 0
+        # both requests were served by the provider created in the lifespan
+        assert client.get("/datamon/queries").json() == {"scans": 2}
+
+
+def test_lifespan_stops_background_tasks_and_closes_the_provider(monkeypatch):
+    provider = StandInProvider()
+    monkeypatch.setattr(api, "create_train_provider", lambda: provider)
+
+    with TestClient(app):
+        while provider.polling < 2:
+            time.sleep(0.001)
+
+    assert provider.polling == 0  # both cancelled, and awaited
+    assert provider.closed
+
+    provider = StandInProvider(failing_startup=True)
+    monkeypatch.setattr(api, "create_train_provider", lambda: provider)
+    with pytest.raises(RuntimeError, match="misconfigured"), TestClient(app):
+        pass
+    assert provider.closed
@@ -0,0 +1,28 @@
+import asyncio
+from datetime import UTC, datetime, timedelta
+
+import polars as pl
+import pytest
+
+from artistic_intelligence_data.trains.queries import SQLQuery
+
+START = datetime(2026, 3, 5, 10, tzinfo=UTC)
+
+
+def record_per_column(query: SQLQuery) -> pl.DataFrame:
+    """A record with a value for every selected column."""
+    columns = query.text.split("select")[1].split("from")[0].split(",")
+    record = {"timestamp": START.replace(tzinfo=None), "train_id": "1"}
+    return pl.DataFrame([record | {column.strip(): 1.0 for column in columns[2:]}])
+
+
+def test_requested_columns_are_pushed_down(fake_provider):
+    provider = fake_provider(record_per_column)
+
+    locations = asyncio.run(provider.get_train_locations(START, START + timedelta(minutes=1), columns=["y", "x"]))
+
+    assert provider.queries[0].text.startswith("select timestamp, train_id, x, y from train_locations")
+    assert locations.columns == ["timestamp", "train_id", "x", "y"]
+
+    with pytest.raises(ValueError, match="Unknown location columns"):
+        asyncio.run(provider.get_train_locations(START, START, columns=["x; drop table train_locations"]))
@@ -0,0 +1,50 @@
+from datetime import datetime, timedelta
+
+import polars as pl
+
+from artistic_intelligence_data.constants import DEFAULT_TIMEZONE
+from artistic_intelligence_data.trains.categories import encode_categories
+from artistic_intelligence_data.trains.latest import LatestPositions
+from artistic_intelligence_data.trains.spatial import BoundingBox
+
+START = datetime(2026, 3, 5, 10, tzinfo=DEFAULT_TIMEZONE)
+
+
+def _locations(rows: list[tuple[int, str, float]]) -> pl.DataFrame:
+    return encode_categories(
+        pl.DataFrame(
+            [(START + timedelta(minutes=t), train_id, x, 450_000.0) for t, train_id, x in rows],
+            schema={
+                "timestamp": pl.Datetime("us", "Europe/Amsterdam"),
+                "train_id": pl.String,
+                "x": pl.Float64,
+                "y": pl.Float64,
+            },
+            orient="row",
+        )
+    )
+
+
+def test_polls_are_merged_into_seeded_positions():
+    latest = LatestPositions(max_age=timedelta(minutes=10))
+    latest.update(_locations([(0, "1", 100_000.0)]), updated_at=START)
+    assert not latest.is_fresh(START)  # not seeded yet, so polls are ignored
+
+    latest.replace(
+        _locations([(0, "1", 100_000.0), (1, "2", 120_000.0), (2, "3", 130_000.0)]),
+        updated_at=START + timedelta(minutes=2),
+    )
+    latest.update(
+        _locations([(11, "2", 125_000.0), (11, "4", 140_000.0), (12, "2", 127_500.0)]),
+        updated_at=START + timedelta(minutes=12),
+    )
+
+    assert latest.is_fresh(START + timedelta(minutes=12))
+    positions = latest.get().select(pl.col("train_id").cast(pl.String), "x")
+    assert positions.rows() == [("2", 127_500.0), ("3", 130_000.0), ("4", 140_000.0)]  # train 1 reported too long ago
+
+    def ids(positions: pl.DataFrame) -> list[str]:
+        return positions.get_column("train_id").cast(pl.String).to_list()
+
+    assert ids(latest.get(BoundingBox(126_000, 440_000, 135_000, 460_000))) == ["2", "3"]
+    assert ids(latest.nearest(139_000, 450_000, count=2)) == ["4", "3"]
@@ -0,0 +1,107 @@
+import asyncio
+from datetime import datetime, timedelta
+from typing import cast
+
+import polars as pl
+
+from artistic_intelligence_data.constants import DEFAULT_TIMEZONE
+from artistic_intelligence_data.trains.categories import encode_categories
+from artistic_intelligence_data.trains.live_buffer import LiveTailBuffer
+from artistic_intelligence_data.trains.queries import SQLQuery
+
+START = datetime(2026, 3, 5, 10, tzinfo=DEFAULT_TIMEZONE)
+
+
+def _snapshots(first: int, count: int, trains: int = 3) -> pl.DataFrame:
+    """Train locations every 10 seconds, like polled from QuestDB."""
+    frame = pl.DataFrame(
+        {
+            "timestamp": [
+                START + timedelta(seconds=10 * i) for i in range(first, first + count) for _ in range(trains)
+            ],
+            "train_id": [str(t) for _ in range(count) for t in range(trains)],
+            "x": [float(i) for i in range(count * trains)],
+            "speed": [None if i % 4 == 0 else 1.5 for i in range(count * trains)],
+        },
+        schema_overrides={"timestamp": pl.Datetime("us", "Europe/Amsterdam")},
+    )
+    return encode_categories(frame)
+
+
+def test_get_returns_appended_rows():
+    buffer = LiveTailBuffer(retention=timedelta(hours=1), capacity=100)
+    first, second = _snapshots(0, 5), _snapshots(5, 5)
+    buffer.append(first, covered_from=START, polled_at=START + timedelta(seconds=45))
+    buffer.append(second, covered_from=START + timedelta(seconds=41), polled_at=START + timedelta(seconds=95))
+
+    result = buffer.get(START + timedelta(seconds=20), START + timedelta(seconds=60))
+
+    expected = pl.concat([first, second]).filter(pl.col("timestamp").is_between(*result["timestamp"][[0, -1]]))
+    assert result.equals(expected)
+    assert result["timestamp"].min() == START + timedelta(seconds=20)
+    assert result["timestamp"].max() == START + timedelta(seconds=60)
+
+
+def test_covers_period_between_oldest_row_and_last_poll():
+    buffer = LiveTailBuffer(retention=timedelta(hours=1), capacity=100, poll_interval=timedelta(seconds=5))
+    assert not buffer.covers(START, START)
+
+    buffer.append(_snapshots(0, 5), covered_from=START, polled_at=START + timedelta(seconds=45))
+
+    assert buffer.covers(START, START + timedelta(seconds=50))
+    assert not buffer.covers(START - timedelta(seconds=1), START + timedelta(seconds=30))
+    assert not buffer.covers(START, START + timedelta(seconds=51))
+
+
+def test_wrapping_drops_oldest_rows():
+    buffer = LiveTailBuffer(retention=timedelta(hours=1), capacity=10)
+    buffer.append(_snapshots(0, 3), covered_from=START, polled_at=START + timedelta(seconds=25))
+    buffer.append(_snapshots(3, 2), covered_from=START, polled_at=START + timedelta(seconds=45))
+
+    # 15 rows do not fit, the oldest snapshot lost all rows and the second snapshot lost two of its three rows
+    assert not buffer.covers(START + timedelta(seconds=10), START + timedelta(seconds=40))
+    assert buffer.covers(START + timedelta(seconds=20), START + timedelta(seconds=40))
+    assert buffer.get(START + timedelta(seconds=20), START + timedelta(seconds=40)).height == 9
+
+
+def test_append_replaces_rows_from_the_given_moment():
+    buffer = LiveTailBuffer(retention=timedelta(hours=1), capacity=10)
+    complete = _snapshots(0, 3)
+    partial = complete.head(7)  # the last snapshot is missing two of its rows
+    buffer.append(partial, covered_from=START, polled_at=START + timedelta(seconds=25))
+
+    since = START + timedelta(seconds=10)
+    buffer.append(complete.filter(pl.col("timestamp") >= since), START, START + timedelta(seconds=30), since)
+
+    assert buffer.get(START, START + timedelta(seconds=20)).equals(complete)
+    assert buffer.last_timestamp == START + timedelta(seconds=20)
+
+
+def test_poll_picks_up_locations_ingested_late(fake_provider):
+    now = datetime.now(tz=DEFAULT_TIMEZONE).replace(microsecond=0)
+    stored = pl.DataFrame(
+        {
+            "timestamp": [now - timedelta(seconds=10 * i) for i in range(4, -1, -1) for _ in range(3)],
+            "train_id": ["1", "2", "3"] * 5,
+            "x": 100_000.0,
+        }
+    ).with_columns(pl.col("timestamp").dt.convert_time_zone("UTC").dt.replace_time_zone(None))
+    # the row of train 2 ten seconds ago, and the rows of trains 2 and 3 in the last snapshot come in late
+    ingested = stored.with_row_index().filter(~pl.col("index").is_in([10, 13, 14])).drop("index")
+
+    def answer(query: SQLQuery) -> pl.DataFrame:
+        start, end = query.params[:2]
+        return ingested.filter(pl.col("timestamp").is_between(start, end))
+
+    buffer = LiveTailBuffer(retention=timedelta(minutes=5), capacity=100, settle_time=timedelta(seconds=30))
+    provider = fake_provider(answer, live_buffer=buffer)
+    asyncio.run(provider.poll_live_tail())
+    assert cast(pl.DataFrame, provider.get_latest_snapshot()).height == 1
+
+    ingested = stored
+    asyncio.run(provider.poll_live_tail())
+
+    polled = buffer.get(now - timedelta(minutes=1), now)
+    assert polled.select(pl.col("train_id").cast(pl.String)).to_series().to_list() == stored["train_id"].to_list()
+    assert polled["timestamp"].to_list() == stored["timestamp"].dt.replace_time_zone("UTC").to_list()
+    assert cast(pl.DataFrame, provider.get_latest_snapshot()).height == 3
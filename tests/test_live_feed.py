@@ -0,0 +1,102 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import polars as pl
+
+from artistic_intelligence_data.constants import DEFAULT_TIMEZONE
+from artistic_intelligence_data.trains.live_feed import SnapshotBroadcaster, run_broadcaster
+
+START = datetime(2026, 3, 5, 10, tzinfo=DEFAULT_TIMEZONE)
+
+
+class StandInFeed:
+    """Local stand-in for the live buffer, that serves a new snapshot every time it is asked for one."""
+
+    def __init__(self, snapshot_count: int):
+        self.snapshots = [
+            pl.DataFrame(
+                {
+                    "timestamp": [START + timedelta(seconds=10 * i)] * 2,
+                    "train_id": ["1", "2"],
+                    "x": [100_000.0 + i, 200_000.0],
+                    "y": [400_000.0, 500_000.0 + i],
+                }
+            )
+            for i in range(snapshot_count)
+        ]
+
+    def __call__(self) -> pl.DataFrame | None:
+        return self.snapshots.pop(0) if self.snapshots else None
+
+
+async def _collect(events, count: int, delay: float = 0) -> list[bytes]:
+    collected = []
+    async for event in events:
+        collected.append(event)
+        if len(collected) == count:
+            break
+        await asyncio.sleep(delay)
+    return collected
+
+
+def test_every_subscriber_gets_the_same_serialized_snapshot():
+    async def scenario():
+        broadcaster = SnapshotBroadcaster(queue_size=5)
+        first = asyncio.create_task(_collect(broadcaster.events(), 3))
+        second = asyncio.create_task(_collect(broadcaster.events(), 3))
+        await asyncio.sleep(0)  # let the subscribers subscribe
+
+        feeder = asyncio.create_task(run_broadcaster(StandInFeed(3), broadcaster, timedelta(milliseconds=1)))
+        first_events, second_events = await asyncio.wait_for(asyncio.gather(first, second), timeout=5)
+        feeder.cancel()
+        return broadcaster, first_events, second_events
+
+    broadcaster, first_events, second_events = asyncio.run(scenario())
+
+    assert all(a is b for a, b in zip(first_events, second_events, strict=True))  # serialized once
+    assert first_events[0] == (
+        b"event: positions\nid: 2026-03-05T10:00:00+01:00\n"
+        b'data: {"2026-03-05T10:00:00":[{"id":1,"x":100000,"y":400000},{"id":2,"x":200000,"y":500000}]}\n\n'
+    )
+    assert broadcaster.subscriber_count == 0  # unsubscribed when done
+    assert broadcaster.dropped == 0
+
+
+def test_slow_subscriber_skips_snapshots():
+    async def scenario():
+        broadcaster = SnapshotBroadcaster(queue_size=1)
+        fast = asyncio.create_task(_collect(broadcaster.events(), 6))
+        slow = asyncio.create_task(_collect(broadcaster.events(), 2, delay=0.2))
+        await asyncio.sleep(0)
+
+        feeder = asyncio.create_task(run_broadcaster(StandInFeed(6), broadcaster, timedelta(milliseconds=5)))
+        fast_events, slow_events = await asyncio.wait_for(asyncio.gather(fast, slow), timeout=5)
+        feeder.cancel()
+        return broadcaster, fast_events, slow_events
+
+    broadcaster, fast_events, slow_events = asyncio.run(scenario())
+
+    assert len(fast_events) == 6
+    assert slow_events[0] == fast_events[0]
+    assert slow_events[1] == fast_events[-1]  # got the latest, missed the ones in between
+    assert broadcaster.dropped > 0
+
+
+def test_snapshot_completed_late_is_published_again():
+    complete = StandInFeed(1).snapshots[0]
+    feed = [complete.head(1), complete, complete]
+
+    def source() -> pl.DataFrame | None:
+        return feed.pop(0) if feed else None
+
+    async def scenario():
+        broadcaster = SnapshotBroadcaster()
+        feeder = asyncio.create_task(run_broadcaster(source, broadcaster, timedelta(milliseconds=1)))
+        await asyncio.sleep(0.05)
+        feeder.cancel()
+        return broadcaster
+
+    broadcaster = asyncio.run(scenario())
+
+    assert broadcaster.published == 2
+    assert broadcaster.latest_event is not None and b'"id":2' in broadcaster.latest_event
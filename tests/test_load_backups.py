@@ -0,0 +1,108 @@
+import csv
+import gzip
+import socketserver
+from threading import Condition, Thread
+from typing import cast
+
+import pytest
+
+from scripts.migrate.backup_influx_data import CSV_HEADER
+from scripts.migrate.load_backups_into_questdb import load_backups
+
+
+class SinkHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        chunks = []
+        while data := self.request.recv(65536):
+            chunks.append(data)
+        server = cast(SinkServer, self.server)
+        with server.received_changed:
+            server.received.append(b"".join(chunks))
+            server.received_changed.notify_all()
+
+
+class SinkServer(socketserver.ThreadingTCPServer):
+    """Local socket standing in for the ILP endpoint of QuestDB, collecting what every connection sent."""
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), SinkHandler)
+        self.received: list[bytes] = []
+        self.received_changed = Condition()
+
+    def lines(self, count: int, timeout: float = 5) -> list[str]:
+        """
+        The lines received, once there are (at least) the given number of them.
+        Connections are handled in their own threads, which may still be reading after the sender closed them.
+        """
+        with self.received_changed:
+            self.received_changed.wait_for(lambda: b"".join(self.received).count(b"\n") >= count, timeout)
+            return b"".join(self.received).decode().splitlines()
+
+
+@pytest.fixture
+def ilp_sink():
+    with SinkServer() as server:
+        thread = Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        yield server
+        server.shutdown()
+
+
+def write_backup(path, rows):
+    with gzip.open(path, "wt", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(CSV_HEADER)
+        writer.writerows(rows)
+
+
+def test_load_backups(tmp_path, ilp_sink):
+    write_backup(
+        tmp_path / "train_locations_2026-03-05.csv.gz",
+        [
+            # Amersfoort, the origin of RD New
+            ["2026-03-05 10:00:00+00:00", "ns", "123", "SPR", "", "80.5", "52.1551744", "5.38720621", "90"],
+            ["2026-03-05 10:00:01.5+00:00", "ns", "", "SPR", "", "", "52.1", "5.3", ""],  # no train id
+        ],
+    )
+    write_backup(
+        tmp_path / "train_locations_2026-03-06.csv.gz",
+        [["2026-03-06 10:00:00+00:00", "ns", "456", "IC", "10", "", "52.37310", "4.89240", ""]],  # Amsterdam Dam
+    )
+
+    failed = load_backups(str(tmp_path), "127.0.0.1", ilp_sink.server_address[1], workers=2)
+    assert failed == []
+
+    lines = sorted(ilp_sink.lines(2))
+    assert len(lines) == 2
+    assert lines[0] == (
+        "train_locations,train_id=123,train_type=SPR,source=ns x=155000.0,y=463000.0,speed=80.5,direction=90.0 "
+        "1772704800000000000"
+    )
+
+    tags, fields, timestamp = lines[1].split(" ")
+    assert tags == "train_locations,train_id=456,train_type=IC,source=ns"
+    values = dict(field.split("=") for field in fields.split(","))
+    assert values.keys() == {"x", "y", "accuracy"}
+    assert float(values["x"]) == pytest.approx(121_400, abs=100)
+    assert float(values["y"]) == pytest.approx(487_400, abs=100)
+    assert timestamp == "1772791200000000000"
+
+
+def test_load_backups_skips_malformed_rows_and_reports_failed_files(tmp_path, ilp_sink):
+    write_backup(
+        tmp_path / "train_locations_2026-03-05.csv.gz",
+        [
+            ["2026-03-05T10:00:00Z", "ns", "123", "SPR", "", "80.5", "52.1551744", "5.38720621", "90"],  # time format
+            ["2026-03-05 10:00:01+00:00", "ns", "123", "SPR", "", "", "north", "5.38720621", ""],  # latitude
+            ["2026-03-05 10:00:02+00:00", "ns", "123", "SPR", "n/a", "fast", "52.1551744", "5.38720621", "90"],
+        ],
+    )
+    (tmp_path / "train_locations_2026-03-06.csv.gz").write_bytes(b"not gzipped")
+
+    failed = load_backups(str(tmp_path), "127.0.0.1", ilp_sink.server_address[1], workers=2)
+
+    assert failed == ["train_locations_2026-03-06.csv.gz"]
+    # the unparsable speed and accuracy are left out, the other values are kept
+    assert ilp_sink.lines(1) == [
+        "train_locations,train_id=123,train_type=SPR,source=ns x=155000.0,y=463000.0,direction=90.0 1772704802000000000"
+    ]
@@ -0,0 +1,83 @@
+from datetime import datetime, timedelta
+
+import polars as pl
+
+from artistic_intelligence_data.constants import DEFAULT_TIMEZONE
+from artistic_intelligence_data.trains.categories import encode_categories
+from artistic_intelligence_data.trains.material import classify_material
+from artistic_intelligence_data.trains.metadata import TrainMetadataStore
+
+START = datetime(2026, 3, 5, 10, tzinfo=DEFAULT_TIMEZONE)
+
+
+def test_classify_material_by_prefix_in_enum_order():
+    first_part_types = pl.Series(["VIRM IV", "sng", "ICNG-B", "Unknown", None])
+
+    materials = pl.select(classify_material(pl.lit(first_part_types))).to_series()
+
+    assert materials.to_list() == ["VIRM", "SNG", "ICNG", None, None]
+
+
+def test_store_serves_refreshed_and_observed_trains():
+    store = TrainMetadataStore(retention=timedelta(hours=1))
+    train_types = encode_categories(
+        pl.DataFrame(
+            {
+                "train_id": ["1", "2"],
+                "train_type": ["IC", "SPR"],
+                "first_seen": [START, START],
+                "last_seen": [START + timedelta(minutes=10), START + timedelta(minutes=30)],
+            }
+        )
+    )
+    first_part_types = encode_categories(
+        pl.DataFrame({"train_id": ["1"], "first_part_type": ["VIRM IV"], "first_info": [START], "last_info": [START]})
+    )
+    store.replace(train_types, first_part_types, covered_from=START, refreshed_at=START + timedelta(minutes=30))
+
+    store.observe(
+        encode_categories(
+            pl.DataFrame(
+                {
+                    "timestamp": [START + timedelta(minutes=40)] * 2,
+                    "train_id": ["2", "3"],
+                    "train_type": ["SPR", "ARR"],
+                }
+            )
+        )
+    )
+
+    assert store.covers(START + timedelta(minutes=20))
+    trains = store.get(START + timedelta(minutes=20), START + timedelta(minutes=40))
+    assert trains.select(pl.col("train_id", "train_type").cast(pl.String)).rows() == [("2", "SPR"), ("3", "ARR")]
+    assert store.get(START, START).get_column("material").to_list() == ["VIRM", None]
+
+
+def test_store_serves_materials_by_train_info_period():
+    store = TrainMetadataStore(retention=timedelta(hours=6))
+    train_types = encode_categories(
+        pl.DataFrame(
+            {
+                "train_id": ["1", "2"],
+                "train_type": ["IC", "SPR"],
+                "first_seen": [START, START - timedelta(hours=3)],
+                "last_seen": [START + timedelta(hours=1)] * 2,
+            }
+        )
+    )
+    first_part_types = encode_categories(
+        pl.DataFrame(
+            {
+                "train_id": ["2", "3"],
+                "first_part_type": ["SNG", "VIRM IV"],
+                "first_info": [START - timedelta(hours=3)] * 2,
+                "last_info": [START - timedelta(hours=2), START + timedelta(minutes=30)],
+            }
+        )
+    )
+    store.replace(train_types, first_part_types, covered_from=START - timedelta(hours=6), refreshed_at=START)
+
+    # train 1 has no train info, train 2 was seen but has no info in the period, train 3 has info but no locations
+    materials = store.get_materials(START, START + timedelta(hours=1))
+    assert materials.select(pl.col("train_id").cast(pl.String), "material").rows() == [("3", "VIRM")]
+    assert store.get(START, START + timedelta(hours=1)).get_column("train_id").cast(pl.String).to_list() == ["1", "2"]
@@ -0,0 +1,115 @@
+import asyncio
+from datetime import UTC, datetime, timedelta
+
+import polars as pl
+from fastapi.testclient import TestClient
+
+from artistic_intelligence_data import dependencies
+from artistic_intelligence_data.api import app
+from artistic_intelligence_data.trains.parquet_train_provider import ParquetTrainProvider
+from artistic_intelligence_data.trains.provider import create_train_provider
+from artistic_intelligence_data.trains.spatial import BoundingBox
+
+START = datetime(2026, 3, 5, 10, tzinfo=UTC)
+
+
+def _write_archive(data_dir) -> None:
+    """Two days of locations for two trains, as exported from QuestDB (naive UTC timestamps)."""
+    for day in range(2):
+        directory = data_dir / "train_locations" / f"date={(START + timedelta(days=day)).date()}"
+        directory.mkdir(parents=True)
+        timestamps = [START.replace(tzinfo=None) + timedelta(days=day, seconds=10 * i) for i in range(6)]
+        pl.DataFrame(
+            {
+                "timestamp": timestamps * 2,
+                "train_id": ["1"] * 6 + ["2"] * 6,
+                "train_type": ["IC"] * 6 + ["SPR"] * 6,
+                "x": [100_000.0] * 6 + [200_000.0] * 6,
+                "y": [450_000.0] * 12,
+                "speed": [float(i) for i in range(12)],
+                "direction": 0.0,
+                "accuracy": 1.0,
+                "source": "ns",
+            }
+        ).write_parquet(directory / "part.parquet")
+
+
+def test_locations_are_read_from_parquet(tmp_path):
+    _write_archive(tmp_path)
+    provider = ParquetTrainProvider(tmp_path)
+
+    async def scenario() -> None:
+        end = START + timedelta(seconds=20)
+        locations = await provider.get_train_locations(START, end, columns=["x"])
+        assert locations.columns == ["timestamp", "train_id", "x"]
+        assert locations.height == 6
+        assert str(locations.schema["timestamp"]) == "Datetime(time_unit='us', time_zone='Europe/Amsterdam')"
+
+        in_box = await provider.get_train_locations(START, end, bbox=BoundingBox(150_000, 400_000, 250_000, 500_000))
+        assert in_box.get_column("train_id").cast(pl.String).unique().to_list() == ["2"]
+
+        types = await provider.get_train_types(START, START + timedelta(days=2))
+        assert types.select(pl.all().cast(pl.String)).rows() == [("1", "IC"), ("2", "SPR")]
+
+        pivoted = await provider.get_locations_torbenized(START, end)
+        chunks = [
+            chunk async for chunk in provider.iter_locations_torbenized(START, end, chunk_size=timedelta(seconds=15))
+        ]
+        assert len(chunks) == 2
+        assert pl.concat(chunks).equals(pivoted)
+
+    asyncio.run(scenario())
+
+
+def test_replay_offset_shifts_archive_to_now(tmp_path, monkeypatch):
+    _write_archive(tmp_path)
+    monkeypatch.setenv("TRAIN_PROVIDER", "parquet")
+    monkeypatch.setenv("PARQUET_DATA_DIR", str(tmp_path))
+    monkeypatch.setenv("PARQUET_REPLAY_FROM", (START + timedelta(days=1, seconds=55)).isoformat())
+    provider = create_train_provider()
+
+    # the default period is the last minute, which is now the first minute of the second day
+    assert asyncio.run(provider.get_current_count()) == 12
+
+
+def test_empty_window_has_the_table_columns(tmp_path, monkeypatch):
+    monkeypatch.setattr(dependencies, "ENVIRONMENT", "dev")
+    monkeypatch.setenv("TRAIN_PROVIDER", "parquet")
+    monkeypatch.setenv("PARQUET_DATA_DIR", str(tmp_path))  # no files at all
+
+    provider = ParquetTrainProvider(tmp_path)
+    locations = asyncio.run(provider.get_train_locations(START, START + timedelta(minutes=1), columns=["x"]))
+    assert locations.columns == ["timestamp", "train_id", "x"]
+    assert asyncio.run(provider.get_locations_torbenized(START, START)).columns == ["timestamp", "var"]
+
+    with TestClient(app) as client:
+        for path in ["/trains/locations", "/trains/locations-pivoted", "/trains/latest", "/trains/nearest?x=1&y=1"]:
+            assert client.get(path).status_code == 200, path
+        assert client.get("/trains/locations-pivoted", params={"stream": True}).text.strip() == "timestamp,var"
+
+
+def test_too_long_interval_is_rejected(tmp_path, monkeypatch):
+    monkeypatch.setattr(dependencies, "ENVIRONMENT", "dev")
+    monkeypatch.setenv("TRAIN_PROVIDER", "parquet")
+    monkeypatch.setenv("PARQUET_DATA_DIR", str(tmp_path))
+
+    with TestClient(app) as client:
+        for path in ["/trains/locations", "/trains/locations-keyed", "/trains/locations-pivoted"]:
+            assert client.get(path, params={"interval": "99999999999999h"}).status_code == 422, path
+
+
+def test_streamed_chunks_are_read_per_chunk(tmp_path):
+    _write_archive(tmp_path)
+    provider = ParquetTrainProvider(tmp_path)
+
+    async def chunks() -> list[pl.DataFrame]:
+        end = START + timedelta(seconds=50)
+        return [
+            chunk async for chunk in provider.iter_locations_torbenized(START, end, chunk_size=timedelta(seconds=20))
+        ]
+
+    result = asyncio.run(chunks())
+
+    assert [chunk.columns for chunk in result] == [["timestamp", "var", "1", "2"]] * 3
+    assert [chunk.height // 4 for chunk in result] == [2, 2, 2]
+    assert provider.get_query_stats() == {"scans": 4}  # the train ids up front, then a scan per chunk
@@ -0,0 +1,131 @@
+import asyncio
+from datetime import UTC, datetime, timedelta
+
+import polars as pl
+
+from artistic_intelligence_data.constants import DEFAULT_TIMEZONE
+from artistic_intelligence_data.trains.pivot import PIVOT_VARS, RollingPivot, pivot_locations
+from artistic_intelligence_data.trains.queries import SQLQuery
+
+START = datetime(2026, 3, 5, 10, tzinfo=DEFAULT_TIMEZONE)
+
+
+def _locations(rows: list[tuple[int, str, str, float, float, float | None]], origin: datetime = START) -> pl.DataFrame:
+    return pl.DataFrame(
+        [(origin + timedelta(seconds=10 * t), *rest) for t, *rest in rows],
+        schema={
+            "timestamp": pl.Datetime("us", "Europe/Amsterdam"),
+            "train_id": pl.String,
+            "train_type": pl.String,
+            "x": pl.Float64,
+            "y": pl.Float64,
+            "speed": pl.Float64,
+        },
+        orient="row",
+    )
+
+
+def test_pivot_layout_and_values():
+    locations = _locations(
+        [
+            (1, "1", "IC", 1.5, 2.5, None),
+            (0, "1", "IC", 1.0, 2.0, 80.0),
+            (0, "2", "SPR", 3.0, 4.0, 40.5),
+            (0, "2", "ARR", 9.0, 9.0, 9.0),  # duplicate, the first record wins
+            (1, "3", "IC", 5.0, 6.0, 10.0),  # not a requested train
+        ]
+    )
+
+    pivoted = pivot_locations(locations, ["1", "2"], scale=False).to_frame()
+
+    assert pivoted.columns == ["timestamp", "var", "1", "2"]
+    assert pivoted["timestamp"].to_list() == [START] * 4 + [START + timedelta(seconds=10)] * 4
+    assert pivoted["var"].to_list() == list(PIVOT_VARS) * 2
+    assert pivoted["1"].to_list() == ["80.0", "IC", "1.0", "2.0", None, "IC", "1.5", "2.5"]
+    assert pivoted["2"].to_list() == ["40.5", "SPR", "3.0", "4.0", None, None, None, None]
+
+
+def test_pivot_empty():
+    pivoted = pivot_locations(_locations([]), ["1"]).to_frame()
+
+    assert pivoted.columns == ["timestamp", "var", "1"]
+    assert pivoted.is_empty()
+
+
+def test_rolling_pivot_matches_fresh_pivot():
+    def snapshot(t: int, train_ids: list[str]) -> list[tuple[int, str, str, float, float, float | None]]:
+        return [
+            (t, train_id, "SPR" if train_id == "3" else "IC", 150_000.0 + t, 460_000.0, float(t))
+            for train_id in train_ids
+        ]
+
+    rows = [row for t in range(6) for row in snapshot(t, ["1", "2"] if t < 3 else ["2", "3"])]
+    locations = _locations(rows)
+    rolling = RollingPivot()
+
+    rolling.reset(
+        locations.filter(pl.col("timestamp") <= START + timedelta(seconds=20)), START, START + timedelta(seconds=20)
+    )
+    assert rolling.covers(START + timedelta(seconds=10))
+
+    end = START + timedelta(seconds=50)
+    rolling.extend(locations.filter(pl.col("timestamp") > START + timedelta(seconds=20)), end)
+    rolling.trim(START + timedelta(seconds=30))
+
+    window = locations.filter(pl.col("timestamp") >= START + timedelta(seconds=30))
+    expected = pivot_locations(window, ["2", "3"]).to_frame()
+    assert rolling.get(START + timedelta(seconds=30), end).equals(expected)
+    assert not rolling.covers(START)  # trimmed
+
+
+class LaggingQuestDB:
+    """Answers with the given locations, but only those ingested so far: up to `ingested_until`."""
+
+    def __init__(self, locations: pl.DataFrame):
+        self.locations = locations.with_columns(
+            pl.col("timestamp").dt.convert_time_zone("UTC").dt.replace_time_zone(None)
+        )
+        self.ingested_until = START
+
+    def __call__(self, query: SQLQuery) -> pl.DataFrame:
+        start, end = query.params[:2]
+        ingested_until = self.ingested_until.astimezone(UTC).replace(tzinfo=None)
+        return self.locations.filter(pl.col("timestamp").is_between(start, end), pl.col("timestamp") <= ingested_until)
+
+
+def test_rolling_pivot_fetches_late_locations(fake_provider):
+    now = datetime.now(tz=DEFAULT_TIMEZONE).replace(microsecond=0)
+    locations = _locations([(t, "1", "IC", 150_000.0 + t, 460_000.0, float(t)) for t in range(-30, 1)], now)
+    questdb = LaggingQuestDB(locations)
+    provider = fake_provider(questdb, rolling_settle_time=timedelta(seconds=30))
+    window = timedelta(minutes=3)
+
+    # polls every 5 seconds, while snapshots come in 15 seconds late
+    for poll in range(-6, 1):
+        end = now + timedelta(seconds=5 * poll)
+        questdb.ingested_until = end - timedelta(seconds=15)
+        asyncio.run(provider.get_locations_torbenized(end - window, end, scale=False))
+
+    questdb.ingested_until = now
+    pivoted = asyncio.run(provider.get_locations_torbenized(now - window, now, scale=False))
+
+    expected = pivot_locations(locations.filter(pl.col("timestamp") >= now - window), ["1"], scale=False).to_frame()
+    assert pivoted.equals(expected)
+
+
+def test_rolling_pivot_with_future_end_fetches_later_locations(fake_provider):
+    now = datetime.now(tz=DEFAULT_TIMEZONE).replace(microsecond=0)
+    locations = _locations([(t, "1", "IC", 150_000.0 + t, 460_000.0, float(t)) for t in range(-18, 12)], now)
+    questdb = LaggingQuestDB(locations)
+    provider = fake_provider(questdb, rolling_settle_time=timedelta(seconds=30))
+    start, end = now - timedelta(minutes=1), now + timedelta(minutes=2)
+
+    # the first poll asks for two minutes ahead, of which nothing is there yet
+    questdb.ingested_until = now
+    asyncio.run(provider.get_locations_torbenized(start, end, scale=False))
+
+    questdb.ingested_until = end
+    pivoted = asyncio.run(provider.get_locations_torbenized(start, end, scale=False))
+
+    expected = pivot_locations(locations.filter(pl.col("timestamp") >= start), ["1"], scale=False).to_frame()
+    assert pivoted.equals(expected)
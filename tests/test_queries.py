@@ -0,0 +1,38 @@
+from datetime import datetime, timedelta
+
+from artistic_intelligence_data.constants import DEFAULT_TIMEZONE
+from artistic_intelligence_data.trains.queries import select_between, to_questdb_timestamp
+from artistic_intelligence_data.trains.spatial import BoundingBox
+
+START = datetime(2026, 3, 5, 10, tzinfo=DEFAULT_TIMEZONE)
+
+
+def test_values_are_bound_and_query_text_is_stable():
+    def query(start: datetime, bbox: BoundingBox | None = None):
+        return select_between(
+            "timestamp, train_id, x",
+            "train_locations",
+            start,
+            start + timedelta(minutes=1),
+            end_inclusive=False,
+            valid_locations=True,
+            bbox=bbox,
+            tail="order by timestamp",
+        )
+
+    first, second = query(START), query(START + timedelta(hours=1))
+
+    assert first.text == second.text  # so the prepared statement is reused
+    assert first.text == (
+        "select timestamp, train_id, x from train_locations where timestamp >= %s and timestamp < %s"
+        " and train_id != '' and x is not null and y is not null and x > 0 and y > 0 order by timestamp"
+    )
+    assert first.params == (datetime(2026, 3, 5, 9), datetime(2026, 3, 5, 9, 1))  # naive UTC
+
+    with_bbox = query(START, BoundingBox(1, 2, 3, 4))
+    assert with_bbox.text.endswith("and x >= %s and x <= %s and y >= %s and y <= %s order by timestamp")
+    assert with_bbox.params[2:] == (1, 3, 2, 4)
+
+
+def test_naive_timestamps_are_taken_as_utc():
+    assert to_questdb_timestamp(datetime(2026, 3, 5, 10)) == datetime(2026, 3, 5, 10)
@@ -0,0 +1,49 @@
+from datetime import datetime, timedelta
+
+import polars as pl
+import pytest
+
+from artistic_intelligence_data.constants import DEFAULT_TIMEZONE
+from artistic_intelligence_data.trains.sampling import downsample, floor_to_interval, sample_by_select
+from artistic_intelligence_data.utils import parse_interval
+
+START = datetime(2026, 3, 5, 10, 0, 30, tzinfo=DEFAULT_TIMEZONE)
+
+
+def test_parse_interval():
+    assert parse_interval("30s") == timedelta(seconds=30)
+    assert parse_interval("5m") == timedelta(minutes=5)
+    assert parse_interval(None) is None
+
+    for invalid in ["0s", "1d", "m", "1 m", "99999999999999h"]:
+        with pytest.raises(ValueError):
+            parse_interval(invalid)
+
+
+def test_downsample_per_train_aligned_to_interval():
+    locations = pl.DataFrame(
+        {
+            "timestamp": [START + timedelta(seconds=10 * i) for i in range(9) for _ in range(2)],
+            "train_id": ["1", "2"] * 9,
+            "train_type": ["IC", "SPR"] * 9,
+            "x": [float(i) for i in range(18)],
+        },
+        schema_overrides={"timestamp": pl.Datetime("us", "Europe/Amsterdam")},
+    )
+
+    sampled = downsample(locations, timedelta(minutes=1))
+
+    assert sampled.columns == ["timestamp", "train_id", "train_type", "x"]
+    assert sampled["timestamp"].to_list() == [
+        START - timedelta(seconds=30),
+        START - timedelta(seconds=30),
+        START + timedelta(seconds=30),
+        START + timedelta(seconds=30),
+    ]
+    assert sampled["timestamp"].to_list()[0] == floor_to_interval(START, timedelta(minutes=1))
+    assert sampled["train_id"].to_list() == ["1", "2", "1", "2"]
+    assert sampled["x"].to_list() == [2.0, 3.0, 11.0, 12.0]  # averages of 0, 2, 4 and 6, 8, ..., 16
+
+
+def test_sample_by_select():
+    assert sample_by_select(["train_type", "x"]) == "timestamp, train_id, last(train_type) as train_type, avg(x) as x"
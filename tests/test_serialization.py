@@ -0,0 +1,67 @@
+import random
+from datetime import datetime, timedelta
+
+import polars as pl
+from pydantic import TypeAdapter
+
+from artistic_intelligence_data.constants import DEFAULT_TIMEZONE
+from artistic_intelligence_data.models import TrainPosition, TrainRecord
+from artistic_intelligence_data.serialization import mapping_json, records_json, records_keyed_json
+
+
+def _random_records(count: int = 500) -> pl.DataFrame:
+    random.seed(42)
+    start = datetime(2026, 3, 29, 0, 59, 0, tzinfo=DEFAULT_TIMEZONE)  # crosses the switch to summer time
+    return pl.DataFrame(
+        {
+            "timestamp": [
+                start + timedelta(seconds=10 * (i // 5), microseconds=random.choice([0, 0, 120, 500_000]))
+                for i in range(count)
+            ],
+            "id": [random.randint(1, 99_999) for _ in range(count)],
+            "x": [random.randint(10_000, 280_000) for _ in range(count)],
+            "y": [random.randint(300_000, 625_000) for _ in range(count)],
+            "speed": [random.choice([0.0, 1e-5, 80.5, float("nan"), random.uniform(0, 200)]) for _ in range(count)],
+            "direction": [random.uniform(0, 360) for _ in range(count)],
+            "accuracy": [random.choice([3.0, 1e17, random.random()]) for _ in range(count)],
+            "type": [random.choice(["IC", "SPR", "ARR", 'quote"d', "ünï\tcode"]) for _ in range(count)],
+        },
+        schema_overrides={"timestamp": pl.Datetime("us", "Europe/Amsterdam")},
+    )
+
+
+def test_records_json_matches_pydantic():
+    records = _random_records()
+    expected = TypeAdapter(list[TrainRecord]).dump_json([TrainRecord(**rec) for rec in records.to_dicts()])
+
+    assert records_json(records) == expected
+
+
+def test_records_keyed_json_matches_pydantic():
+    positions = _random_records().select(
+        pl.col("timestamp").dt.strftime("%Y-%m-%dT%H:%M:%S"),
+        "id",
+        "x",
+        "y",
+    )
+    keyed = positions.rows_by_key(key="timestamp", named=True)
+    expected = TypeAdapter(dict[str, list[TrainPosition]]).dump_json(
+        {k: [TrainPosition(id=r["id"], x=r["x"], y=r["y"]) for r in v] for k, v in keyed.items()}
+    )
+
+    assert records_keyed_json(positions, key="timestamp") == expected
+
+
+def test_mapping_json_matches_pydantic():
+    types = _random_records().select("id", "type")
+    expected = TypeAdapter(dict[int, str]).dump_json(dict(types.iter_rows()))
+
+    assert mapping_json(types, key="id", value="type") == expected
+
+
+def test_empty_frames():
+    records = _random_records().clear()
+
+    assert records_json(records) == b"[]"
+    assert records_keyed_json(records.select("id", "x"), key="id") == b"{}"
+    assert mapping_json(records, key="id", value="type") == b"{}"
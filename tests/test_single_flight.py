@@ -0,0 +1,45 @@
+import asyncio
+
+import polars as pl
+
+from artistic_intelligence_data.trains.single_flight import SingleFlight
+
+
+def test_concurrent_calls_share_one_execution():
+    single_flight = SingleFlight()
+    executions = []
+
+    async def query() -> pl.DataFrame:
+        executions.append(1)
+        await asyncio.sleep(0.01)
+        return pl.DataFrame({"value": [1, 2, 3]})
+
+    async def scenario() -> None:
+        results = await asyncio.gather(*(single_flight.do("select 1", query) for _ in range(4)))
+
+        assert len(executions) == 1
+        assert all(result is results[0] for result in results)
+        assert single_flight.get_stats() == {"executed": 1, "coalesced": 3}
+
+        await single_flight.do("select 1", query)  # nothing in flight anymore, so executed again
+        assert len(executions) == 2
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_caller_does_not_cancel_shared_query():
+    single_flight = SingleFlight()
+
+    async def query() -> pl.DataFrame:
+        await asyncio.sleep(0.01)
+        return pl.DataFrame({"value": [1]})
+
+    async def scenario() -> None:
+        leaving = asyncio.create_task(single_flight.do("select 1", query))
+        staying = asyncio.create_task(single_flight.do("select 1", query))
+        await asyncio.sleep(0)
+        leaving.cancel()
+
+        assert (await staying).height == 1
+
+    asyncio.run(scenario())
@@ -0,0 +1,31 @@
+import numpy as np
+import pytest
+
+from artistic_intelligence_data.trains.spatial import BoundingBox, GridIndex
+from artistic_intelligence_data.utils import parse_bbox
+
+
+def test_parse_bbox():
+    assert parse_bbox("110000,440000,150000.5,500000") == BoundingBox(110_000, 440_000, 150_000.5, 500_000)
+    assert parse_bbox(None) is None
+
+    for invalid in ["1,2,3", "150000,440000,110000,500000", "a,b,c,d"]:
+        with pytest.raises(ValueError):
+            parse_bbox(invalid)
+
+
+def test_grid_index_matches_full_scan():
+    rng = np.random.default_rng(42)
+    x = rng.uniform(10_000, 280_000, 2_000)
+    y = rng.uniform(305_000, 620_000, 2_000)
+    x[::100] = np.nan  # not indexed
+    index = GridIndex(x, y, cell_size=5_000)
+
+    bbox = BoundingBox(110_000, 440_000, 150_000, 500_000)
+    inside = (x >= bbox.x_min) & (x <= bbox.x_max) & (y >= bbox.y_min) & (y <= bbox.y_max)
+    assert index.within(bbox).tolist() == np.flatnonzero(inside).tolist()
+
+    for point in [(121_000, 487_000), (0, 0), (500_000, 700_000)]:
+        distances = np.hypot(x - point[0], y - point[1])
+        expected = np.argsort(np.nan_to_num(distances, nan=np.inf), kind="stable")[:7]
+        assert index.nearest(*point, count=7).tolist() == expected.tolist()
@@ -0,0 +1,113 @@
+import io
+from datetime import UTC, datetime, timedelta
+
+import polars as pl
+from fastapi.testclient import TestClient
+
+from artistic_intelligence_data import dependencies
+from artistic_intelligence_data.api import app
+from artistic_intelligence_data.dependencies import get_train_provider
+from artistic_intelligence_data.trains.queries import SQLQuery
+
+START = datetime(2026, 3, 5, 10, tzinfo=UTC)
+
+
+class StoredLocations:
+    """Answers location queries from the given locations, as stored in QuestDB (with naive UTC timestamps)."""
+
+    def __init__(self, locations: pl.DataFrame):
+        self.locations = locations
+
+    def __call__(self, query: SQLQuery) -> pl.DataFrame:
+        start, end = query.params[:2]
+        closed = "both" if "timestamp <= %s" in query.text else "left"
+        result = self.locations.filter(pl.col("timestamp").is_between(start, end, closed=closed))
+
+        select, tail = query.text.removeprefix("select ").split(" from ")
+        if select == "distinct train_id":
+            return result.select("train_id").unique().sort("train_id")
+        if select != "*":
+            result = result.select([column.strip() for column in select.split(",")])
+        order_by = tail.split("order by")[1] if "order by" in tail else "timestamp"
+        return result.sort([column.strip() for column in order_by.split(",")])
+
+
+def _serve(monkeypatch, fake_provider, locations: pl.DataFrame) -> TestClient:
+    """A client for the app, with its train provider serving the given locations."""
+    provider = fake_provider(StoredLocations(locations))
+    monkeypatch.setitem(app.dependency_overrides, get_train_provider, lambda: provider)
+    monkeypatch.setattr(dependencies, "ENVIRONMENT", "dev")
+    return TestClient(app)
+
+
+def test_binary_formats_round_trip_to_the_json_records(monkeypatch, fake_provider):
+    timestamps = [START.replace(tzinfo=None) + timedelta(seconds=10 * i) for i in range(3)]
+    locations = pl.DataFrame(
+        {
+            "timestamp": timestamps * 2,
+            "train_id": ["1"] * 3 + ["2"] * 3,
+            "train_type": ["IC"] * 3 + ["SPR"] * 3,
+            "x": [100_000.0] * 3 + [200_000.0] * 3,
+            "y": 450_000.0,
+            "speed": [float(i) for i in range(6)],
+            "direction": 0.0,
+            "accuracy": 1.0,
+        }
+    )
+    client = _serve(monkeypatch, fake_provider, locations)
+    params = {"start": START.isoformat(), "end": (START + timedelta(seconds=20)).isoformat()}
+
+    response = client.get("/trains/locations", params=params)
+    assert response.headers["content-type"] == "application/json"
+    records = response.json()
+    assert len(records) == 6
+
+    arrow = client.get("/trains/locations", params=params | {"format": "arrow"})
+    parquet = client.get("/trains/locations", params=params, headers={"Accept": "application/vnd.apache.parquet"})
+    assert arrow.headers["content-type"] == "application/vnd.apache.arrow.stream"
+    assert parquet.headers["content-type"] == "application/vnd.apache.parquet"
+
+    # an explicit format wins over the Accept header, which is ignored when it has no binary type
+    explicit = client.get("/trains/locations", params=params | {"format": "json"}, headers={"Accept": "*/*"})
+    assert explicit.headers["content-type"] == "application/json"
+    accepted = client.get("/trains/locations", params=params, headers={"Accept": "application/json, */*"})
+    assert accepted.headers["content-type"] == "application/json"
+
+    for frame in [pl.read_ipc_stream(io.BytesIO(arrow.content)), pl.read_parquet(io.BytesIO(parquet.content))]:
+        assert frame.columns == ["timestamp", "id", "x", "y", "speed", "direction", "accuracy", "type"]
+        assert str(frame.schema["timestamp"]) == "Datetime(time_unit='us', time_zone='Europe/Amsterdam')"
+        as_json = frame.with_columns(pl.col("timestamp").dt.strftime("%Y-%m-%dT%H:%M:%S%:z"))
+        assert as_json.to_dicts() == records
+
+
+def test_streamed_pivot_csv_has_one_header_across_hours(monkeypatch, fake_provider):
+    """Train 2 only shows up in the second hour, the first hourly chunk still has its column."""
+    first = [START.replace(tzinfo=None) + timedelta(minutes=5 * i) for i in range(24)]
+    later = [START.replace(tzinfo=None) + timedelta(minutes=70 + 5 * i) for i in range(6)]
+    locations = pl.DataFrame(
+        {
+            "timestamp": first + later,
+            "train_id": ["1"] * len(first) + ["2"] * len(later),
+            "train_type": ["IC"] * len(first) + ["SPR"] * len(later),
+            "x": 100_000.0,
+            "y": 450_000.0,
+            "speed": 0.0,
+            "direction": 0.0,
+            "accuracy": 1.0,
+        }
+    )
+    client = _serve(monkeypatch, fake_provider, locations)
+    params = {"start": START.isoformat(), "end": (START + timedelta(hours=2)).isoformat()}
+
+    streamed = client.get("/trains/locations-pivoted", params=params | {"stream": True}).text
+    whole = client.get("/trains/locations-pivoted", params=params).text
+
+    header, *lines = streamed.splitlines()
+    assert header == "timestamp,var,1,2"
+    assert header not in lines
+    assert all(line.count(",") == 3 for line in lines)
+    # train 2 is empty in the first chunk, and from 12:40 on in the second
+    assert lines[0].startswith("11:00:00,") and lines[0].endswith(",")
+    assert "12:10:00,train_type,IC,SPR" in lines
+    assert lines[-1].startswith("12:55:00,") and lines[-1].endswith(",")
+    assert streamed == whole
@@ -0,0 +1,51 @@
+import asyncio
+from datetime import UTC, datetime, timedelta
+
+import polars as pl
+
+from artistic_intelligence_data.trains.queries import VALID_LOCATION, SQLQuery
+from artistic_intelligence_data.ttl_cache import TTLCache
+
+
+def test_values_expire_after_ttl():
+    cache = TTLCache(ttl=timedelta(milliseconds=20))
+    calls = []
+
+    async def fetch() -> int:
+        calls.append(1)
+        return len(calls)
+
+    async def scenario() -> None:
+        assert await cache.get("key", fetch) == 1
+        assert await cache.get("key", fetch) == 1
+        await asyncio.sleep(0.03)
+        assert await cache.get("key", fetch) == 2
+
+    asyncio.run(scenario())
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def datamon_aggregates(query: SQLQuery) -> pl.DataFrame:
+    """The counts, or the latest timestamp per source."""
+    if "count()" in query.text:
+        return pl.DataFrame({"records": [1200], "trains": [400]})
+
+    latest = datetime.now(tz=UTC).replace(tzinfo=None) - timedelta(seconds=12)
+    return pl.DataFrame({"source": ["ns"], "latest": [latest]})
+
+
+def test_ingestion_stats_are_aggregated_in_sql_and_cached(fake_provider):
+    provider = fake_provider(datamon_aggregates)
+
+    async def scenario() -> None:
+        stats = await provider.get_ingestion_stats()
+        assert await provider.get_current_count() == 1200
+
+        assert stats["trains"] == 400
+        assert [source["source"] for source in stats["sources"]] == ["ns"]
+        assert 12 <= stats["lag_seconds"] < 13
+
+    asyncio.run(scenario())
+    assert len(provider.queries) == 2  # the count was served from cache
+    count = next(query.text for query in provider.queries if "count()" in query.text)
+    assert all(condition in count for condition in VALID_LOCATION)  # counts the rows the locations endpoints serve